@@ -1,99 +1,459 @@
-import re
-import json
+import gc
 import os
+import sys
+from collections import deque
+from itertools import count, islice
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from sys import intern
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "LP"))
+from log_reader import iter_lines, line_aligned_ranges, read_range
+from log_tokenizer import find_z_time
+from message_engine import (CODES, expired, format_clock, format_date, log_clock, mark_opened, message_name,
+                            plc_clock, run)
+
+# --- Parcel records ------------------------------------------------
+# Slotted records instead of a nested dict per parcel and per event; a
+# multi-day log is mostly these objects. Repeated strings (message ids,
+# types, locations) are interned so every event shares one copy, and an
+# event keeps only its message body: "raw" is rebuilt when asked for.
+# Times are int epoch ms (see message_engine): log_ms from the log-line
+# header, plc_ms from the PLC stamp in the body. to_dict() gives back the
+# original JSON layout, strings included.
+
+class Event:
+    __slots__ = ("log_ms", "plc_ms", "msg_id", "type", "location", "body")
+
+    def __init__(self, log_ms, plc_ms, msg_id, type, location, body):
+        self.log_ms = log_ms
+        self.plc_ms = plc_ms
+        self.msg_id = msg_id
+        self.type = type
+        self.location = location
+        self.body = body
+
+    @property
+    def date(self):
+        return format_date(self.log_ms)
+
+    @property
+    def ts(self):
+        return format_clock(self.log_ms)
+
+    @property
+    def raw(self):
+        return self.date + " " + self.ts + "|" + self.body
+
+    def to_dict(self):
+        return {
+            "date": self.date,
+            "ts": self.ts,
+            "msg_id": self.msg_id,
+            "type": self.type,
+            "location": self.location,
+            "raw": self.raw,
+        }
 
-# --- Message-type mapping ------------------------------------------
-ID_MAP = {
-    "1": "ItemRegister",
-    "2": "ItemPropertiesUpdate",
-    "3": "ItemInstruction",
-    "5": "UnverifiedSortReport",
-    "6": "VerifiedSortReport",
-    "7": "ItemDeRegister",
-    "98": "WatchdogReply",
-    "99": "WatchdogRequest",
-}
 
-# --- Regex helpers -------------------------------------------------
-LOG_DATE = re.compile(r'^(\d{4}-\d{2}-\d{2})')
+class Parcel:
+    __slots__ = (
+        "hostId", "pic", "register_plc_ms", "registerTS", "closedTS", "status", "plc_number",
+        "Registered_location", "customer_location", "sort_strategy", "destinations",
+        "barcodes", "barcode_state", "barcode_error", "alibi_id",
+        "volume_state", "length", "width", "height", "box_volume", "real_volume", "volume_error",
+        "item_state", "actual_destination", "destination_status", "sort_code",
+        "entrance_state", "exit_state", "events",
+    )
+
+    def __init__(self, hostId, pic, entrance_state=None):
+        self.hostId = hostId
+        self.pic = pic
+        self.register_plc_ms = None  # PLC time of the register; "date" in to_dict()
+        self.registerTS = None       # log_ms of the register
+        self.closedTS = None         # log_ms of the sort report / deregister
+        self.status = "open"
+        self.plc_number = None
+        self.Registered_location = None
+        self.customer_location = None
+        self.sort_strategy = None
+        self.destinations = None        # list once a destination reply arrives
+        self.barcodes = None            # list once a properties update arrives
+        self.barcode_state = None
+        self.barcode_error = False
+        self.alibi_id = None
+        self.volume_state = None
+        self.length = None
+        self.width = None
+        self.height = None
+        self.box_volume = None
+        self.real_volume = None
+        self.volume_error = False
+        self.item_state = None
+        self.actual_destination = None
+        self.destination_status = None  # dict once a sort report arrives
+        self.sort_code = None
+        self.entrance_state = entrance_state
+        self.exit_state = None
+        self.events = []
+
+    def to_dict(self):
+        barcodes = self.barcodes if self.barcodes is not None else []
+        return {
+            "hostId": self.hostId,
+            "pic": self.pic,
+            "date": format_date(self.register_plc_ms) if self.register_plc_ms is not None else None,
+            "registerTS": format_clock(self.registerTS) if self.registerTS is not None else None,
+            "closedTS": format_clock(self.closedTS) if self.closedTS is not None else None,
+            "status": self.status,
+            "plc_number": self.plc_number,
+            "Registered_location": self.Registered_location,
+            "customer_location": self.customer_location,
+            "sort_strategy": self.sort_strategy,
+            "destinations": self.destinations if self.destinations is not None else [],
+            "barcode_data": {
+                "barcodes": barcodes,
+                "barcode_count": len(barcodes),
+                "barcode_state": self.barcode_state
+            },
+            "barcode_error": self.barcode_error,
+            "alibi_id": self.alibi_id,
+            "volume_data": {
+                "volume_state": self.volume_state,
+                "length": self.length,
+                "width": self.width,
+                "height": self.height,
+                "box_volume": self.box_volume,
+                "real_volume": self.real_volume
+            },
+            "volume_error": self.volume_error,
+            "item_state": self.item_state,
+            "actual_destination": self.actual_destination,
+            "destination_status": self.destination_status if self.destination_status is not None else {},
+            "sort_code": self.sort_code,
+            "entrance_state": self.entrance_state,
+            "exit_state": self.exit_state,
+            "events": [event.to_dict() for event in self.events]
+        }
 
-# Match the time and milliseconds: "09:15:55,970"
-LOG_TIME = re.compile(r'\s((\d{2}:\d{2}:\d{2}),\d{3})')
 
-# Match the raw body after "): " and before " []" at the end
-RAW_BODY = re.compile(r'\): (.*?)(?: \[\]$)')
 
+# --- Line decoding -------------------------------------------------
+# Everything that depends on a single line only. The parallel parser runs
+# this part in worker processes; _correlate() below is the sequential part.
 
+_DEFERRED = object()  # payload failed to decode; _correlate() retries it in place
 
-# --- Main parser ---------------------------------------------------
-def parse_log(text: str):
-    active_hostid_parcels = {}
-    active_pic_only_parcels = {}
-    all_parcel_records = []
-
-    for line in text.splitlines():
-        date_m, body_m, ts_m= LOG_DATE.search(line), RAW_BODY.search(line),LOG_TIME.search(line)
-        if not (ts_m and body_m):
-            continue
-        
-        parts = body_m.group(1).strip().split("|")
-        if len(parts) < 6 or ID_MAP.get(parts[3], "").startswith("Watchdog"):
-            continue
-
-        try:
-            current_pic = int(parts[4])
-        except ValueError:
-            continue
-
-        current_host_id = parts[5].strip()
-        msg_id=parts[3].strip()
-        msg = ID_MAP.get(parts[3], f"Type{parts[3]}")
-
-        joined_line = "|".join(parts)
-        z_time_match = re.search(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z', joined_line)
-        if z_time_match:
-            ts_iso = z_time_match.group(0).replace("Z", "")
-        else:
-            ms = ts_m.group(2).zfill(3)
-            ts_iso = f"{ts_m.group(1)}.{ms}".replace(" ", "T")
 
-        date_part, time_part = ts_iso.split("T")
+def _register_payload(parts):
+    return parts[6].strip(), parts[7].strip(), parts[0].strip(), parts[8].strip()
+
+
+def _properties_payload(parts):
+    barcode_body = parts[9].strip()
+    temp_barcodes = []
+    barcode_state = None
+
+    if barcode_body:
+        barcode_fields = barcode_body.split(';')
+        if len(barcode_fields) >= 3:
+            barcode_string_field = barcode_fields[2].strip()
+            if barcode_string_field:
+                individual_barcode_strings = barcode_string_field.split('@')
+                for bc_str in individual_barcode_strings:
+                    stripped_bc_str = bc_str.strip()
+                    if stripped_bc_str.startswith("0]C"):
+                        stripped_bc_str=stripped_bc_str.removeprefix("0]C")
+                        temp_barcodes.append(stripped_bc_str)
+        barcode_state = int(barcode_fields[0])
+
+    volume = None
+    temp_volume_data = parts[12].strip()
+    if temp_volume_data:
+        volume_fields = temp_volume_data.split(';')
+        if len(volume_fields) >= 7:
+            volume = tuple(int(volume_fields[i]) for i in (0, 2, 3, 4, 5, 6))
+
+    return temp_barcodes, barcode_state, parts[11].strip(), volume
 
-        location=None
 
-        if msg_id:
-            if msg_id=="1":
-                location=parts[6].strip()
-            elif msg_id=="2":
+def _destination_reply_payload(parts):
+    temp_destinations = []
 
-                location=parts[6].strip()
+    if parts[7].strip():
+        destinations_list = [d.strip() for d in parts[7].split(';') if d.strip()]
+        temp_destinations.extend(destinations_list)
 
-            elif msg_id=="5":
-                location=parts[6].strip()
+    return parts[6].strip(), temp_destinations, parts[7].strip()
 
-            elif msg_id=="6":
-                location=parts[6].strip()
 
-            elif msg_id=="7":
-                location=parts[6].strip()
+def _sort_report_payload(parts):
+    destination_status_dict = None
 
-        if msg_id=="3":
-            if parts[6]=="" and parts[7]=="":
-                msg=msg+"(HOST_REPLY)"
+    temp_destination_status = parts[10]
+    if temp_destination_status:
+        destination_status_dict = {}
+        values = temp_destination_status.split(";")
+        for i in range(0, len(values) - 1, 2):
+            key = int(values[i])
+            value = int(values[i + 1])
+            destination_status_dict[key] = value
+
+    return parts[9], destination_status_dict
+
+
+def _deregister_payload(parts):
+    return parts[8].strip()
+
+
+PAYLOAD_DECODERS = {
+    1: _register_payload,
+    2: _properties_payload,
+    3: _destination_reply_payload,
+    6: _sort_report_payload,
+    7: _deregister_payload,
+}
+
+
+_log_ms = log_clock()
+_plc_ms = plc_clock()
+
+
+def _decoder(field):
+    """
+    message_engine handler for messages whose msgId field is *field*. It
+    decodes a line → (pic, hostId, code, event, parts, payload); parts is
+    only kept when the payload has to be decoded again by _correlate().
+    """
+    code = CODES.get(field)
+    msg_id = field.strip()
+    msg = message_name(field)
+    has_location = msg_id in ("1", "2", "5", "6", "7")
+    instruction = msg_id == "3"
+    host_reply = intern(msg + "(HOST_REPLY)")
+    destination_reply = intern(msg + "(DESTINATION_REPLY)")
+    msg_id, msg = intern(msg_id), intern(msg)
+    decode_payload = PAYLOAD_DECODERS.get(code)
+
+    def decode(pic, host_id, body, parts, date, time, line, offset):
+        log_ms = _log_ms(date, time, line)
+        if log_ms is None:
+            return None
+
+        z_time = find_z_time(body, parts)
+        plc_ms = _plc_ms(z_time) if z_time else None
+
+        location = parts[6].strip() if has_location else None
+
+        event_msg, payload_decoder = msg, decode_payload
+        if instruction:
+            if parts[6] == "" and parts[7] == "":
+                event_msg, payload_decoder = host_reply, None
             else:
-                msg=msg+"(DESTINATION_REPLY)"
-
-        raw=date_m.group(1)+" "+ts_m.group(1)+"|"+"|".join(parts)
-        print(raw)
-
-        event = {
-            "date": date_m.group(1),
-            "ts": ts_m.group(1),
-            "msg_id":msg_id,
-            "type": msg,
-            "location":location,
-            "raw": raw
-        }
+                event_msg = destination_reply
+
+        event = Event(
+            log_ms, plc_ms, msg_id, event_msg,
+            intern(location) if location is not None else None, body,
+        )
+
+        payload = None
+        if payload_decoder is not None:
+            try:
+                payload = payload_decoder(parts)
+                parts = None
+            except (IndexError, ValueError):
+                # Malformed field: only fail if the message turns out to have
+                # a parcel, exactly where the sequential parser always failed.
+                payload = _DEFERRED
+        else:
+            parts = None
+
+        return pic, host_id, code, event, parts, payload
+    return decode
+
+
+DECODERS = {code: _decoder(str(code)) for code in (1, 2, 3, 5, 6, 7)}
+_OTHER_DECODERS = {}  # msgId field -> handler, for fields that are not a known code
+
+
+def _decode_other(pic, host_id, body, parts, date, time, line, offset):
+    decode = _OTHER_DECODERS.get(parts[3])
+    if decode is None:
+        decode = _OTHER_DECODERS[parts[3]] = _decoder(parts[3])
+    return decode(pic, host_id, body, parts, date, time, line, offset)
+
+
+def _decode_lines(lines, tokenizer="fast"):
+    return run(lines, DECODERS, _decode_other, tokenizer)
+
+
+# --- Main parser ---------------------------------------------------
+def new_state(retention=None):
+    """
+    _correlate() state that can be carried from one batch of lines to the next.
+    With *retention* (message_engine.new_retention()), closed and stale
+    parcels are dropped from it as log time passes.
+    """
+    return {
+        "active_hostid_parcels": {},
+        "active_pic_only_parcels": {},
+        "unreported": {},  # id(parcel) -> (creation_index, parcel), creation order
+        "created": count(),
+        "barcode_state": None,  # of the last properties update that had one
+        "retention": retention,
+    }
+
+
+def _forget(state, parcel):
+    """Free the hostId and PIC of *parcel* for parcels that come after it."""
+    active_hostid_parcels = state["active_hostid_parcels"]
+    if active_hostid_parcels.get(parcel.hostId) is parcel:
+        del active_hostid_parcels[parcel.hostId]
+    active_pic_only_parcels = state["active_pic_only_parcels"]
+    if active_pic_only_parcels.get(parcel.pic) is parcel:
+        del active_pic_only_parcels[parcel.pic]
+
+
+def _evict(state, now):
+    """Yield and drop the closed parcels whose grace is over, then the stale ones."""
+    retention = state["retention"]
+    unreported = state["unreported"]
+    closed, stale = expired(retention, now)
+    for _, index, parcel in closed:
+        _forget(state, parcel)
+        yield index, parcel
+    retention["evicted"]["closed"] += len(closed)
+
+    for key in stale:
+        numbered = unreported.pop(key, None)
+        if numbered is not None:
+            numbered[1].status = "stale"
+            _forget(state, numbered[1])
+            retention["evicted"]["stale"] += 1
+            yield numbered
+
+
+def _held(state):
+    """(creation_index, parcel) of every parcel *state* still holds: closed ones in their grace, then open ones."""
+    retention = state["retention"]
+    if retention is not None:
+        for _, index, parcel in retention["closed"]:
+            yield index, parcel
+    yield from state["unreported"].values()
+
+
+# ── per-type updates: (parcel, payload, log_ms, state, echo) ──────
+def _apply_properties(target_parcel, payload, log_ms, state, echo):
+    temp_barcodes, temp_barcode_state, temp_alibi_id, temp_volume = payload
+    # An empty barcode block keeps the previous message's state
+    if temp_barcode_state is not None:
+        state["barcode_state"] = temp_barcode_state
+
+    target_parcel.barcodes = temp_barcodes
+    target_parcel.barcode_state = state["barcode_state"]
+
+    if target_parcel.barcode_state != 6:
+        target_parcel.barcode_error = True
+
+    if temp_alibi_id:
+        target_parcel.alibi_id = temp_alibi_id
+
+    if temp_volume is not None:
+        (target_parcel.volume_state, target_parcel.length, target_parcel.width,
+         target_parcel.height, target_parcel.box_volume, target_parcel.real_volume) = temp_volume
+
+        if target_parcel.volume_state != 6:
+            target_parcel.volume_error = True
+
+
+def _apply_destination_reply(target_parcel, payload, log_ms, state, echo):
+    sort_strategy, temp_destinations, destinations_field = payload
+    if sort_strategy:
+        target_parcel.sort_strategy = sort_strategy
+
+    target_parcel.destinations = temp_destinations
+
+    if echo:
+        print(temp_destinations)
+        print(destinations_field)
+
+
+def _apply_sort_report(target_parcel, payload, log_ms, state, echo):
+    temp_actual_destination, destination_status_dict = payload
+    if temp_actual_destination:
+        target_parcel.actual_destination = temp_actual_destination
+
+    if destination_status_dict is not None:
+        target_parcel.destination_status = destination_status_dict
+
+        actual_dest = int(target_parcel.actual_destination)
+        if actual_dest in destination_status_dict:
+            target_parcel.sort_code = destination_status_dict[actual_dest]
+
+        if target_parcel.actual_destination=="999":
+            last_key = list(destination_status_dict)[-1]
+            last_value = destination_status_dict[last_key]
+            target_parcel.sort_code=last_value
+            if echo:
+                print(last_key, last_value)
+
+    if target_parcel.sort_code == 1 and target_parcel.actual_destination != "999":
+        target_parcel.status = "sorted"
+    elif target_parcel.actual_destination == "999":
+        target_parcel.status = "sorted_off_the_end"
+
+    target_parcel.closedTS = log_ms
+
+
+def _apply_deregister(target_parcel, payload, log_ms, state, echo):
+    exit_state = payload
+    if exit_state:
+        target_parcel.exit_state = exit_state
+    if target_parcel.exit_state is not None:
+        target_parcel.status = "unsorted"
+    target_parcel.closedTS = log_ms
+
+
+# Host replies (code 3 without a destination) carry no payload and are not applied
+APPLY = {
+    2: _apply_properties,
+    3: _apply_destination_reply,
+    6: _apply_sort_report,
+    7: _apply_deregister,
+}
+
+
+def _correlate(decoded_lines, state=None, echo=True, flush=None):
+    """
+    hostId/PIC state machine over decoded lines, in log order.
+    Yield (creation_index, parcel) as each parcel closes, then the rest.
+    If given, *state* (new_state()) is resumed and left holding the open
+    parcels, which are then not yielded at the end: feed it the next batch
+    to carry on (streaming ingestion). flush=True yields them anyway.
+    With a retention in *state*, a parcel is yielded once its grace after
+    closing is over, or as "stale". echo=False silences the debug prints.
+    """
+    if flush is None:
+        flush = state is None
+    if state is None:
+        state = new_state()
+    active_hostid_parcels = state["active_hostid_parcels"]
+    active_pic_only_parcels = state["active_pic_only_parcels"]
+    unreported = state["unreported"]
+    created = state["created"]
+    retention = state["retention"]
+    if retention is not None:
+        closed = retention["closed"]
+        clock_minute = retention["minute"]
+
+    for current_pic, current_host_id, code, event, parts, payload in decoded_lines:
+        if echo:
+            print(event.raw)
+
+        if retention is not None and event.log_ms // 60_000 != clock_minute:
+            clock_minute = retention["minute"] = event.log_ms // 60_000
+            yield from _evict(state, clock_minute * 60)
 
         target_parcel = None
 
@@ -105,98 +465,39 @@ def parse_log(text: str):
 
             elif current_pic in active_pic_only_parcels:
                 target_parcel = active_pic_only_parcels[current_pic]
-                target_parcel["hostId"] = current_host_id
+                target_parcel.hostId = current_host_id
                 active_hostid_parcels[current_host_id] = target_parcel
                 del active_pic_only_parcels[current_pic]
 
             else:
-                new_parcel = {
-                    "hostId": current_host_id,
-                    "pic": current_pic,
-                    "date": None,
-                    "registerTS": None,
-                    "closedTS": None,
-                    "status": "open",
-                    "plc_number": None,
-                    "Registered_location": None,
-                    "customer_location": None,
-                    "sort_strategy": None,
-                    "destinations": [],
-                    "barcode_data": {
-                        "barcodes": [],
-                        "barcode_count": 0,
-                        "barcode_state": None
-                    },
-                    "barcode_error": False,
-                    "alibi_id": None,
-                    "volume_data": {
-                        "volume_state": None,
-                        "length": None,
-                        "width": None,
-                        "height": None,
-                        "box_volume": None,
-                        "real_volume": None
-                    },
-                    "volume_error": False,
-                    "item_state": None,
-                    "actual_destination": None,
-                    "destination_status": {},
-                    "sort_code": None,
-                    "entrance_state": None,
-                    "exit_state": None,
-                    "events": []
-                }
-                all_parcel_records.append(new_parcel)
+                new_parcel = Parcel(current_host_id, current_pic)
+                unreported[id(new_parcel)] = (next(created), new_parcel)
+                if retention is not None:
+                    mark_opened(retention, id(new_parcel))
                 active_hostid_parcels[current_host_id] = new_parcel
                 target_parcel = new_parcel
 
         else:
-            if msg == "ItemRegister":
-                new_parcel = {
-                    "hostId": None,
-                    "pic": current_pic,
-                    "date": None,
-                    "registerTS": None,
-                    "closedTS": None,
-                    "status": "open",
-                    "plc_number": None,
-                    "Registered_location": None,
-                    "customer_location": None,
-                    "sort_strategy": None,
-                    "destinations": [],
-                    "barcode_data": {
-                        "barcodes": [],
-                        "barcode_count": 0,
-                        "barcode_state": None
-                    },
-                    "barcode_error": False,
-                    "alibi_id": None,
-                    "volume_data": {
-                        "volume_state": None,
-                        "length": None,
-                        "width": None,
-                        "height": None,
-                        "box_volume": None,
-                        "real_volume": None
-                    },
-                    "volume_error": False,
-                    "item_state": None,
-                    "actual_destination": None,
-                    "destination_status": {},
-                    "sort_code": None,
-                    "entrance_state": parts[8].strip(),
-                    "exit_state": None,
-                    "events": []
-                }
-                all_parcel_records.append(new_parcel)
+            if code == 1:
+                if payload is _DEFERRED:
+                    payload = _register_payload(parts)
+                registered_location, customer_location, plc_number, entrance_state = payload
+                new_parcel = Parcel(None, current_pic, entrance_state)
+                unreported[id(new_parcel)] = (next(created), new_parcel)
+                if retention is not None:
+                    mark_opened(retention, id(new_parcel))
+                # A re-registered PIC orphans the previous PIC-only parcel.
+                orphan = active_pic_only_parcels.get(current_pic)
+                if orphan is not None and id(orphan) in unreported:
+                    yield unreported.pop(id(orphan))
                 active_pic_only_parcels[current_pic] = new_parcel
                 target_parcel = new_parcel
 
-                target_parcel["Registered_location"] = parts[6].strip()
-                target_parcel["customer_location"] = parts[7].strip()
-                target_parcel["registerTS"] = ts_m.group(1)
-                target_parcel["plc_number"] = parts[0].strip()
-                target_parcel["date"] = date_part
+                target_parcel.Registered_location = registered_location
+                target_parcel.customer_location = customer_location
+                target_parcel.registerTS = event.log_ms
+                target_parcel.plc_number = plc_number
+                target_parcel.register_plc_ms = event.plc_ms
             else:
                 if current_pic in active_pic_only_parcels:
                     target_parcel = active_pic_only_parcels[current_pic]
@@ -204,127 +505,143 @@ def parse_log(text: str):
                     continue
 
         if target_parcel:
-            target_parcel["events"].append(event)
-
-            if msg == "ItemPropertiesUpdate":
-                barcode_body = parts[9].strip()
-                temp_barcodes = []
-
-                if barcode_body:
-                    barcode_fields = barcode_body.split(';')
-                    if len(barcode_fields) >= 3:
-                        barcode_string_field = barcode_fields[2].strip()
-                        if barcode_string_field:
-                            individual_barcode_strings = barcode_string_field.split('@')
-                            for bc_str in individual_barcode_strings:
-                                stripped_bc_str = bc_str.strip()
-                                if stripped_bc_str.startswith("0]C"):
-                                    stripped_bc_str=stripped_bc_str.removeprefix("0]C")
-                                    temp_barcodes.append(stripped_bc_str)
-
-                target_parcel["barcode_data"]["barcodes"] = temp_barcodes
-                target_parcel["barcode_data"]["barcode_count"] = len(temp_barcodes)
-                target_parcel["barcode_data"]["barcode_state"] = int(barcode_fields[0])
-
-                if target_parcel["barcode_data"]["barcode_state"] != 6:
-                    target_parcel["barcode_error"] = True
-
-                temp_alibi_id = parts[11].strip()
-                if temp_alibi_id:
-                    target_parcel["alibi_id"] = temp_alibi_id
-
-                temp_volume_data = parts[12].strip()
-                if temp_volume_data:
-                    volume_fields = temp_volume_data.split(';')
-                    if len(volume_fields) >= 7:
-                        target_parcel["volume_data"]["volume_state"] = int(volume_fields[0])
-                        target_parcel["volume_data"]["length"] = int(volume_fields[2])
-                        target_parcel["volume_data"]["width"] = int(volume_fields[3])
-                        target_parcel["volume_data"]["height"] = int(volume_fields[4])
-                        target_parcel["volume_data"]["box_volume"] = int(volume_fields[5])
-                        target_parcel["volume_data"]["real_volume"] = int(volume_fields[6])
-
-                        if target_parcel["volume_data"]["volume_state"] != 6:
-                            target_parcel["volume_error"] = True
-
-            elif msg == "ItemInstruction(DESTINATION_REPLY)":
-                if parts[6].strip():
-                    target_parcel["sort_strategy"] = parts[6].strip()
-
-                temp_destinations = []
-
-                if parts[7].strip():
-                    destinations_list = [d.strip() for d in parts[7].split(';') if d.strip()]
-                    temp_destinations.extend(destinations_list)
-
-                target_parcel["destinations"] = temp_destinations
-
-                print(temp_destinations)
-                print(parts[7].strip())
-
-
-            # elif msg == "ItemInstruction":
-                
-
-            elif msg == "VerifiedSortReport":
-                temp_actual_destination = parts[9]
-                if temp_actual_destination:
-                    target_parcel["actual_destination"] = temp_actual_destination
-
-                temp_destination_status = parts[10]
-                if temp_destination_status:
-                    destination_status_dict = {}
-                    values = temp_destination_status.split(";")
-                    for i in range(0, len(values) - 1, 2):
-                        key = int(values[i])
-                        value = int(values[i + 1])
-                        destination_status_dict[key] = value
-                    target_parcel["destination_status"] = destination_status_dict
-
-                    actual_dest = int(target_parcel["actual_destination"])
-                    if actual_dest in destination_status_dict:
-                        target_parcel["sort_code"] = destination_status_dict[actual_dest]
-
-                    if target_parcel["actual_destination"]=="999":
-                        last_key = list(destination_status_dict)[-1]
-                        last_value = destination_status_dict[last_key]
-                        target_parcel["sort_code"]=last_value
-                        print(last_key, last_value)
-
-                if target_parcel["sort_code"] == 1 and target_parcel["actual_destination"] != "999":
-                    target_parcel["status"] = "sorted"
-                elif target_parcel["actual_destination"] == "999":
-                    target_parcel["status"] = "sorted_off_the_end"
-
-                target_parcel["closedTS"] = ts_m.group(1)
-
-            elif msg == "ItemDeRegister":
-                exit_state = parts[8].strip()
-                if exit_state:
-                    target_parcel["exit_state"] = exit_state
-                if target_parcel["exit_state"] is not None:
-                    target_parcel["status"] = "unsorted"
-                target_parcel["closedTS"] = ts_m.group(1)
-
-    return all_parcel_records
+            target_parcel.events.append(event)
 
+            if payload is _DEFERRED:
+                payload = PAYLOAD_DECODERS[code](parts)
 
-if __name__ == "__main__":
-    input_file = input("Enter the log file name (e.g., log.txt): ").strip()
-    base_filename = os.path.splitext(os.path.basename(input_file))[0]
-    output_file = base_filename + ".json"
+            apply = APPLY.get(code)
+            if apply is not None and payload is not None:
+                apply(target_parcel, payload, event.log_ms, state, echo)
 
+            if target_parcel.closedTS is not None and id(target_parcel) in unreported:
+                if retention is None:
+                    yield unreported.pop(id(target_parcel))
+                else:
+                    # Held for late messages; _evict() yields it when its grace is over
+                    closed.append((retention["now"], *unreported.pop(id(target_parcel))))
+
+    if flush:
+        yield from _held(state)
+
+
+def _iter_numbered(lines, tokenizer="fast", echo=True, retention=None):
+    return _correlate(_decode_lines(lines, tokenizer), new_state(retention), echo, flush=True)
+
+
+def iter_parcels(source, tokenizer="fast", echo=True, retention=None):
+    """
+    Stream parcel records from a log given as text, bytes, a path or a
+    file object (text or binary). Each record is yielded when its parcel
+    closes; messages that arrive later for the same hostId still update the
+    yielded record in place. Parcels still open at the end come last.
+    tokenizer selects the line splitter: "fast" (default) or "regex".
+    echo=False skips printing every message (much faster on large logs).
+    With *retention* (message_engine.new_retention()) memory stays flat on
+    multi-day logs: a record is yielded, final, once its grace after closing
+    is over, and parcels open too long come out with status "stale".
+    """
+    for _, parcel in _iter_numbered(iter_lines(source), tokenizer, echo, retention):
+        yield parcel
+
+
+def parse_log(text, tokenizer="fast", echo=True):
+    """Parse a whole log (anything iter_parcels accepts) → list in creation order."""
+    numbered = _iter_numbered(iter_lines(text), tokenizer, echo)
+    return [parcel for _, parcel in sorted(numbered, key=itemgetter(0))]
+
+
+
+# --- Parallel parser -----------------------------------------------
+# Worker processes tokenize and decode byte ranges of the file; the parent
+# feeds the decoded lines to _correlate() in log order, so parcels that are
+# registered in one range and closed in another come out exactly as they
+# do from parse_log(). A range comes back packed as per-line columns, its
+# message bodies joined into one string, rather than as one Event per
+# line: pickling and unpickling are what the parent cannot spread over
+# the workers, and objects are the slow part of both.
+
+PARALLEL_CHUNK_BYTES = 16 << 20
+
+
+def _decode_range(path, start, end, tokenizer):
+    """Decoded lines of a byte range, packed for the parent (see _unpack_range)."""
+    columns = pics, host_ids, codes, log_ms, plc_ms, msg_ids, types, locations, bodies, parts_or_none, payloads = (
+        [], [], [], [], [], [], [], [], [], [], []
+    )
+    deferred = []
+    for pic, host_id, code, event, parts, payload in _decode_lines(
+        iter_lines(read_range(path, start, end)), tokenizer
+    ):
+        pics.append(pic)
+        host_ids.append(host_id)
+        codes.append(code)
+        log_ms.append(event.log_ms)
+        plc_ms.append(event.plc_ms)
+        msg_ids.append(event.msg_id)  # interned: pickled once per range
+        types.append(event.type)
+        locations.append(event.location)
+        bodies.append(event.body)
+        parts_or_none.append(parts)
+        if payload is _DEFERRED:  # a sentinel does not survive pickling
+            deferred.append(len(payloads))
+            payload = None
+        payloads.append(payload)
+    return *columns[:8], "\n".join(bodies), *columns[9:], deferred
+
+
+def _unpack_range(packed):
+    """_decode_lines() output of one range from what _decode_range() returned."""
+    pics, host_ids, codes, log_ms, plc_ms, msg_ids, types, locations, bodies, parts_or_none, payloads, deferred = packed
+    for i in deferred:
+        payloads[i] = _DEFERRED
+    events = map(Event, log_ms, plc_ms, msg_ids, types, locations, bodies.split("\n"))
+    return zip(pics, host_ids, codes, events, parts_or_none, payloads)
+
+
+def _decode_parallel(path, workers, chunk_bytes, tokenizer):
+    workers = workers or os.cpu_count() or 1
+    ranges = iter(line_aligned_ranges(path, chunk_bytes))
+    pool = ProcessPoolExecutor(max_workers=workers)
     try:
-        with open(input_file, "r", encoding="utf-8") as f:
-            log_text = f.read()
+        # Keep a bounded window of ranges in flight so decoded results never
+        # pile up faster than the parent can correlate them.
+        in_flight = deque(
+            pool.submit(_decode_range, path, start, end, tokenizer)
+            for start, end in islice(ranges, 2 * workers)
+        )
+        while in_flight:
+            decoded = in_flight.popleft().result()
+            for start, end in islice(ranges, 1):
+                in_flight.append(pool.submit(_decode_range, path, start, end, tokenizer))
+            yield from _unpack_range(decoded)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def iter_parcels_parallel(path, workers=None, chunk_bytes=PARALLEL_CHUNK_BYTES, tokenizer="fast", echo=True,
+                          retention=None):
+    """iter_parcels() for a log file on disk, decoding it in *workers* processes."""
+    decoded = _decode_parallel(path, workers, chunk_bytes, tokenizer)
+    for _, parcel in _correlate(decoded, new_state(retention), echo, flush=True):
+        yield parcel
+
+
+def parse_log_parallel(path, workers=None, chunk_bytes=PARALLEL_CHUNK_BYTES, tokenizer="fast", echo=True):
+    """parse_log() for a log file on disk, decoding it in *workers* processes."""
+    # What the parent does bounds the speedup, and most of it was the cyclic
+    # GC walking the growing parcel list, which has no cycles to find.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        numbered = _correlate(_decode_parallel(path, workers, chunk_bytes, tokenizer), echo=echo)
+        return [parcel for _, parcel in sorted(numbered, key=itemgetter(0))]
+    finally:
+        if enabled:
+            gc.enable()
 
-        parsed_data = parse_log(log_text)
 
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(parsed_data, f, indent=4)
+if __name__ == "__main__":
+    from batch_parse import main
 
-        print(f"\n✅ Parsed data saved to '{output_file}'")
-    except FileNotFoundError:
-        print(f"Error: The file '{input_file}' was not found.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    main(default_parser="kj")
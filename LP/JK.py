@@ -1,28 +1,15 @@
-import re
-import json
 from collections import defaultdict
-from datetime import datetime
-
-# --- Message-type mapping ------------------------------------------
-ID_MAP = {
-    "1": "ItemRegister",
-    "2": "ItemPropertiesUpdate",
-    "3": "ItemInstruction",
-    "5": "UnverifiedSortReport",
-    "6": "VerifiedSortReport",
-    "7": "ItemDeRegister",
-    "98": "WatchdogReply",
-    "99": "WatchdogRequest",
-}
-
-# --- Regex helpers -------------------------------------------------
-LOG_TS = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3})')
-RAW_BODY = re.compile(r'\): (.*?)(?: \[\]$)')
-LOC_PAT = re.compile(r'\b\d{4}\.\d{4}\.\d{4}\.B\d{2}\b') # chute/station code
+from itertools import count
+from operator import itemgetter
+
+from log_reader import iter_lines
+from log_tokenizer import find_z_time
+from message_engine import (LOC_PAT, add_barcodes, expired, log_clock, mark_opened, message_name, minute_seconds,
+                            plc_clock, run, update_volume)
 
 # --- Main parser ---------------------------------------------------
-def parse_log(text: str):
-    parcels = defaultdict(lambda: {
+def _new_parcel():
+    return {
         "pic": None,
         "hostId": None,
         "barcodes": [],
@@ -40,153 +27,209 @@ def parse_log(text: str):
             "box_volume": None,  # Corresponds to 'Calculated Volume' in the document
             "real_volume": None
         }
-    })
-
-    for line in text.splitlines():
-        ts_m, body_m = LOG_TS.search(line), RAW_BODY.search(line)
-        if not (ts_m and body_m):
-            continue
-
-        ts_iso = datetime.strptime(
-            f"{ts_m.group(1)}.{ts_m.group(2)}", "%Y-%m-%d %H:%M:%S.%f"
-        ).isoformat()
-
-        parts = body_m.group(1).strip().split("|")
-        if len(parts) < 6 or ID_MAP.get(parts[3], "").startswith("Watchdog"):
-            continue
-
-        try:
-            pic = int(parts[4])
-        except ValueError:
-            continue
-
-        host_id = parts[5].strip()
-        if not host_id:
-            continue
-
-        parcel = parcels[host_id]
-        parcel["pic"] = pic
-        parcel["hostId"] = host_id
-
-        msg = ID_MAP.get(parts[3], f"Type{parts[3]}")
-
-        if not parcel["location"]:
-            loc_m = LOC_PAT.search("|".join(parts))
-            if loc_m:
-                parcel["location"] = loc_m.group(0)
-
-        if msg == "ItemRegister":
-            parcel["lifeCycle"]["registeredAt"] = (
-                parcel["lifeCycle"]["registeredAt"] or ts_iso
-            )
-
-        elif msg == "ItemInstruction":
-            if len(parts) >= 7:
-                parcel["location"] = parcel["location"] or parts[6]
-            if len(parts) >= 8:
-                parcel["destination"] = parcel["destination"] or parts[7]
-
-        elif msg == "ItemPropertiesUpdate":
-            if len(parts) >= 7:
-                parcel["location"] = parcel["location"] or parts[6]
-
-            # Define a helper function to validate and add barcodes
-            def add_valid_barcode(barcode_str, parcel_barcodes_list):
-                # A barcode is considered valid if it starts with "0]C"
-                if barcode_str and barcode_str.startswith("0]C") and barcode_str not in parcel_barcodes_list:
-                    parcel_barcodes_list.append(barcode_str)
-
-            # Helper to process a potential barcode string (which might contain multiple barcodes separated by '@')
-            def process_barcode_field(field_content, barcode_list):
-                if field_content:
-                    # Split by '@' to handle concatenated barcodes
-                    potential_barcodes = field_content.split('@')
-                    for pb in potential_barcodes:
-                        # Apply lstrip("0") ONLY IF it's not a "0]C" barcode and seems like a numerical ID
-                        if not pb.startswith("0]C"):
-                            pb = pb.lstrip("0")
-                        add_valid_barcode(pb, barcode_list)
-
-            # Try to extract barcode(s) from parts[8]
-            if len(parts) >= 9:
-                process_barcode_field(parts[8], parcel["barcodes"])
-
-            # Try to extract barcode(s) from parts[9] (semicolon-separated), specifically semis[2]
-            if len(parts) >= 10:
-                semis = parts[9].split(";")
-                if len(semis) >= 3:
-                    process_barcode_field(semis[2], parcel["barcodes"])
-                
-                # Check for barcode error based on the first semi-colon part
-                if semis and semis[0] != "6":
-                    parcel["barcodeErr"] = True
-            
-            # --- MODIFIED: Volume Data Extraction from ItemPropertiesUpdate message ---
-            # Based on the user's provided log line example, the volume data is in parts[12],
-            # which is itself a semicolon-separated string.
-            if len(parts) >= 13: # Ensure parts[12] exists
-                volume_data_str = parts[12]
-                volume_semis = volume_data_str.split(';')
-
-                if len(volume_semis) >= 7: # Ensure enough sub-parts for length, width, height, box, real volume
-                    try:
-                        parcel["volume_data"]["length"] = float(volume_semis[2])
-                    except (ValueError, IndexError):
-                        pass
-                    try:
-                        parcel["volume_data"]["width"] = float(volume_semis[3])
-                    except (ValueError, IndexError):
-                        pass
-                    try:
-                        parcel["volume_data"]["height"] = float(volume_semis[4])
-                    except (ValueError, IndexError):
-                        pass
-                    try:
-                        parcel["volume_data"]["box_volume"] = float(volume_semis[5])
-                    except (ValueError, IndexError):
-                        pass
-                    try:
-                        parcel["volume_data"]["real_volume"] = float(volume_semis[6])
-                    except (ValueError, IndexError):
-                        pass
-            # --- END MODIFIED ---
-
-        elif msg == "VerifiedSortReport":
-            parcel["lifeCycle"]["status"] = "sorted"
-
-        elif msg == "ItemDeRegister":
-            if parcel["lifeCycle"]["status"] != "sorted":
-                parcel["lifeCycle"]["status"] = "deregistered"
-            parcel["lifeCycle"]["closedAt"] = ts_iso
-
-        parcel["events"].append({
-            "ts": ts_iso,
-            "type": msg,
-            "raw": "|".join(parts)
-        })
-    
-    # After processing all lines, iterate through parcels to set barcode_count
-    for parcel_data in parcels.values():
-        parcel_data["barcode_count"] = len(parcel_data["barcodes"])
-
-    return list(parcels.values())
-
-# --- Main execution ------------------------------------------------
-if __name__ == "__main__":
-    input_file = input("Enter the log file name (e.g., log.txt): ").strip()
-    output_file = input_file.replace(".txt", ".json")
+    }
 
-    try:
-        with open(input_file, "r", encoding="utf-8") as f:
-            log_text = f.read()
 
-        parsed_data = parse_log(log_text)
+# ── per-type updates: (parcel, parts, ts) ─────────────────────────
+def _update_registered(parcel, parts, ts):
+    parcel["lifeCycle"]["registeredAt"] = (
+        parcel["lifeCycle"]["registeredAt"] or ts
+    )
+
+
+def _update_instruction(parcel, parts, ts):
+    if len(parts) >= 7:
+        parcel["location"] = parcel["location"] or parts[6]
+    if len(parts) >= 8:
+        parcel["destination"] = parcel["destination"] or parts[7]
+
+
+def _update_properties(parcel, parts, ts):
+    if len(parts) >= 7:
+        parcel["location"] = parcel["location"] or parts[6]
+
+    # Barcode(s) from parts[8], then from parts[9] (semicolon-separated), specifically semis[2]
+    if len(parts) >= 9:
+        add_barcodes(parts[8], parcel["barcodes"])
+
+    if len(parts) >= 10:
+        semis = parts[9].split(";")
+        if len(semis) >= 3:
+            add_barcodes(semis[2], parcel["barcodes"])
+
+        # Check for barcode error based on the first semi-colon part
+        if semis[0] != "6":
+            parcel["barcodeErr"] = True
+
+    parcel["barcode_count"] = len(parcel["barcodes"])
+
+    # Volume data is in parts[12], itself a semicolon-separated string
+    if len(parts) >= 13:
+        update_volume(parcel["volume_data"], parts[12])
+
+
+def _update_sorted(parcel, parts, ts):
+    parcel["lifeCycle"]["status"] = "sorted"
+
+
+def _update_deregistered(parcel, parts, ts):
+    if parcel["lifeCycle"]["status"] != "sorted":
+        parcel["lifeCycle"]["status"] = "deregistered"
+    parcel["lifeCycle"]["closedAt"] = ts
+
+
+def _handlers(parcels, unreported, retention=None):
+    """
+    message_engine handler table over *parcels* (a defaultdict of _new_parcel)
+    and *unreported* (hostId -> creation_index of parcels not yet yielded).
+    Times are int epoch ms: the log-line header for the lifecycle and an
+    event's "log_ts", the PLC stamp in the body for its "plc_ts".
+    """
+    log_ms, plc_ms = log_clock(), plc_clock()
+    created = count()
+
+    def message(msg, update=None):
+        def handle(pic, host_id, body, parts, date, time, line, offset):
+            ts = log_ms(date, time, line)
+            if ts is None:
+                return None
+
+            if not host_id:
+                return None
+
+            if host_id not in parcels:
+                unreported[host_id] = next(created)
+                if retention is not None:
+                    mark_opened(retention, host_id)
+            parcel = parcels[host_id]
+            parcel["pic"] = pic
+            parcel["hostId"] = host_id
+
+            if not parcel["location"]:
+                loc_m = LOC_PAT.search(body)
+                if loc_m:
+                    parcel["location"] = loc_m.group(0)
+
+            if update is not None:
+                update(parcel, parts, ts)
+
+            z_time = find_z_time(body, parts)
+            parcel["events"].append({
+                "plc_ts": plc_ms(z_time) if z_time else None,
+                "log_ts": ts,
+                "type": msg or message_name(parts[3]),
+                "raw": body
+            })
+
+            if parcel["lifeCycle"]["status"] != "open" and host_id in unreported:
+                if retention is None:
+                    return unreported.pop(host_id), parcel
+                # Held for late messages; evict() yields it when its grace is over
+                retention["closed"].append((retention["now"], unreported.pop(host_id), parcel))
+            return None
+        return handle
+
+    table = {
+        1: message("ItemRegister", _update_registered),
+        2: message("ItemPropertiesUpdate", _update_properties),
+        3: message("ItemInstruction", _update_instruction),
+        5: message("UnverifiedSortReport"),
+        6: message("VerifiedSortReport", _update_sorted),
+        7: message("ItemDeRegister", _update_deregistered),
+    }
+    default = message(None)
+    if retention is None:
+        return table, default
+
+    # With a retention every handler moves its clock (log-line time) on and
+    # returns the list of parcels evicted, if any.
+    evicted = retention["evicted"]
+
+    def evict(now):
+        closed, stale = expired(retention, now)
+        out = []
+        for _, index, parcel in closed:
+            if parcels.get(parcel["hostId"]) is parcel:
+                del parcels[parcel["hostId"]]
+            out.append((index, parcel))
+        evicted["closed"] += len(closed)
+
+        for key in stale:
+            index = unreported.pop(key, None)
+            if index is not None:
+                parcel = parcels.pop(key)
+                parcel["lifeCycle"]["status"] = "stale"
+                out.append((index, parcel))
+                evicted["stale"] += 1
+        return out or None
+
+    def ticking(handle):
+        def handle_ticking(pic, host_id, body, parts, date, time, line, offset):
+            out = None
+            minute = f"{date} {time[:5]}"
+            if minute > retention["minute"]:
+                now = minute_seconds(date, time[:5])
+                if now is not None:
+                    retention["minute"] = minute
+                    out = evict(now)
+            handle(pic, host_id, body, parts, date, time, line, offset)
+            return out
+        return handle_ticking
+
+    return {code: ticking(handle) for code, handle in table.items()}, ticking(default)
+
+
+def _iter_numbered(lines, tokenizer="fast", retention=None):
+    """
+    Yield (creation_index, parcel) as each parcel closes, then the rest.
+    With *retention*, closed parcels leave the state after their grace and
+    open ones after the stale timeout (see iter_parcels).
+    """
+    parcels = defaultdict(_new_parcel)
+    unreported = {}  # hostId -> creation_index, creation order
+
+    results = run(lines, *_handlers(parcels, unreported, retention), tokenizer)
+    if retention is None:
+        yield from results
+    else:
+        for evicted in results:
+            yield from evicted
+        for _, index, parcel in retention["closed"]:
+            yield index, parcel
+
+    for host_id, index in unreported.items():
+        yield index, parcels[host_id]
+
+
+def iter_parcels(source, tokenizer="fast", retention=None):
+    """
+    Stream parcel records from a log given as text, bytes, a path or a
+    file object (text or binary). Each record is yielded once its parcel is
+    sorted or deregistered; later messages for the same hostId still update
+    the yielded dict in place. Parcels still open at the end come last.
+    tokenizer selects the line splitter: "fast" (default) or "regex".
+    With *retention* (message_engine.new_retention()) memory stays flat on
+    multi-day logs: a record is yielded, final, once its grace after closing
+    is over, and parcels open too long come out with status "stale".
+    """
+    for _, parcel in _iter_numbered(iter_lines(source), tokenizer, retention):
+        yield parcel
+
+
+def parse_log(text, tokenizer="fast"):
+    """Parse a whole log (anything iter_parcels accepts) → list in creation order."""
+    numbered = _iter_numbered(iter_lines(text), tokenizer)
+    return [parcel for _, parcel in sorted(numbered, key=itemgetter(0))]
+
+
+def parse_log_table(text, tokenizer="fast"):
+    """parse_log() as typed columnar tables (parcels, barcodes, events)."""
+    from parcel_table import build_parcel_tables  # pandas is only needed here
+
+    return build_parcel_tables(parse_log(text, tokenizer), layout="jk")
 
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(parsed_data, f, indent=4)
+# --- Main execution ------------------------------------------------
+if __name__ == "__main__":
+    from batch_parse import main
 
-        print(f"\n✅ Parsed data saved to '{output_file}'")
-    except FileNotFoundError:
-        print(f"Error: The file '{input_file}' was not found.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file
+    main(default_parser="jk")
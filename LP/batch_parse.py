@@ -0,0 +1,208 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from log_tokenizer import new_stats
+from message_engine import CLOSED_GRACE_S, STALE_AFTER_S, new_retention
+from parcel_sinks import SETTLE_PARCELS, open_sink
+
+# KJ.py lives one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Batch parsing CLI ---------------------------------------------
+# Parses many logs (files, globs or directories of rotated logs) in a pool
+# of worker processes and writes each result next to its input:
+# "logs.txt" → "logs.jsonl", "logs.txt.1" → "logs.txt.1.jsonl". JSON Lines
+# and Parquet are streamed through parcel_sinks as parcels close; "json"
+# still writes one indented array in creation order. Silent apart from one
+# timing line per file; a file that fails is reported and the rest of the
+# batch carries on (the exit status is 1 if any failed).
+#
+#   python LP/batch_parse.py /var/log/sorter1 "archive/*.txt.*" --workers 4
+#   python KJ.py logs.txt --format parquet   (KJ.py, LP/JK.py and
+#   python LP/JK.py logs/ -p hlc              LP/hlc_parser.py run this
+#                                             with their own parser default)
+
+LOG_PATTERNS = ("*.txt", "*.log", "*.txt.*", "*.log.*")  # what a directory contributes
+LOG_SUFFIXES = (".txt", ".log")
+OUTPUT_FORMATS = ("jsonl", "parquet", "json")
+RESULT_SUFFIXES = tuple(f".{fmt}" for fmt in OUTPUT_FORMATS)
+
+
+def _parse_kj(f, tokenizer, echo, stats, stream, retention):
+    import KJ
+
+    if stream:
+        return KJ.iter_parcels(f, tokenizer, echo=echo, retention=retention)
+    return [parcel.to_dict() for parcel in KJ.parse_log(f, tokenizer, echo=echo)]
+
+
+def _parse_hlc(f, tokenizer, echo, stats, stream, retention):
+    import hlc_parser
+
+    if stream:
+        return hlc_parser.iter_parcels(f, tokenizer, stats, retention)
+    return hlc_parser.parse_log(f, tokenizer)
+
+
+def _parse_jk(f, tokenizer, echo, stats, stream, retention):
+    import JK
+
+    if stream:
+        return JK.iter_parcels(f, tokenizer, retention)
+    return JK.parse_log(f, tokenizer)
+
+
+# parser -> (records function, json.dump options of its "json" output)
+PARSERS = {
+    "kj": (_parse_kj, {"indent": 4}),
+    "hlc": (_parse_hlc, {"ensure_ascii": False, "indent": 2}),
+    "jk": (_parse_jk, {"indent": 4}),
+}
+EVICTING_PARSERS = ("kj", "hlc", "jk")  # the ones that take a message_engine retention
+
+
+def output_path(path: str, output_dir=None, fmt="jsonl") -> str:
+    """Where the result for a log goes: its .txt/.log extension replaced, else the format's appended."""
+    stem, ext = os.path.splitext(path)
+    target = f"{stem if ext.lower() in LOG_SUFFIXES else path}.{fmt}"
+    if output_dir:
+        target = os.path.join(output_dir, os.path.basename(target))
+    return target
+
+
+def expand_inputs(inputs, patterns=LOG_PATTERNS, recursive=False) -> list[str]:
+    """Log files named by *inputs* (files, globs, directories), sorted and without duplicates."""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in patterns:
+                found.extend(glob.glob(os.path.join(item, "**" if recursive else "", pattern),
+                                       recursive=recursive))
+        elif os.path.isfile(item):
+            found.append(item)
+        else:
+            found.extend(glob.glob(item, recursive=True))
+    files = {os.path.normpath(path) for path in found
+             if os.path.isfile(path) and not path.endswith(RESULT_SUFFIXES)}
+    return sorted(files)
+
+
+def parse_file(parser, path, output, fmt="jsonl", tokenizer="fast", echo=False, evict=False) -> dict:
+    """
+    Parse one log and write its result; returns a summary for the timing line.
+    evict=True keeps the parser's memory flat on multi-day logs (jsonl and
+    parquet only; see message_engine.new_retention).
+    """
+    records_of, dump_options = PARSERS[parser]
+    stats = new_stats()
+    retention = new_retention() if evict else None
+    start = time.perf_counter()
+    # Write to a temporary name so a killed run never leaves half a result behind
+    partial = output + ".part"
+    with open(path, "rb") as f:
+        if fmt == "json":
+            records = records_of(f, tokenizer, echo, stats, False, None)
+            parsed = time.perf_counter()
+            with open(partial, "w", encoding="utf-8") as out:
+                json.dump(records, out, **dump_options)
+            count = len(records)
+        else:
+            # Evicted records are final, the settle window is only needed without
+            sink = open_sink(partial, parser, settle=0 if evict else SETTLE_PARCELS, fmt=fmt)
+            try:
+                for parcel in records_of(f, tokenizer, echo, stats, True, retention):
+                    sink.write(parcel)
+            finally:
+                sink.close(stats if stats["lines"] else None)  # only hlc_parser counts lines
+            parsed = time.perf_counter()  # parsing and writing overlap
+            count = sink.count
+    os.replace(partial, output)
+
+    return {"path": path, "output": output, "parcels": count, "bytes": os.path.getsize(path),
+            "parse_s": parsed - start, "total_s": time.perf_counter() - start}
+
+
+def _up_to_date(path, output) -> bool:
+    return os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(path)
+
+
+def run_batch(files, parser="kj", workers=None, fmt="jsonl", tokenizer="fast", echo=False, output_dir=None,
+              skip_up_to_date=False, evict=False, report=print) -> list[dict]:
+    """
+    Parse *files* in *workers* processes (None = one per CPU). Returns one
+    summary per file, in completion order; a failed file has an "error".
+    """
+    jobs = [(path, output_path(path, output_dir, fmt)) for path in files]
+    if skip_up_to_date:
+        for path, output in jobs:
+            if _up_to_date(path, output):
+                report(f"skip  {path} (up to date)")
+        jobs = [(path, output) for path, output in jobs if not _up_to_date(path, output)]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(parse_file, parser, path, output, fmt, tokenizer, echo, evict): path for path, output in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"path": futures[future], "error": f"{type(e).__name__}: {e}"}
+                report(f"FAIL  {result['path']}: {result['error']}")
+            else:
+                report(f"ok    {result['path']} → {result['output']}  {result['parcels']:,} parcels  "
+                       f"{result['bytes'] / 1e6:,.1f} MB in {result['parse_s']:.2f}s "
+                       f"({result['bytes'] / 1e6 / max(result['parse_s'], 1e-9):,.1f} MB/s), "
+                       f"written in {result['total_s'] - result['parse_s']:.2f}s")
+            results.append(result)
+    return results
+
+
+# --- CLI -----------------------------------------------------------
+def main(argv=None, default_parser="kj"):
+    cli = argparse.ArgumentParser(description="Parse viMessageSocket logs to JSON Lines / Parquet, many files in parallel.")
+    cli.add_argument("inputs", nargs="+", help="log files, globs or directories")
+    cli.add_argument("-p", "--parser", choices=sorted(PARSERS), default=default_parser)
+    cli.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    cli.add_argument("-r", "--recursive", action="store_true", help="also look in subdirectories")
+    cli.add_argument("--pattern", action="append",
+                     help=f"file pattern inside directories, repeatable (default: {' '.join(LOG_PATTERNS)})")
+    cli.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="jsonl",
+                     help="jsonl and parquet are streamed as parcels close; json is one indented array")
+    cli.add_argument("-o", "--output-dir", help="write the results here instead of next to each log")
+    cli.add_argument("--skip-up-to-date", action="store_true",
+                     help="skip logs whose result is newer than the log (nightly re-runs)")
+    cli.add_argument("--evict", action="store_true",
+                     help=f"bound memory on multi-day logs: drop parcels {CLOSED_GRACE_S}s (log time) after they "
+                          f"close and flush ones open for {STALE_AFTER_S}s as \"stale\" (jsonl/parquet)")
+    cli.add_argument("--tokenizer", choices=["fast", "regex"], default="fast")
+    cli.add_argument("-v", "--verbose", action="store_true", help="let KJ print every message it reads")
+    args = cli.parse_args(argv)
+
+    if args.evict and (args.format == "json" or args.parser not in EVICTING_PARSERS):
+        cli.error(f"--evict needs a streamed format and one of the {'/'.join(EVICTING_PARSERS)} parsers")
+    files = expand_inputs(args.inputs, args.pattern or LOG_PATTERNS, args.recursive)
+    if not files:
+        cli.error("no log files found")
+
+    start = time.perf_counter()
+    results = run_batch(files, args.parser, args.workers, args.format, args.tokenizer, args.verbose,
+                        args.output_dir, args.skip_up_to_date, args.evict)
+    failed = [result for result in results if "error" in result]
+    parsed = len(results) - len(failed)
+    total_bytes = sum(result["bytes"] for result in results if "error" not in result)
+    print(f"\n✅ {parsed} of {len(results)} logs parsed with {args.parser} "
+          f"({total_bytes / 1e6:,.1f} MB) in {time.perf_counter() - start:.2f}s"
+          + (f", {len(failed)} failed" if failed else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,263 @@
+import os
+from datetime import datetime, timedelta
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
-from collections import Counter
-from hlc_parser import parse_log
+from hlc_parser import parse_log_table
+from kpis import compute_kpis
+from live_log import LiveLog
+from parcel_sinks import FORMATS, load_tables
+from parcel_store import STORE_PATH, ParcelStore
+from parcel_cube import cube_of_tables
+from parcel_table import window, with_times
+from time_series import series_of
+from parse_cache import PARSE_CACHE, content_hash
 
 from views.parcel_search import parcel_search_view
+from views.activity import activity_view
 from views.all_parcels import all_parcels_view
+from views.chutes import chutes_view
+from views.throughput import throughput_view
 
 # ── Streamlit UI Setup ─────────────────────────────────────────────
 st.set_page_config(page_title="Vanderlande Parcel Dashboard", layout="wide")
 st.title("📦 Vanderlande Parcel Dashboard")
 
-# ── File Upload ────────────────────────────────────────────────────
-uploaded = st.file_uploader("Upload raw Log File in .txt format", type="txt")
-if not uploaded:
-    st.info("Upload Raw Log file.")
-    st.stop()
-
-text = uploaded.read().decode("utf-8")
-with st.spinner("Parsing log…"):
-    lifecycles = parse_log(text)
-    df = pd.DataFrame(lifecycles)
-
-# ── Metrics Calculation ────────────────────────────────────────────
-total = len(df)
-sorted_cnt = (df.lifeCycle.apply(lambda x: x["status"]) == "sorted").sum()
-dereg_cnt = (df.lifeCycle.apply(lambda x: x["status"]) == "deregistered").sum()
-barcode_err = df.barcodeErr.sum()
-
-def cycle_s(lc):
-    try:
-        if isinstance(lc["registeredAt"], str) and isinstance(lc["closedAt"], str):
-            return (
-                datetime.fromisoformat(lc["closedAt"])
-                - datetime.fromisoformat(lc["registeredAt"])
-            ).total_seconds()
-    except Exception:
+# ── Log Source ─────────────────────────────────────────────────────
+LIVE_REFRESH_S = 0.5
+
+
+@st.cache_resource
+def live_log(path):
+    """One follower per path, shared by every session."""
+    return LiveLog(path)
+
+
+@st.cache_resource
+def parcel_store(path):
+    return ParcelStore(path)
+
+
+def upload_hash(uploaded) -> str:
+    """content_hash() of an upload, read once per file rather than on every rerun."""
+    file_id, digest = st.session_state.get("upload_hash", (None, None))
+    if file_id != uploaded.file_id:
+        digest = content_hash(uploaded)
+        st.session_state["upload_hash"] = (uploaded.file_id, digest)
+    return digest
+
+
+@st.cache_resource(max_entries=4)
+def stored_tables(path, start_ms, end_ms, version):
+    """Stored parcels of a day range, read once per store version."""
+    return parcel_store(path).load(start_ms, end_ms)
+
+
+def show_kpis(parcels):
+    kpis = compute_kpis(parcels)
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.metric("Total Parcels", kpis["total"])
+        st.metric("% Sorted", f"{kpis['pct_sorted']:.1f}%")
+    with c2:
+        st.metric("% Barcode Err", f"{kpis['pct_barcode_err']:.1f}%")
+        st.metric("% Deregistered", f"{kpis['pct_deregistered']:.1f}%")
+        st.metric("% Stale", f"{kpis['pct_stale']:.1f}%", help="open parcels flushed after the stale timeout (--evict)")
+    with c3:
+        st.metric("Avg Cycle (s)", f"{kpis['avg_cycle_s']:.1f}", help=f"p50 {kpis['p50_cycle_s']:.1f}s · p95 {kpis['p95_cycle_s']:.1f}s")
+        st.metric("Throughput (tph)", f"{kpis['tph']:.1f}")
+
+
+MINUTE_MS = 60_000
+_EPOCH = datetime(1970, 1, 1)
+
+
+def time_window(tables, key):
+    """
+    Shift / incident window slider over the log's time span, in whole
+    minutes → (start_ms, end_ms) or None for the whole log. A window that
+    reaches the end keeps following it as a live log grows.
+    """
+    span = tables.times.span()
+    if span is None:
+        return None
+    first, last = span[0] - span[0] % MINUTE_MS, span[1] - span[1] % MINUTE_MS + MINUTE_MS
+    lo, hi = (_EPOCH + timedelta(milliseconds=ms) for ms in (first, last))
+
+    state, max_key = st.session_state, f"{key}_max"
+    if key in state:
+        start, end = state[key]
+        if end == state.get(max_key) or end > hi:
+            end = hi
+        start = min(max(start, lo), end)
+        state[key] = (start, end)
+    state[max_key] = hi
+    start, end = st.slider(
+        "Time window", min_value=lo, max_value=hi, step=timedelta(minutes=1), key=key,
+        format="HH:mm" if lo.date() == hi.date() else "MM-DD HH:mm",
+        **({} if key in state else {"value": (lo, hi)}),
+    )
+    if (start, end) == (lo, hi):
         return None
+    return (start - _EPOCH) // timedelta(milliseconds=1), (end - _EPOCH) // timedelta(milliseconds=1) - 1
+
+
+source = st.radio("Log source", ["Upload file", "Follow live file", "History store"], horizontal=True)
+store = None  # searched instead of the tables in History store mode
+
+if source == "Upload file":
+    uploaded = st.file_uploader(
+        "Upload a raw log (.txt) or a parsed result (.jsonl / .parquet from batch_parse.py)",
+        type=["txt", "jsonl", "parquet"],
+    )
+    if not uploaded:
+        st.info("Upload Raw Log file.")
+        st.stop()
+
+    digest = upload_hash(uploaded)
+    result_ext = os.path.splitext(uploaded.name)[1].lower()
+    if result_ext in FORMATS:
+        # Already parsed: load the records, no log to re-parse or keep raw lines in
+        fmt = FORMATS[result_ext]
+        with st.spinner("Loading parsed result…"):
+            try:
+                tables, cache_origin, load_s = PARSE_CACHE.load(
+                    uploaded, lambda f: load_tables(f, fmt), name=f"parcel_sinks.load_tables({fmt})", digest=digest,
+                )
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+    else:
+        raw_refs = st.toggle(
+            "Keep raw lines in the log file", value=True,
+            help="Events point into a memory-mapped copy of the log instead of holding their own text.",
+        )
+
+        if raw_refs and uploaded.size > PARSE_CACHE.max_source_bytes:
+            st.caption("The log is too big to keep a copy of; its raw lines are held in memory instead.")
+            raw_refs = False
+
+        with st.spinner("Parsing log…"):
+            if raw_refs:
+                # The copy is only mapped on a miss, or to re-attach it to a disk hit (memory hits have it)
+                tables, cache_origin, load_s = PARSE_CACHE.load(
+                    uploaded, lambda f: parse_log_table(PARSE_CACHE.source_lines(f, digest), raw_refs=True),
+                    name="hlc_parser.parse_log_table(raw_refs)", digest=digest,
+                    restore=lambda cached: cached._replace(raw_lines=PARSE_CACHE.source_lines(uploaded, digest)),
+                )
+            else:
+                tables, cache_origin, load_s = PARSE_CACHE.load(
+                    uploaded, parse_log_table, name="hlc_parser.parse_log_table", digest=digest,
+                )
+
+    cache_label = {"memory": "cache hit (memory)", "disk": "cache hit (disk)", "parsed": "cache miss, parsed"}
+    st.caption(f"{uploaded.name}: {cache_label[cache_origin]} in {load_s:.2f}s")
+    if st.button("Save to history store", help=f"Keep this log's parcels in {STORE_PATH}"):
+        with st.spinner("Saving…"):
+            saved = parcel_store(STORE_PATH).ingest(uploaded.name, tables, digest)
+        st.success(f"{uploaded.name} is already in the store" if saved is None
+                   else f"Stored {saved:,} parcels of {uploaded.name}")
+
+    # ── Dashboard Metrics ──────────────────────────────────────────
+    shift = time_window(tables, f"window_{uploaded.name}")
+    view = window(tables, *shift) if shift else tables
+    show_kpis(view.parcels)
+
+elif source == "History store":
+    store_path = st.text_input("Parcel store (SQLite)", value=STORE_PATH)
+    store = parcel_store(store_path)
+    logs = store.logs()
+    if logs.empty:
+        st.info("The store is empty: save an uploaded log to it, or run `python parcel_store.py ingest <logs>`.")
+        st.stop()
+
+    first_day, last_day = logs["first"].min().date(), logs["last"].max().date()
+    days = st.date_input("Days", value=(last_day, last_day), min_value=first_day, max_value=last_day)
+    days = days if isinstance(days, tuple) else (days,)
+    if not days:
+        st.info("Pick a day or a range of days.")
+        st.stop()
+    start_day, end_day = days[0], days[-1]  # a range shows as one day while its end is being picked
+    start_ms = (datetime.combine(start_day, datetime.min.time()) - _EPOCH) // timedelta(milliseconds=1)
+    end_ms = (datetime.combine(end_day, datetime.min.time()) - _EPOCH) // timedelta(milliseconds=1) + 86_400_000 - 1
+    with st.spinner("Reading the store…"):
+        tables = stored_tables(store_path, start_ms, end_ms, store.version())
+    st.caption(f"{len(logs)} logs stored; {len(tables.parcels):,} parcels on the days picked. "
+               "Parcel Search looks through every stored log.")
+
+    shift = time_window(tables, "window_history")
+    view = window(tables, *shift) if shift else tables
+    show_kpis(view.parcels)
 
-df["cycle_time"] = df.lifeCycle.apply(cycle_s)
-cycle_vals = df["cycle_time"].dropna()
-avg_cycle = sum(cycle_vals) / len(cycle_vals) if len(cycle_vals) else 0
-
-registered_times = [
-    datetime.fromisoformat(l["registeredAt"])
-    for l in df.lifeCycle
-    if isinstance(l["registeredAt"], str)
-]
-
-closed_or_registered_times = [
-    datetime.fromisoformat(l["closedAt"]) if isinstance(l["closedAt"], str)
-    else datetime.fromisoformat(l["registeredAt"]) if isinstance(l["registeredAt"], str)
-    else None
-    for l in df.lifeCycle
-]
-closed_or_registered_times = [dt for dt in closed_or_registered_times if dt]
-
-if registered_times and closed_or_registered_times:
-    first_ts = min(registered_times)
-    last_ts = max(closed_or_registered_times)
-    duration = (last_ts - first_ts).total_seconds()
-    tph = total / (duration / 3600) if duration > 0 else 0
 else:
-    tph = 0
-
-# ── Dashboard Metrics ──────────────────────────────────────────────
-c1, c2, c3 = st.columns(3)
-with c1:
-    st.metric("Total Parcels", total)
-    st.metric("% Sorted", f"{sorted_cnt / total * 100:.1f}%" if total else "0%")
-with c2:
-    st.metric("% Barcode Err", f"{barcode_err / total * 100:.1f}%" if total else "0%")
-    st.metric("% Deregistered", f"{dereg_cnt / total * 100:.1f}%" if total else "0%")
-with c3:
-    st.metric("Avg Cycle (s)", f"{avg_cycle:.1f}")
-    st.metric("Throughput (tph)", f"{tph:.1f}")
+    live_path = st.text_input("Path of the log file being written", value=os.environ.get("LIVE_LOG_PATH", ""))
+    if not live_path:
+        st.info("Enter the path of a viMessageSocket log.")
+        st.stop()
+
+    live = live_log(live_path)
+    with st.spinner("Reading log…"):
+        while live.poll():  # catch up with what is already in the file
+            pass
+
+    # ── Dashboard Metrics (refreshed from each poll's delta) ───────
+    # The time index is rebuilt for the grown tables: on each rerun, and on each refresh only with a window
+    shift = time_window(with_times(live.tables), "window_live")
+
+    @st.fragment(run_every=LIVE_REFRESH_S)
+    def live_metrics():
+        live.poll()
+        lines, seconds = live.last_poll
+        st.caption(
+            f"Following {live_path}: +{lines} lines in {seconds * 1000:.0f} ms, "
+            f"{live.stats['lines']:,} lines total, {live.tail.rotations} rotations. "
+            "Tabs below update on the next interaction."
+        )
+        show_kpis(window(live.tables, *shift).parcels if shift else live.parcels)
+
+    live_metrics()
+    tables = with_times(live.tables)
+    view = window(tables, *shift) if shift else tables
 
 st.divider()
 
 # ── Tabs ───────────────────────────────────────────────────────────
-tab1, tab2, tab3 = st.tabs(["🔍 Parcel Search", "📦 All Parcels", "📊 Report"])
+tab1, tab2, tab4, tab5, tab6, tab3 = st.tabs(
+    ["🔍 Parcel Search", "📦 All Parcels", "📈 Throughput", "🧭 Chutes", "🌡️ Activity", "📊 Report"]
+)
 
 with tab1:
-    parcel_search_view(df)
+    parcel_search_view(tables, store)
 
 with tab2:
-    all_parcels_view(df)
+    all_parcels_view(view)
+
+with tab4:
+    # Series of the whole log, cut to the window, so bins at its edges count every parcel
+    if source != "Follow live file":
+        throughput_view(lambda bin_name: series_of(tables, bin_name), shift)
+    else:
+        throughput_view(live.series_frame, shift)
+
+with tab5:
+    # Built with the tables (and per window); live tables grow without one
+    chutes_view(view.cube if view.cube is not None else cube_of_tables(view.parcels, view.events))
+
+with tab6:
+    # Every event in the window, by event time (a window's tables hold its parcels' events)
+    activity_view(tables, shift)
 
 with tab3:
     st.subheader("📊 Message Type Summary")
     st.write("Breakdown of log messages by type:")
 
-    # Flatten all events from all parcels
-    all_events = sum(df["events"].tolist(), [])
-
-    # Count each message type
-    type_counts = Counter(event["type"] for event in all_events)
+    # Counted while parsing, plus the events that ended up on a parcel
+    log_counts = view.stats["messages"]
+    parcel_counts = view.events["type"].value_counts()
+    if shift:
+        st.caption("Counts are for the selected time window; skipped lines below cover the whole log.")
 
     # Label map
     display_mapping = {
@@ -106,15 +267,42 @@ with tab3:
         "UnverifiedSortReport": "5: Unverfied Sort Report",
         "VerifiedSortReport": "6: Verified Sort Report",
         "ItemDeRegister": "7: De-Register",
-        "RecirculationUpdate": "8: Recirculation Update"
+        "RecirculationUpdate": "8: Recirculation Update",
+        "WatchdogReply": "98: Watchdog Reply",
+        "WatchdogRequest": "99: Watchdog Request",
     }
+    # Unknown message types show up as "Type{n}"
+    for msg_type in sorted(set(log_counts) - set(display_mapping)):
+        display_mapping[msg_type] = f"{msg_type.removeprefix('Type')}: Unknown ({msg_type})"
 
     # Build report table
     rows = []
     for msg_type, label in display_mapping.items():
-        count = type_counts.get(msg_type, 0)
-        rows.append({"Message ID": label, "Count": count})
+        rows.append({
+            "Message ID": label,
+            "Count": log_counts.get(msg_type, 0),
+            "On Parcels": int(parcel_counts.get(msg_type, 0)),
+        })
 
     report_df = pd.DataFrame(rows)
 
-    st.dataframe(report_df, use_container_width=False)
+    st.dataframe(report_df, use_container_width=False, hide_index=True)
+
+    st.subheader("🚫 Skipped Lines")
+    skipped_labels = {
+        "not_a_message": "Not a viMessageSocket message",
+        "short_message": "Fewer than 6 fields",
+        "watchdog": "Watchdog heartbeat",
+        "bad_pic": "Non-numeric PIC",
+        "bad_timestamp": "Unreadable timestamp",
+        "no_host_id": "No hostId (non-register message)",
+    }
+    skipped = tables.stats["skipped"]
+    st.dataframe(
+        pd.DataFrame(
+            [{"Reason": label, "Lines": skipped.get(reason, 0)} for reason, label in skipped_labels.items()]
+            + [{"Reason": "Total lines read", "Lines": tables.stats["lines"]}]
+        ),
+        use_container_width=False,
+        hide_index=True,
+    )
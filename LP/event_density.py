@@ -0,0 +1,87 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from time_index import NAT
+
+# --- Event density -------------------------------------------------
+# Events per time bin × message type (or × induction location) over the
+# whole sorter, counted here so the browser only gets the binned matrix,
+# not millions of events. The bin width is the smallest of STEPS_MS that
+# covers the range in at most max_bins bins, so a full day comes in
+# 5-minute bins and a few minutes in seconds. The range is two binary
+# searches in the time index (time_index.TimeIndex); binning is one
+# bincount over (row, bin) pairs.
+
+STEPS_MS = (1_000, 5_000, 10_000, 30_000, 60_000, 300_000, 900_000, 1_800_000, 3_600_000)
+MAX_BINS = 300
+ROWS = ("type", "location")  # what a row of the matrix is
+MISSING = "—"
+
+
+def bin_width(start_ms: int, end_ms: int, max_bins: int = MAX_BINS) -> int:
+    """Smallest STEPS_MS width that splits [start_ms, end_ms] into at most *max_bins* bins."""
+    for step in STEPS_MS:
+        if (end_ms // step) - (start_ms // step) + 1 <= max_bins:
+            return step
+    return STEPS_MS[-1]
+
+
+def event_density(tables, start_ms=None, end_ms=None, by: str = "type", max_bins: int = MAX_BINS) -> pd.DataFrame:
+    """
+    Event counts of a parcel_table.ParcelTables with a time index (see
+    with_times), one row per message type or parcel location, one column
+    per bin (its start time); events without a time are left out. The
+    range defaults to the log's span and is inclusive.
+    """
+    if by not in ROWS:
+        raise ValueError(f"Unknown density rows '{by}', expected one of {ROWS}")
+    times, events = tables.times, tables.events
+    timed = times.event_ms[np.searchsorted(times.event_ms, NAT, side="right"):]
+    if not timed.size:
+        return pd.DataFrame(index=pd.Index([], name=by), columns=pd.DatetimeIndex([], name="bin"), dtype="int64")
+    start_ms = timed[0] if start_ms is None else start_ms
+    end_ms = timed[-1] if end_ms is None else end_ms
+
+    rows, ms = times.events_in_time_order(start_ms, end_ms)
+    step = bin_width(start_ms, end_ms, max_bins)
+    first = start_ms // step
+    n_bins = int(end_ms // step - first + 1)
+    bins = ms // step - first
+
+    if by == "type":
+        col = events["type"]
+        codes = col.cat.codes.to_numpy()[rows]
+    else:
+        col = tables.parcels["location"]
+        positions = tables.parcels.index.get_indexer(events["parcel_id"].to_numpy()[rows])
+        codes = np.where(positions >= 0, col.cat.codes.to_numpy()[positions], -1)
+    labels = [*col.cat.categories.astype(str), MISSING]
+    codes = np.where(codes >= 0, codes, len(labels) - 1).astype("int64")
+
+    counts = np.bincount(codes * n_bins + bins, minlength=len(labels) * n_bins).reshape(len(labels), n_bins)
+    used = counts.any(axis=1)
+    starts = pd.DatetimeIndex(((first + np.arange(n_bins)) * step).view("datetime64[ms]"), name="bin")
+    return pd.DataFrame(counts[used], index=pd.Index(np.array(labels)[used], name=by), columns=starts)
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Events per time bin and message type / location of a log.")
+    parser.add_argument("log_file", help="raw HLC log")
+    parser.add_argument("--by", choices=ROWS, default="type", help="one row per message type or location")
+    parser.add_argument("--bins", type=int, default=MAX_BINS, help="at most this many time bins")
+    parser.add_argument("-o", "--output", help="write the matrix here as CSV instead of printing it")
+    args = parser.parse_args()
+
+    from hlc_parser import parse_log_table
+
+    with open(args.log_file, "rb") as f:
+        density = event_density(parse_log_table(f), by=args.by, max_bins=args.bins)
+    if args.output:
+        density.to_csv(args.output)
+        print(f"✅ {density.shape[0]} × {density.shape[1]} bins saved to '{args.output}'")
+    else:
+        with pd.option_context("display.max_columns", 12, "display.width", 160):
+            print(density)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# --- Filter bitmaps ------------------------------------------------
+# One packed bitmap per value of each filterable parcels column (bit i =
+# parcels row i), built once per parse, so the All Parcels selectboxes
+# read their options off the index and a combination of filters is a
+# bitwise AND of a few bitmaps rather than a scan of the table. A missing
+# value has its own bitmap under None. The columns' category codes are
+# kept too, so the index of a subset of rows (a time window) is rebuilt
+# from the codes of those rows rather than from the full bitmaps. Any
+# categorical or bool column can be added to FILTERS.
+
+FILTERS = {  # selectbox label -> parcels column
+    "Status": "status",
+    "LOCATION": "location",
+    "DESTINATION": "destination",
+    "BARCODE ERR": "barcodeErr",
+}
+
+
+class FilterIndex:
+    def __init__(self, parcels: pd.DataFrame, columns=FILTERS.values()):
+        self.size = len(parcels)
+        self.codes = {}  # column -> (category codes per row, -1 = missing; categories)
+        for column in columns:
+            col = parcels[column]
+            if not isinstance(col.dtype, pd.CategoricalDtype):
+                col = col.astype("category")
+            self.codes[column] = col.cat.codes.to_numpy(), col.cat.categories.tolist()
+        self._build()
+
+    def _build(self):
+        self.bitmaps = {}  # column -> {value (None = missing) -> packed row bitmap}
+        for column, (codes, categories) in self.codes.items():
+            # Rows grouped by code with one sort; a value's rows are one slice of it
+            order = np.argsort(codes, kind="stable")
+            present, starts = np.unique(codes[order], return_index=True)
+            ends = np.r_[starts[1:], len(order)]
+            values = [None if code < 0 else categories[code] for code in present.tolist()]
+            self.bitmaps[column] = {
+                value: self._pack(order[start:end]) for value, start, end in zip(values, starts, ends)
+            }
+
+    def __len__(self):
+        return self.size
+
+    def _pack(self, rows) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def options(self, column: str) -> list:
+        """Values present in *column*, sorted, then None if any row has none."""
+        values = self.bitmaps[column]
+        return sorted((value for value in values if value is not None), key=str) + ([None] if None in values else [])
+
+    def rows(self, **choices) -> np.ndarray:
+        """Row positions matching every column=value in *choices* (None = missing), ascending."""
+        bits = None
+        for column, value in choices.items():
+            bitmap = self.bitmaps[column].get(value)
+            if bitmap is None:
+                return np.zeros(0, dtype="int64")
+            bits = bitmap if bits is None else bits & bitmap
+        if bits is None:
+            return np.arange(self.size)
+        return np.flatnonzero(np.unpackbits(bits, count=self.size))
+
+    def subset(self, rows) -> "FilterIndex":
+        """Index of some of the rows it was built from (positions, ascending), e.g. a time window."""
+        rows = np.asarray(rows, dtype="int64")
+        index = FilterIndex.__new__(FilterIndex)
+        index.size = len(rows)
+        index.codes = {column: (codes[rows], categories) for column, (codes, categories) in self.codes.items()}
+        index._build()
+        return index
@@ -1,193 +1,324 @@
-import re
-import json
-from collections import defaultdict
-
-# --- Message-type mapping ------------------------------------------
-ID_MAP = {
-    "1": "ItemRegister",
-    "2": "ItemPropertiesUpdate",
-    "3": "ItemInstruction",
-    "5": "UnverifiedSortReport",
-    "6": "VerifiedSortReport",
-    "7": "ItemDeRegister",
-    "98": "WatchdogReply",
-    "99": "WatchdogRequest",
-}
-
-# --- Regex helpers -------------------------------------------------
-RAW_BODY = re.compile(r'\): (.*?)(?: \[\]$)')
-LOC_PAT = re.compile(r'\b\d{4}\.\d{4}\.\d{4}\.B\d{2}\b')
+import os
+from itertools import count
+from operator import itemgetter
+
+from log_reader import iter_lines, iter_lines_at
+from log_tokenizer import new_stats
+from message_engine import (LOC_PAT, add_barcodes, expired, log_clock, mark_opened, message_name, minute_seconds,
+                            plc_clock, run, sort_code, update_volume)
+from raw_store import RawLines, body_ref
 
 # --- Main parser ---------------------------------------------------
-def parse_log(text: str) -> list[dict]:
-    parcels = {}
-    pending_registers = {}
-
-    for line in text.splitlines():
-        body_m = RAW_BODY.search(line)
-        if not body_m:
-            continue
-
-        parts = body_m.group(1).strip().split("|")
-        if len(parts) < 6 or ID_MAP.get(parts[3], "").startswith("Watchdog"):
-            continue
-
-        msg_code = parts[3]
-        msg = ID_MAP.get(msg_code, f"Type{msg_code}")
-
-        try:
-            pic = int(parts[4])
-        except ValueError:
-            continue
-
-        host_id = parts[5].strip()
-
-        # Extract timestamp from the message body (parts[2]), ensure ms format
-        try:
-            raw_ts = parts[2]  # Example: 2025-05-13T07:46:40.306Z
-            ts_clean = raw_ts.split("T")[1].replace("Z", "")  # => "07:46:40.306"
-            iso_ts = f"2025-05-13T{ts_clean}"
-        except:
-            continue
-
-        # Handle ItemRegister (with or without hostId)
-        if msg == "ItemRegister":
-            if host_id:
-                if host_id not in parcels:
-                    parcels[host_id] = {
-                        "pic": pic,
-                        "hostId": host_id,
-                        "barcodes": [],
-                        "barcode_count": 0,
-                        "location": None,
-                        "destination": None,
-                        "lifeCycle": {"registeredAt": iso_ts, "closedAt": None, "status": "open"},
-                        "barcodeErr": False,
-                        "events": [],
-                        "volume_data": {
-                            "length": None, "width": None, "height": None,
-                            "box_volume": None, "real_volume": None
-                        }
-                    }
-                parcels[host_id]["events"].append({
-                    "ts": iso_ts,
-                    "type": msg,
-                    "raw": "|".join(parts)
-                })
-            else:
-                pending_registers[pic] = iso_ts
-            continue
+def new_state(retention=None) -> dict:
+    """
+    Parser state that can be carried from one _iter_numbered call to the next.
+    With *retention* (message_engine.new_retention()), closed and stale
+    parcels are dropped from it as log time passes.
+    """
+    return {
+        "parcels": {},           # hostId -> parcel, creation order
+        "pending_registers": {}, # PIC -> registeredAt of a register without hostId
+        "unreported": {},        # hostId -> creation_index of parcels not yet yielded
+        "touched": set(),        # hostIds changed since the caller last cleared it
+        "created": count(),
+        "retention": retention,
+    }
+
+
+def _new_parcel(pic, host_id, registered_at):
+    return {
+        "pic": pic,
+        "hostId": host_id,
+        "barcodes": [],
+        "barcode_count": 0,
+        "location": None,
+        "destination": None,
+        "sort_code": None,
+        "lifeCycle": {"registeredAt": registered_at, "closedAt": None, "status": "open"},
+        "barcodeErr": False,
+        "alibi_id": None,
+        "events": [],
+        "volume_data": {
+            "length": None, "width": None, "height": None,
+            "box_volume": None, "real_volume": None
+        }
+    }
+
+
+# ── per-type updates: (parcel, pic, parts, ts) ────────────────────────
+def _update_properties(parcel, pic, parts, ts):
+    if len(parts) >= 7:
+        parcel["location"] = parcel["location"] or parts[6]
+
+    if len(parts) >= 9:
+        add_barcodes(parts[8], parcel["barcodes"])
+
+    if len(parts) >= 10:
+        semis = parts[9].split(";")
+        if len(semis) >= 3:
+            add_barcodes(semis[2], parcel["barcodes"])
+        if semis[0] != "6":
+            parcel["barcodeErr"] = True
+
+    if len(parts) >= 12 and parts[11].strip():
+        parcel["alibi_id"] = parts[11].strip()
+
+    parcel["barcode_count"] = len(parcel["barcodes"])
+
+    if len(parts) >= 13:
+        update_volume(parcel["volume_data"], parts[12])
+
+
+def _update_sorted(parcel, pic, parts, ts):
+    parcel["lifeCycle"]["status"] = "sorted"
+    if len(parts) >= 11 and parts[10]:
+        code = sort_code(parts[9], parts[10])
+        if code is not None:
+            parcel["sort_code"] = code
+
+
+def _update_deregistered(parcel, pic, parts, ts):
+    if parcel["lifeCycle"]["status"] != "sorted":
+        parcel["lifeCycle"]["status"] = "deregistered"
+    parcel["lifeCycle"]["closedAt"] = ts
+
+
+def _handlers(state, stats, follow, refs):
+    """
+    message_engine handler table over *state*. Times are int epoch ms: the
+    PLC stamp in the body (field 2) for the lifecycle and an event's
+    "plc_ts", the log-line header for its "log_ts".
+    """
+    parcels = state["parcels"]
+    pending_registers = state["pending_registers"]
+    unreported = state["unreported"]
+    touched = state["touched"]
+    created = state["created"]
+    retention = state["retention"]
+    skipped = stats["skipped"]
+    log_ms, plc_ms = log_clock(), plc_clock()
+
+    # Handle ItemRegister (with or without hostId)
+    def register(pic, host_id, body, parts, date, time, line, offset):
+        ts = plc_ms(parts[2])  # Example: 2025-05-13T07:46:40.306Z
+        if ts is None:
+            skipped["bad_timestamp"] += 1
+            return None
 
         if not host_id:
-            continue  # Can't proceed without hostId in other messages
-
-        if host_id not in parcels:
-            parcels[host_id] = {
-                "pic": pic,
-                "hostId": host_id,
-                "barcodes": [],
-                "barcode_count": 0,
-                "location": None,
-                "destination": None,
-                "lifeCycle": {"registeredAt": None, "closedAt": None, "status": "open"},
-                "barcodeErr": False,
-                "events": [],
-                "volume_data": {
-                    "length": None, "width": None, "height": None,
-                    "box_volume": None, "real_volume": None
-                }
-            }
-
-        parcel = parcels[host_id]
-
-        # Register time from cached register
-        if msg == "ItemInstruction" and parcel["lifeCycle"]["registeredAt"] is None:
-            if pic in pending_registers:
-                parcel["lifeCycle"]["registeredAt"] = pending_registers[pic]
-                del pending_registers[pic]
-            else:
-                parcel["lifeCycle"]["registeredAt"] = iso_ts
-
-        if not parcel["location"]:
-            loc_m = LOC_PAT.search("|".join(parts))
-            if loc_m:
-                parcel["location"] = loc_m.group(0)
-
-        if msg == "ItemInstruction":
-            if len(parts) >= 7:
-                parcel["location"] = parcel["location"] or parts[6]
-            if len(parts) >= 8:
-                parcel["destination"] = parcel["destination"] or parts[7]
-
-        elif msg == "ItemPropertiesUpdate":
-            if len(parts) >= 7:
-                parcel["location"] = parcel["location"] or parts[6]
-
-            def add_valid_barcode(barcode_str, barcode_list):
-                if barcode_str and barcode_str.startswith("0]C") and barcode_str not in barcode_list:
-                    barcode_list.append(barcode_str)
-
-            def process_barcode_field(field_content, barcode_list):
-                if field_content:
-                    for pb in field_content.split('@'):
-                        if not pb.startswith("0]C"):
-                            pb = pb.lstrip("0")
-                        add_valid_barcode(pb, barcode_list)
-
-            if len(parts) >= 9:
-                process_barcode_field(parts[8], parcel["barcodes"])
-
-            if len(parts) >= 10:
-                semis = parts[9].split(";")
-                if len(semis) >= 3:
-                    process_barcode_field(semis[2], parcel["barcodes"])
-                if semis and semis[0] != "6":
-                    parcel["barcodeErr"] = True
-
-            if len(parts) >= 13:
-                volume_semis = parts[12].split(';')
-                if len(volume_semis) >= 7:
-                    try: parcel["volume_data"]["length"] = float(volume_semis[2])
-                    except: pass
-                    try: parcel["volume_data"]["width"] = float(volume_semis[3])
-                    except: pass
-                    try: parcel["volume_data"]["height"] = float(volume_semis[4])
-                    except: pass
-                    try: parcel["volume_data"]["box_volume"] = float(volume_semis[5])
-                    except: pass
-                    try: parcel["volume_data"]["real_volume"] = float(volume_semis[6])
-                    except: pass
-
-        elif msg == "VerifiedSortReport":
-            parcel["lifeCycle"]["status"] = "sorted"
-
-        elif msg == "ItemDeRegister":
-            if parcel["lifeCycle"]["status"] != "sorted":
-                parcel["lifeCycle"]["status"] = "deregistered"
-            parcel["lifeCycle"]["closedAt"] = iso_ts
-
+            pending_registers[pic] = ts
+            if retention is not None:
+                mark_opened(retention, pic)  # int key: a pending register, not a hostId
+            return None
+        parcel = parcels.get(host_id)
+        if parcel is None:
+            parcel = parcels[host_id] = _new_parcel(pic, host_id, ts)
+            unreported[host_id] = next(created)
+            if retention is not None:
+                mark_opened(retention, host_id)
         parcel["events"].append({
-            "ts": iso_ts,
-            "type": msg,
-            "raw": "|".join(parts)
+            "plc_ts": ts,
+            "log_ts": log_ms(date, time, line),
+            "type": "ItemRegister",
+            "raw": body_ref(offset, line, body) if refs else body
         })
+        if follow:
+            touched.add(host_id)
+        return None
 
-    for parcel_data in parcels.values():
-        parcel_data["barcode_count"] = len(parcel_data["barcodes"])
-
-    return list(parcels.values())
+    def update_instruction(parcel, pic, parts, ts):
+        # Register time from cached register
+        if parcel["lifeCycle"]["registeredAt"] is None:
+            parcel["lifeCycle"]["registeredAt"] = pending_registers.pop(pic, ts)
+        if len(parts) >= 7:
+            parcel["location"] = parcel["location"] or parts[6]
+        if len(parts) >= 8:
+            parcel["destination"] = parcel["destination"] or parts[7]
+
+    def message(msg, update=None):
+        def handle(pic, host_id, body, parts, date, time, line, offset):
+            ts = plc_ms(parts[2])
+            if ts is None:
+                skipped["bad_timestamp"] += 1
+                return None
+
+            if not host_id:
+                skipped["no_host_id"] += 1
+                return None  # Can't proceed without hostId in other messages
+
+            parcel = parcels.get(host_id)
+            if parcel is None:
+                parcel = parcels[host_id] = _new_parcel(pic, host_id, None)
+                unreported[host_id] = next(created)
+                if retention is not None:
+                    mark_opened(retention, host_id)
+
+            if not parcel["location"]:
+                loc_m = LOC_PAT.search(body)
+                if loc_m:
+                    parcel["location"] = loc_m.group(0)
+
+            if update is not None:
+                update(parcel, pic, parts, ts)
+
+            parcel["events"].append({
+                "plc_ts": ts,
+                "log_ts": log_ms(date, time, line),
+                "type": msg or message_name(parts[3]),
+                "raw": body_ref(offset, line, body) if refs else body
+            })
+            if follow:
+                touched.add(host_id)
+
+            if parcel["lifeCycle"]["status"] != "open" and host_id in unreported:
+                if retention is None:
+                    return unreported.pop(host_id), parcel
+                # Held for late messages; evict() yields it when its grace is over
+                retention["closed"].append((retention["now"], unreported.pop(host_id), parcel))
+            return None
+        return handle
+
+    table = {
+        1: register,
+        2: message("ItemPropertiesUpdate", _update_properties),
+        3: message("ItemInstruction", update_instruction),
+        5: message("UnverifiedSortReport"),
+        6: message("VerifiedSortReport", _update_sorted),
+        7: message("ItemDeRegister", _update_deregistered),
+    }
+    default = message(None)
+    if retention is None:
+        return table, default
+
+    # With a retention every handler moves its clock on and returns the list
+    # of parcels evicted, if any. The clock is PLC time, which differs from
+    # PLC to PLC, so it only ever moves forward.
+    evicted = retention["evicted"]
+
+    def evict(now):
+        closed, stale = expired(retention, now)
+        out = []
+        for _, index, parcel in closed:
+            if parcels.get(parcel["hostId"]) is parcel:
+                del parcels[parcel["hostId"]]
+            out.append((index, parcel))
+        evicted["closed"] += len(closed)
+
+        for key in stale:
+            if isinstance(key, int):
+                pending_registers.pop(key, None)  # PIC free for the next register
+                continue
+            index = unreported.pop(key, None)
+            if index is not None:
+                parcel = parcels.pop(key)
+                parcel["lifeCycle"]["status"] = "stale"
+                out.append((index, parcel))
+                evicted["stale"] += 1
+        return out or None
+
+    def ticking(handle):
+        def handle_ticking(pic, host_id, body, parts, date, time, line, offset):
+            out = None
+            minute = parts[2][:16]  # "YYYY-MM-DDTHH:MM"
+            if minute > retention["minute"]:
+                now = minute_seconds(minute[:10], minute[11:])
+                if now is not None:
+                    retention["minute"] = minute
+                    out = evict(now)
+            handle(pic, host_id, body, parts, date, time, line, offset)
+            return out
+        return handle_ticking
+
+    return {code: ticking(handle) for code, handle in table.items()}, ticking(default)
+
+
+def _held(state):
+    """(creation_index, parcel) of every parcel *state* still holds: closed ones in their grace, then open ones."""
+    retention = state["retention"]
+    if retention is not None:
+        for _, index, parcel in retention["closed"]:
+            yield index, parcel
+    parcels = state["parcels"]
+    for host_id, index in state["unreported"].items():
+        yield index, parcels[host_id]
+
+
+def _iter_numbered(lines, tokenizer="fast", stats=None, state=None, refs=False, retention=None):
+    """
+    Yield (creation_index, parcel) as each parcel closes, then the rest.
+    If given, *stats* (log_tokenizer.new_stats()) is filled in as lines are read.
+    If given, *state* (new_state()) is resumed and left holding the open
+    parcels, which are then not flushed at the end: feed it the next batch
+    of lines to carry on where this call stopped (follow mode).
+    With refs=True, *lines* yields (byte_offset, line) (log_reader.iter_lines_at)
+    and each event's "raw" is a raw_store body ref instead of the text.
+    Without a *state*, *retention* bounds the one this call makes (see
+    iter_parcels); a resumed state carries its own.
+    """
+    if stats is None:
+        stats = new_stats()
+    follow = state is not None
+    if state is None:
+        state = new_state(retention)
+
+    handlers, default = _handlers(state, stats, follow, refs)
+    results = run(lines, handlers, default, tokenizer, stats, offsets=refs)
+    if state["retention"] is None:
+        yield from results
+    else:
+        for evicted in results:
+            yield from evicted
+
+    if not follow:
+        yield from _held(state)
+
+
+def iter_parcels(source, tokenizer="fast", stats=None, retention=None):
+    """
+    Stream parcel records from a log given as text, bytes, a path or a
+    file object (text or binary). Each record is yielded once its parcel is
+    sorted or deregistered; later messages for the same hostId still update
+    the yielded dict in place. Parcels still open at the end come last.
+    tokenizer selects the line splitter: "fast" (default) or "regex".
+    If given, *stats* (log_tokenizer.new_stats()) is filled in as lines are read.
+    With *retention* (message_engine.new_retention()) memory stays flat on
+    multi-day logs: a record is yielded, final, once its grace after closing
+    is over, and parcels open too long come out with status "stale".
+    """
+    for _, parcel in _iter_numbered(iter_lines(source), tokenizer, stats, retention=retention):
+        yield parcel
+
+
+def parse_log(text, tokenizer="fast") -> list[dict]:
+    """Parse a whole log (anything iter_parcels accepts) → list in creation order."""
+    numbered = _iter_numbered(iter_lines(text), tokenizer)
+    return [parcel for _, parcel in sorted(numbered, key=itemgetter(0))]
+
+
+def parse_log_table(text, tokenizer="fast", raw_refs=False):
+    """
+    parse_log() as typed columnar tables (parcels, barcodes, events, stats).
+    With raw_refs=True, *text* must be a path (os.PathLike, memory-mapped),
+    a bytes-like buffer or a raw_store.RawLines, and events keep refs into
+    it in place of their raw text; see raw_store and parcel_table.event_raw().
+    """
+    from parcel_table import build_parcel_tables  # pandas is only needed here
+
+    stats = new_stats()
+    raw_lines = None
+    if raw_refs:
+        if isinstance(text, RawLines):
+            raw_lines = text
+        else:
+            raw_lines = RawLines.map_file(text) if isinstance(text, os.PathLike) else RawLines(text)
+        numbered = _iter_numbered(iter_lines_at(raw_lines.buffer), tokenizer, stats, refs=True)
+    else:
+        numbered = _iter_numbered(iter_lines(text), tokenizer, stats)
+    records = [parcel for _, parcel in sorted(numbered, key=itemgetter(0))]
+    return build_parcel_tables(records, stats, raw_lines, layout="hlc")
 
 # --- Run as script --------------------------------------------------
 if __name__ == "__main__":
-    input_file = "logs.txt"
-    output_file = "parsed_output.json"
-
-    with open(input_file, "r", encoding="utf-8") as f:
-        log_text = f.read()
-
-    parsed_data = parse_log(log_text)
-
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(parsed_data, f, ensure_ascii=False, indent=2)
+    from batch_parse import main
 
-    print(f"✅ Parsed data saved to {output_file}")
+    main(default_parser="hlc")
@@ -0,0 +1,115 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- Header KPIs ---------------------------------------------------
+# All dashboard header metrics from the typed parcels table (see
+# parcel_table.py) in one pass over int64 millisecond columns.
+
+NAT = np.iinfo(np.int64).min
+CYCLE_PERCENTILES = (50, 95)
+
+
+def _ms(col: pd.Series) -> np.ndarray:
+    """datetime64 column → int64 epoch ms, NaT as NAT."""
+    return col.to_numpy(dtype="datetime64[ms]").view("int64")
+
+
+def compute_kpis(parcels: pd.DataFrame) -> dict:
+    total = len(parcels)
+
+    status = parcels["status"]
+    by_status = dict(zip(status.cat.categories, np.bincount(
+        status.cat.codes.to_numpy()[status.notna().to_numpy()], minlength=len(status.cat.categories)
+    )))
+    barcode_err = int(np.count_nonzero(parcels["barcodeErr"].to_numpy()))
+
+    registered = _ms(parcels["registeredAt"])
+    closed = _ms(parcels["closedAt"])
+    has_reg = registered != NAT
+    has_closed = closed != NAT
+
+    cycle_s = (closed[has_reg & has_closed] - registered[has_reg & has_closed]) / 1000.0
+    if cycle_s.size:
+        avg_cycle = float(cycle_s.mean())
+        percentiles = np.percentile(cycle_s, CYCLE_PERCENTILES)
+    else:
+        avg_cycle = 0.0
+        percentiles = np.zeros(len(CYCLE_PERCENTILES))
+
+    # Throughput over first registration → last close (or registration)
+    last = np.where(has_closed, closed, registered)
+    tph = 0.0
+    if has_reg.any() and (last != NAT).any():
+        duration_s = (last[last != NAT].max() - registered[has_reg].min()) / 1000.0
+        tph = total / (duration_s / 3600) if duration_s > 0 else 0.0
+
+    def pct(count):
+        return count / total * 100 if total else 0.0
+
+    kpis = {
+        "total": total,
+        "sorted": int(by_status.get("sorted", 0)),
+        "deregistered": int(by_status.get("deregistered", 0)),
+        "open": int(by_status.get("open", 0)),
+        "stale": int(by_status.get("stale", 0)),
+        "barcode_errors": barcode_err,
+        "pct_sorted": pct(by_status.get("sorted", 0)),
+        "pct_deregistered": pct(by_status.get("deregistered", 0)),
+        "pct_stale": pct(by_status.get("stale", 0)),
+        "pct_barcode_err": pct(barcode_err),
+        "avg_cycle_s": avg_cycle,
+        "tph": tph,
+    }
+    for p, value in zip(CYCLE_PERCENTILES, percentiles):
+        kpis[f"p{p}_cycle_s"] = float(value)
+    return kpis
+
+
+# --- Benchmark data ------------------------------------------------
+def synthetic_parcels(n: int, seed: int = 0) -> pd.DataFrame:
+    """n parcels with the parcels-table dtypes, spread over one day."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2025-05-13T06:00:00", "ms").astype("int64")
+    registered = start + rng.integers(0, 86_400_000, n)
+    closed = registered + rng.integers(20_000, 300_000, n)
+    closed[rng.random(n) < 0.02] = NAT
+    codes = rng.choice(4, n, p=[0.02, 0.945, 0.03, 0.005]).astype("int8")
+    return pd.DataFrame({
+        "status": pd.Categorical.from_codes(codes, ["open", "sorted", "deregistered", "stale"]),
+        "registeredAt": registered.view("datetime64[ms]"),
+        "closedAt": closed.view("datetime64[ms]"),
+        "barcodeErr": rng.random(n) < 0.003,
+    })
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute dashboard header KPIs for a log file.")
+    parser.add_argument("log_file", nargs="?", help="raw HLC log (.txt)")
+    parser.add_argument("--json", action="store_true", help="print the KPIs as JSON")
+    parser.add_argument("--bench", type=int, metavar="N", help="time compute_kpis on N synthetic parcels")
+    args = parser.parse_args()
+
+    if args.bench:
+        parcels = synthetic_parcels(args.bench)
+        compute_kpis(parcels)  # warm-up
+        start = time.perf_counter()
+        kpis = compute_kpis(parcels)
+        print(f"compute_kpis on {args.bench:,} parcels: {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.log_file:
+        from hlc_parser import parse_log_table
+
+        with open(args.log_file, "rb") as f:
+            kpis = compute_kpis(parse_log_table(f).parcels)
+    else:
+        parser.error("give a log file or --bench N")
+
+    if args.json:
+        print(json.dumps(kpis, indent=2))
+    else:
+        for name, value in kpis.items():
+            print(f"{name:<18} {value:,.1f}" if isinstance(value, float) else f"{name:<18} {value:,}")
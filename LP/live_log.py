@@ -0,0 +1,196 @@
+import argparse
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from hlc_parser import _iter_numbered, new_state
+from kpis import compute_kpis
+from log_reader import LogTail
+from log_tokenizer import new_stats
+from parcel_table import ParcelTables, build_parcel_tables
+from time_series import BINS, SeriesBuilder
+
+# --- Live log (follow mode) ----------------------------------------
+# Follows a viMessageSocket log that is still being written. Each poll
+# parses only the appended lines, carrying hlc_parser's open-parcel state
+# over from the previous poll, and turns the parcels those lines touched
+# into a delta of typed tables, so the dashboard never reparses the whole
+# log. Deltas are only appended to per-table lists; the frames are folded
+# together when read (parcels for the KPI refresh, tables for the rest),
+# keeping each parcel's newest rows, so a poll costs what it read however
+# long the log. The time series (time_series.py) are updated from the
+# same deltas.
+
+POLL_INTERVAL_S = 0.5
+
+
+def _concat(frames) -> pd.DataFrame:
+    """pd.concat that keeps category columns categorical by unioning their categories first."""
+    frames = list(frames)
+    for col, dtype in frames[0].dtypes.items():
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        categories = dtype.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[col].cat.categories, sort=False)
+        frames = [
+            frame if frame[col].cat.categories.equals(categories)
+            else frame.assign(**{col: frame[col].cat.set_categories(categories)})
+            for frame in frames
+        ]
+    return pd.concat(frames)
+
+
+class LiveLog:
+    def __init__(self, path, tokenizer="fast", from_start=True):
+        self.tail = LogTail(path, from_start=from_start)
+        self.tokenizer = tokenizer
+        self.stats = new_stats()
+        self.state = new_state()
+        self.ids = {}  # hostId -> parcel_id (creation order, as in parse_log)
+        self.event_counts = {}  # hostId -> events already in the events table
+        empty = build_parcel_tables([], self.stats, layout="hlc")
+        self.index = None  # search index, built from the first delta and added to after it
+        # Per-poll frames, folded into one each when read; _newest[parcel_id] is
+        # the position of the frame with the parcel's current row and barcodes
+        self._parcel_frames, self._barcode_frames, self._event_frames = [empty.parcels], [empty.barcodes], [empty.events]
+        self._newest = np.zeros(0, dtype="int64")
+        self._tables = empty
+        self.series = {name: SeriesBuilder(bin_ms) for name, bin_ms in BINS.items()}
+        self.last_poll = (0, 0.0)  # (lines, seconds)
+        self._lock = threading.Lock()
+
+    def poll(self) -> int:
+        """Parse what was appended since the last poll; returns the number of new lines."""
+        with self._lock:
+            start = time.perf_counter()
+            lines = self.tail.read_lines()
+            if lines:
+                # Closed parcels are yielded, but they also stay in state["parcels"]
+                for _ in _iter_numbered(lines, self.tokenizer, self.stats, self.state):
+                    pass
+                touched = self.state["touched"]
+                self._apply(touched)
+                touched.clear()
+            self.last_poll = (len(lines), time.perf_counter() - start)
+            return len(lines)
+
+    def _apply(self, touched):
+        parcels = self.state["parcels"]
+        known = len(self.ids)
+        # New parcels are the last ones in the state's creation-ordered dict
+        for host_id in reversed(list(islice(reversed(parcels), len(parcels) - known))):
+            self.ids[host_id] = len(self.ids)
+
+        if not touched:
+            return
+        # A parcel's events only ever grow, so the delta carries just the new ones
+        pairs = sorted((self.ids[host_id], host_id) for host_id in touched)
+        ids = np.array([parcel_id for parcel_id, _ in pairs], dtype="int32")
+        records = []
+        for _, host_id in pairs:
+            parcel = parcels[host_id]
+            seen = self.event_counts.get(host_id, 0)
+            self.event_counts[host_id] = len(parcel["events"])
+            records.append({**parcel, "events": parcel["events"][seen:]} if seen else parcel)
+        delta = build_parcel_tables(records, self.stats, layout="hlc")
+        if known:
+            # Re-key the delta from its row positions to the real parcel_ids
+            delta.parcels.index = pd.Index(ids, name="parcel_id")
+            delta.barcodes["parcel_id"] = ids[delta.barcodes["parcel_id"].to_numpy()]
+            delta.events["parcel_id"] = ids[delta.events["parcel_id"].to_numpy()]
+        for builder in self.series.values():
+            builder.update(delta.parcels, delta.events)
+        if self.index is None:
+            self.index = delta.index  # first fill: ids are 0..n-1 already
+        else:
+            self.index.add(
+                ids, delta.parcels["hostId"], delta.parcels["pic"], delta.parcels["alibi_id"],
+                zip(delta.barcodes["barcode"], delta.barcodes["parcel_id"]),
+            )
+
+        newest = np.zeros(len(self.ids), dtype="int64")
+        newest[:len(self._newest)] = self._newest
+        newest[ids] = len(self._parcel_frames)
+        self._newest = newest
+        self._parcel_frames.append(delta.parcels)
+        self._barcode_frames.append(delta.barcodes)
+        self._event_frames.append(delta.events)
+        self._tables = None
+
+    def _fold_parcels(self):
+        """Fold the parcel and barcode frames into one each: every parcel's newest rows, in parcel_id order."""
+        frames = self._parcel_frames
+        if len(frames) == 1:
+            return
+        parcels = _concat(frames)
+        frame_of_row = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+        parcels = parcels[self._newest[parcels.index.to_numpy()] == frame_of_row]
+        order = np.empty(len(parcels), dtype="int64")
+        order[parcels.index.to_numpy()] = np.arange(len(parcels))  # parcel_ids are 0..n-1
+
+        barcode_frames = self._barcode_frames
+        barcodes = _concat(barcode_frames)
+        frame_of_row = np.repeat(np.arange(len(barcode_frames)), [len(frame) for frame in barcode_frames])
+        barcodes = barcodes[self._newest[barcodes["parcel_id"].to_numpy()] == frame_of_row]
+
+        self._parcel_frames, self._barcode_frames = [parcels.iloc[order]], [barcodes]
+        self._newest[:] = 0
+
+    @property
+    def parcels(self) -> pd.DataFrame:
+        """The parcels table of everything read so far (all the KPIs need; events are not folded)."""
+        with self._lock:
+            if self._tables is not None:
+                return self._tables.parcels
+            self._fold_parcels()
+            return self._parcel_frames[0]
+
+    @property
+    def tables(self) -> ParcelTables:
+        """ParcelTables of everything read so far, folded from the polls' deltas on first use after them."""
+        with self._lock:
+            if self._tables is None:
+                self._fold_parcels()
+                if len(self._event_frames) > 1:
+                    self._event_frames = [_concat(self._event_frames)]
+                self._tables = ParcelTables(
+                    self._parcel_frames[0], self._barcode_frames[0], self._event_frames[0], self.stats, self.index,
+                )
+            return self._tables
+
+    def series_frame(self, bin_name="1min") -> pd.DataFrame:
+        """time_series.lifecycle_series() of everything read so far."""
+        with self._lock:
+            return self.series[bin_name].frame()
+
+    def close(self):
+        self.tail.close()
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow a growing HLC log and print KPIs as it grows.")
+    parser.add_argument("log_file")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_S, help="seconds between polls")
+    parser.add_argument("--from-end", action="store_true", help="skip what is already in the file")
+    args = parser.parse_args()
+
+    live = LiveLog(args.log_file, from_start=not args.from_end)
+    try:
+        while True:
+            if live.poll():
+                kpis = compute_kpis(live.parcels)
+                lines, seconds = live.last_poll
+                print(
+                    f"+{lines:,} lines in {seconds * 1000:.0f} ms | parcels {kpis['total']:,} "
+                    f"open {kpis['open']:,} sorted {kpis['pct_sorted']:.1f}% "
+                    f"tph {kpis['tph']:.0f} | rotations {live.tail.rotations}",
+                    flush=True,
+                )
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        live.close()
@@ -0,0 +1,215 @@
+import codecs
+import os
+
+# --- Incremental line reader ---------------------------------------
+# Reads a log in fixed-size chunks and splits it with the same rules as
+# str.splitlines(), so the parsers see exactly the lines they used to see
+# without the whole file ever being decoded into one string.
+
+CHUNK_SIZE = 1 << 20  # characters (or bytes) per read
+
+
+def _iter_chunks(source, encoding, chunk_size):
+    """Yield decoded text chunks from str, bytes, a path or a file object."""
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+        return
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = memoryview(source)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        for start in range(0, len(source), chunk_size):
+            yield decoder.decode(source[start:start + chunk_size])
+        yield decoder.decode(b"", final=True)
+        return
+
+    if isinstance(source, os.PathLike):
+        with open(source, "rb") as f:
+            yield from _iter_chunks(f, encoding, chunk_size)
+        return
+
+    # Any file-like object: open(), io.BytesIO, Streamlit's UploadedFile ...
+    decoder = None
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            yield chunk
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(encoding)()
+        yield decoder.decode(chunk)
+    if decoder is not None:
+        yield decoder.decode(b"", final=True)
+
+
+def iter_lines(source, encoding: str = "utf-8", chunk_size: int = CHUNK_SIZE):
+    """
+    Yield the lines of *source* one at a time, without line terminators.
+
+    *source* may be the log text itself, raw bytes, an os.PathLike, or any
+    object with a read(n) method returning str or bytes. Only one chunk and
+    the partial line at its end are held in memory at a time.
+    """
+    pending = ""
+    for chunk in _iter_chunks(source, encoding, chunk_size):
+        if not chunk:
+            continue
+        buf = pending + chunk
+        pieces = buf.splitlines(True)
+        last = pieces[-1]
+        # Carry over an unterminated tail, and a bare "\r" that may be the
+        # first half of a "\r\n" split across two chunks.
+        if last.endswith("\r") or last.splitlines()[0] == last:
+            pending = last
+            buf = buf[:len(buf) - len(last)]
+        else:
+            pending = ""
+        yield from buf.splitlines()
+    if pending:
+        yield from pending.splitlines()
+
+
+# Characters str.splitlines() ends a line on, besides "\r\n"
+_LINE_ENDS = frozenset("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+
+
+def iter_lines_at(buffer, encoding: str = "utf-8", chunk_size: int = CHUNK_SIZE):
+    """
+    iter_lines() for a bytes-like *buffer* (bytes, mmap, memoryview) that
+    also gives each line's byte offset: yields (offset, line).
+    """
+    size = len(buffer)
+    pos = 0
+    while pos < size:
+        chunk = bytes(buffer[pos:pos + chunk_size])
+        if pos + len(chunk) < size:
+            cut = chunk.rfind(b"\n") + 1
+            while not cut:  # a line longer than chunk_size
+                more = bytes(buffer[pos + len(chunk):pos + len(chunk) + chunk_size])
+                if not more:
+                    break
+                chunk += more
+                cut = chunk.rfind(b"\n") + 1
+            if cut:
+                chunk = chunk[:cut]
+
+        ascii = chunk.isascii()
+        offset = pos
+        for piece in chunk.decode(encoding).splitlines(True):
+            if piece.endswith("\r\n"):
+                line = piece[:-2]
+            elif piece[-1] in _LINE_ENDS:
+                line = piece[:-1]
+            else:
+                line = piece
+            yield offset, line
+            offset += len(piece) if ascii else len(piece.encode(encoding))
+        pos += len(chunk)
+
+
+# --- Byte-range splitting ------------------------------------------
+def line_aligned_ranges(path, chunk_bytes: int):
+    """
+    Split the file at *path* into (start, end) byte ranges of roughly
+    chunk_bytes each, every range starting at the beginning of a line.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = start + chunk_bytes
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()  # finish the line the cut landed in
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range(path, start: int, end: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+# --- Follow mode ---------------------------------------------------
+TAIL_READ_BYTES = 16 << 20  # most bytes taken per read_lines() call
+
+
+class LogTail:
+    """
+    Follow a log file that is still being written, like ``tail -F``.
+
+    Every read_lines() call returns the complete lines appended since the
+    previous call; a partial last line waits until its newline arrives. If
+    the path is rotated (now a different file) the old file is read to its
+    end before switching; if it is truncated in place, reading restarts at 0.
+    """
+
+    def __init__(self, path, encoding: str = "utf-8", from_start: bool = True,
+                 read_bytes: int = TAIL_READ_BYTES):
+        self.path = os.fspath(path)
+        self.encoding = encoding
+        self.read_bytes = read_bytes
+        self.rotations = 0
+        self._f = None
+        self._file_id = None
+        self._pending = b""
+        self._open(at_end=not from_start)
+
+    def _open(self, at_end=False):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        if at_end:
+            f.seek(0, os.SEEK_END)
+        stat = os.fstat(f.fileno())
+        self._f, self._file_id = f, (stat.st_dev, stat.st_ino)
+
+    def _switch_file(self):
+        """Called once the current file is drained; True if the path moved on."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # rotated away, new file not created yet
+        if (stat.st_dev, stat.st_ino) != self._file_id:
+            self._f.close()
+            self._f = None
+            self._open()
+        elif stat.st_size < self._f.tell():
+            self._f.seek(0)
+        else:
+            return False
+        self.rotations += 1
+        return True
+
+    def read_lines(self) -> list[str]:
+        if self._f is None:
+            self._open()
+            if self._f is None:
+                return []
+
+        buf = self._pending + self._f.read(self.read_bytes)
+        if len(buf) - len(self._pending) < self.read_bytes and self._switch_file():
+            # The writer is done with the old file: its unterminated tail is a line
+            if buf and not buf.endswith(b"\n"):
+                buf += b"\n"
+            if self._f is not None:
+                buf += self._f.read(self.read_bytes)
+
+        cut = buf.rfind(b"\n") + 1
+        self._pending = buf[cut:]
+        return buf[:cut].decode(self.encoding, errors="replace").splitlines()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
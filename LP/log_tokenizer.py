@@ -0,0 +1,168 @@
+import re
+from collections import Counter
+
+# --- Line tokenizers -----------------------------------------------
+# Both tokenizers take one raw log line and return
+#     (date, time, body, parts)
+# or None when the line carries no parcel message (no "): … []" body,
+# fewer than six fields, or a watchdog 98/99 heartbeat).
+#   date  "YYYY-MM-DD"    from the log header, None if not found
+#   time  "HH:MM:SS,mmm"  from the log header, None if not found
+#   body  the stripped message body, i.e. "|".join(parts)
+#   parts body.split("|")
+# The regex tokenizer leaves date/time to the caller's own regexes, exactly
+# as the parsers always did; the fast one reads them from fixed offsets and
+# returns None for them when the header is not in the usual layout.
+# Given a stats dict (see new_stats), both also count why lines were
+# rejected, and count watchdog messages by type.
+
+WATCHDOG_IDS = {"98": "WatchdogReply", "99": "WatchdogRequest"}
+
+RAW_BODY = re.compile(r'\): (.*?)(?: \[\]$)')
+
+# Maps ASCII digits to "0" so the header can be checked in one comparison
+_DIGITS_TO_ZERO = str.maketrans("123456789", "000000000")
+_HEADER_SHAPE = "0000-00-00 00:00:00,000"
+
+
+def new_stats() -> dict:
+    """Per-parse counters: lines read, messages by type, skipped lines by reason."""
+    return {"lines": 0, "messages": Counter(), "skipped": Counter()}
+
+
+def _count_watchdog(stats, msg_id):
+    stats["messages"][WATCHDOG_IDS[msg_id]] += 1
+    stats["skipped"]["watchdog"] += 1
+
+
+def split_regex(line: str, stats=None):
+    """Original per-line regex tokenizer."""
+    body_m = RAW_BODY.search(line)
+    if not body_m:
+        if stats is not None:
+            stats["skipped"]["not_a_message"] += 1
+        return None
+
+    body = body_m.group(1).strip()
+    parts = body.split("|")
+    if len(parts) < 6 or parts[3] in WATCHDOG_IDS:
+        if stats is not None:
+            if len(parts) > 3 and parts[3] in WATCHDOG_IDS:
+                _count_watchdog(stats, parts[3])
+            else:
+                stats["skipped"]["short_message" if len(parts) > 1 else "not_a_message"] += 1
+        return None
+    return None, None, body, parts
+
+
+def split_fast(line: str, stats=None):
+    """
+    Offset/str.find tokenizer for the fixed
+    "YYYY-MM-DD HH:MM:SS,mmm … ): body []" layout.
+    """
+    start = line.find("): ") if line.endswith(" []") else -1
+    end = len(line) - 3
+    if start < 0 or end < start + 3:
+        if stats is not None:
+            stats["skipped"]["not_a_message"] += 1
+        return None
+    start += 3
+
+    # Reject heartbeats and short messages from the field separators alone,
+    # before anything is sliced or split.
+    p1 = line.find("|", start, end)
+    p2 = line.find("|", p1 + 1, end) if p1 >= 0 else -1
+    p3 = line.find("|", p2 + 1, end) if p2 >= 0 else -1
+    p4 = line.find("|", p3 + 1, end) if p3 >= 0 else -1
+    if p4 >= 0:
+        msg_id = line[p3 + 1:p4]
+    else:
+        msg_id = line[p3 + 1:end].rstrip() if p3 >= 0 else None
+    if msg_id in WATCHDOG_IDS:
+        if stats is not None:
+            _count_watchdog(stats, msg_id)
+        return None
+    if p4 < 0 or line.find("|", p4 + 1, end) < 0:
+        if stats is not None:
+            stats["skipped"]["short_message" if p1 >= 0 else "not_a_message"] += 1
+        return None
+
+    body = line[start:end].strip()
+    parts = body.split("|")
+
+    if line[:23].translate(_DIGITS_TO_ZERO) == _HEADER_SHAPE:
+        return line[:10], line[11:23], body, parts
+    return None, None, body, parts
+
+
+Z_TIME = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z')
+_Z_TIME_SHAPE = "0000-00-00T00:00:00.000Z"
+
+
+def find_z_time(body: str, parts: list):
+    """First PLC "YYYY-MM-DDTHH:MM:SS.mmmZ" timestamp in the body, or None."""
+    # It is normally the whole of field 2; only search when it is not.
+    z_time = parts[2][:24]
+    if (z_time.translate(_DIGITS_TO_ZERO) == _Z_TIME_SHAPE
+            and "Z" not in parts[0] and "Z" not in parts[1]):
+        return z_time
+    z_m = Z_TIME.search(body)
+    return z_m.group(0) if z_m else None
+
+
+TOKENIZERS = {
+    "fast": split_fast,
+    "regex": split_regex,
+}
+
+
+def get_tokenizer(name: str):
+    try:
+        return TOKENIZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer '{name}', expected one of {sorted(TOKENIZERS)}") from None
+
+
+# --- Benchmark ------------------------------------------------------
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import KJ
+    import JK
+    import hlc_parser
+
+    input_file = sys.argv[1] if len(sys.argv) > 1 else "logs.txt"
+    rounds = 5
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        text = f.read()
+    lines = text.splitlines()
+    print(f"{input_file}: {len(lines)} lines, best of {rounds} runs")
+
+    def lines_per_sec(func, arg):
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func(arg)
+            best = min(best, time.perf_counter() - start)
+        return len(lines) / best
+
+    def tokenize_all(name):
+        split = get_tokenizer(name)
+        for line in lines:
+            split(line)
+
+    # KJ without echo: printing every message would take most of its time and hide the tokenizer
+    targets = {
+        "tokenizer only": tokenize_all,
+        "KJ.parse_log": lambda name: KJ.parse_log(text, tokenizer=name, echo=False),
+        "hlc_parser.parse_log": lambda name: hlc_parser.parse_log(text, tokenizer=name),
+        "JK.parse_log": lambda name: JK.parse_log(text, tokenizer=name),
+    }
+
+    for label, func in targets.items():
+        slow, fast = lines_per_sec(func, "regex"), lines_per_sec(func, "fast")
+        print(f"{label:<20} regex {slow:>11,.0f} lines/s   fast {fast:>11,.0f} lines/s   x{fast / slow:.2f}")
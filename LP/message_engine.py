@@ -0,0 +1,284 @@
+import re
+from collections import Counter, deque
+from datetime import date as _date
+from functools import lru_cache
+
+from log_tokenizer import get_tokenizer
+
+# --- Message dispatch engine ---------------------------------------
+# The one line loop behind KJ, hlc_parser and JK. Every line is tokenized
+# once, its msgId is looked up as an integer code, and the split fields go
+# to the parser's handler for that code, which decodes only the fields its
+# message type uses. A parser is a profile over this loop: a table
+# {code: handler} plus a fallback for codes the table does not list
+# (unknown msgIds have code None).
+#
+# Handlers are called as
+#     handler(pic, host_id, body, parts, date, time, line, offset)
+# with pic already an int and host_id stripped; date/time/body/parts come
+# from the tokenizer (see log_tokenizer) and offset is the line's byte
+# offset when the lines are (offset, line) pairs, else None. Whatever a
+# handler returns other than None is yielded by run().
+
+MESSAGE_TYPES = {
+    1: "ItemRegister",
+    2: "ItemPropertiesUpdate",
+    3: "ItemInstruction",
+    5: "UnverifiedSortReport",
+    6: "VerifiedSortReport",
+    7: "ItemDeRegister",
+    98: "WatchdogReply",
+    99: "WatchdogRequest",
+}
+
+# msgId field → code; anything not spelled exactly like this is unknown
+CODES = {str(code): code for code in MESSAGE_TYPES}
+
+LOC_PAT = re.compile(r'\b\d{4}\.\d{4}\.\d{4}\.B\d{2}\b')  # chute/station code
+
+
+def message_name(field: str) -> str:
+    """Type name of a msgId field, "Type<field>" when it is not a known code."""
+    code = CODES.get(field)
+    return MESSAGE_TYPES[code] if code is not None else f"Type{field}"
+
+
+def run(lines, handlers, default=None, tokenizer="fast", stats=None, offsets=False):
+    """
+    Dispatch every message line to handlers[code] (or *default*) and yield
+    their results. If given, *stats* (log_tokenizer.new_stats()) counts
+    lines, messages by type and lines skipped for a non-numeric PIC.
+    With offsets=True, *lines* yields (byte_offset, line) pairs.
+    """
+    split_line = get_tokenizer(tokenizer)
+    get_handler = handlers.get
+    counting = stats is not None
+    if counting:
+        messages, skipped = stats["messages"], stats["skipped"]
+    offset = None
+
+    for line in lines:
+        if offsets:
+            offset, line = line
+        if counting:
+            stats["lines"] += 1
+        tokens = split_line(line, stats)
+        if tokens is None:
+            continue
+        date, time, body, parts = tokens
+
+        code = CODES.get(parts[3])
+        if counting:
+            messages[MESSAGE_TYPES[code] if code is not None else f"Type{parts[3]}"] += 1
+
+        try:
+            pic = int(parts[4])
+        except ValueError:
+            if counting:
+                skipped["bad_pic"] += 1
+            continue
+
+        handler = get_handler(code, default)
+        if handler is None:
+            continue
+        result = handler(pic, parts[5].strip(), body, parts, date, time, line, offset)
+        if result is not None:
+            yield result
+
+
+# --- Shared field decoders -----------------------------------------
+VOLUME_KEYS = ("length", "width", "height", "box_volume", "real_volume")
+
+
+def add_barcodes(field: str, barcodes: list):
+    """Append the "0]C…" barcodes of an "@"-separated field not already in *barcodes*."""
+    if field:
+        for barcode in field.split("@"):
+            if barcode.startswith("0]C") and barcode not in barcodes:
+                barcodes.append(barcode)
+
+
+def update_volume(volume_data: dict, field: str):
+    """Fill length … real_volume from a ";"-separated volume block, field by field."""
+    semis = field.split(";")
+    if len(semis) >= 7:
+        for key, value in zip(VOLUME_KEYS, semis[2:7]):
+            try:
+                volume_data[key] = float(value)
+            except ValueError:
+                pass
+
+
+def sort_code(actual_destination: str, destination_status: str):
+    """
+    Sort code of a VerifiedSortReport as KJ reads it: the status paired with
+    the actual destination in the ";"-separated destination / status list,
+    or the last pair's status for destination "999"; None if there is none.
+    """
+    try:
+        values = [int(value) for value in destination_status.split(";")]
+        statuses = dict(zip(values[0:-1:2], values[1::2]))
+        if actual_destination == "999":
+            return list(statuses.values())[-1] if statuses else None
+        return statuses.get(int(actual_destination))
+    except ValueError:
+        return None
+
+
+# --- Timestamps ----------------------------------------------------
+# Parsers keep times as int epoch milliseconds, the wall clock as logged
+# (no time zone applied): the log-line header "YYYY-MM-DD HH:MM:SS,mmm"
+# and the PLC's "YYYY-MM-DDTHH:MM:SS.mmmZ" in the message body. Strings
+# are only made again for display (format_*).
+
+LOG_TS = re.compile(r'^(\d{4}-\d{2}-\d{2}) (\d{2}:\d{2}:\d{2},\d{3})')
+DAY_MS = 86_400_000
+_EPOCH_ORDINAL = _date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=64)
+def day_ms(day: str) -> int:
+    """"YYYY-MM-DD" → epoch ms of its midnight."""
+    return (_date.fromisoformat(day).toordinal() - _EPOCH_ORDINAL) * DAY_MS
+
+
+def epoch_clock():
+    """
+    Stamp parser: to_ms("YYYY-MM-DD", "HH:MM:SS,mmm") → epoch ms ("." works
+    as well as ","). The date and the whole second are only parsed when
+    they differ from the previous stamp's, so give every stream of stamps
+    (log header, PLC body) its own clock. Raises ValueError on a bad stamp.
+    """
+    last = (None, None, 0)  # (day, "HH:MM:SS", epoch ms of that second), swapped whole
+
+    def to_ms(day, clock):
+        nonlocal last
+        last_day, last_second, base = last
+        if clock[:8] != last_second or day != last_day:
+            base = day_ms(day) + ((int(clock[:2]) * 60 + int(clock[3:5])) * 60 + int(clock[6:8])) * 1000
+            last = (day, clock[:8], base)
+        return base + int(clock[9:12])
+    return to_ms
+
+
+def log_clock():
+    """
+    Clock for log-header times: to_ms(date, time, line) from a tokenizer's
+    date/time, or read from the start of *line* when it gave none; None when
+    the line has no valid header time.
+    """
+    to_ms = epoch_clock()
+
+    def log_ms(date, time, line):
+        if time is None:
+            ts_m = LOG_TS.match(line)
+            if not ts_m:
+                return None
+            date, time = ts_m.groups()
+        try:
+            return to_ms(date, time)
+        except ValueError:
+            return None
+    return log_ms
+
+
+def plc_clock():
+    """Clock for PLC times: to_ms("YYYY-MM-DDTHH:MM:SS.mmmZ") → epoch ms, None if it is not one."""
+    to_ms = epoch_clock()
+
+    def plc_ms(stamp):
+        if stamp[10:11] != "T":
+            return None
+        try:
+            return to_ms(stamp[:10], stamp[11:23])
+        except ValueError:
+            return None
+    return plc_ms
+
+
+@lru_cache(maxsize=64)
+def _day_name(day_number: int) -> str:
+    return _date.fromordinal(day_number + _EPOCH_ORDINAL).isoformat()
+
+
+def format_date(ms: int) -> str:
+    return _day_name(ms // DAY_MS)
+
+
+def format_clock(ms: int, sep: str = ",") -> str:
+    """Epoch ms → "HH:MM:SS,mmm" (the log-header layout)."""
+    seconds, milli = divmod(ms % DAY_MS, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{sep}{milli:03d}"
+
+
+def format_iso(ms: int) -> str:
+    """Epoch ms → "YYYY-MM-DDTHH:MM:SS.mmm"."""
+    return f"{format_date(ms)}T{format_clock(ms, '.')}"
+
+
+# --- Retention (bounded state for long streams) --------------------
+# Opt-in limits on how long a parser keeps parcels in its state, so a
+# stream that runs for days holds only what is on the sorter. The clock is
+# log time at minute resolution, moved on by the parser as messages come
+# in. A closed parcel stays matchable for grace_s, so late messages (a
+# deregister after the sort report) still land on it, and is then yielded
+# and dropped. A parcel still open stale_after_s after it was created is
+# yielded as "stale" and dropped, freeing its hostId and PIC.
+
+CLOSED_GRACE_S = 300     # late messages come seconds after the close
+STALE_AFTER_S = 3600     # parcels normally cross the sorter in minutes
+
+
+def new_retention(grace_s=CLOSED_GRACE_S, stale_after_s=STALE_AFTER_S) -> dict:
+    return {
+        "grace_s": grace_s,
+        "stale_after_s": stale_after_s,
+        "minute": "",          # clock minute, as the parser spells it
+        "now": 0,              # clock minute, seconds since the epoch
+        "closed": deque(),     # (closed_at, creation_index, parcel), close order
+        "opened": {},          # parser key -> created_at, creation order
+        "evicted": Counter(),  # "closed" / "stale"
+    }
+
+
+def minute_seconds(day: str, hh_mm: str):
+    """Seconds since the epoch of "YYYY-MM-DD" "HH:MM", or None if malformed."""
+    try:
+        return day_ms(day) // 1000 + int(hh_mm[:2]) * 3600 + int(hh_mm[3:5]) * 60
+    except (TypeError, ValueError):
+        return None
+
+
+def mark_opened(retention, key):
+    """Start the stale timer of the parcel (or pending register) under *key*."""
+    opened = retention["opened"]
+    opened.pop(key, None)  # a reused key goes to the back, in creation order
+    opened[key] = retention["now"]
+
+
+def expired(retention, now):
+    """
+    Move the clock to *now* and return (closed, stale): the closed entries
+    whose grace is over and the keys of parcels created before the stale
+    cutoff (the parser checks which of those are still open), both removed
+    from *retention*.
+    """
+    retention["now"] = now
+    closed_queue, opened = retention["closed"], retention["opened"]
+
+    closed = []
+    cutoff = now - retention["grace_s"]
+    while closed_queue and closed_queue[0][0] < cutoff:
+        closed.append(closed_queue.popleft())
+
+    stale = []
+    cutoff = now - retention["stale_after_s"]
+    for key, created_at in opened.items():
+        if created_at >= cutoff:
+            break
+        stale.append(key)
+    for key in stale:
+        del opened[key]
+    return closed, stale
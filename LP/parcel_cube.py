@@ -0,0 +1,208 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from time_series import cycle_times
+
+# --- Location / destination aggregation cube -------------------------
+# One group-by over the parcels, built when they are parsed: a cell per
+# induction location × destination × status × sort_code that occurs, with
+# its parcel count and cycle-time sums. Drill-downs (per chute, per
+# induction point) roll the cube up instead of rescanning the parcels;
+# a day of parcels is a few thousand cells. Only additive stats are kept
+# so any roll-up is exact: mean and standard deviation are derived.
+#   KJ records      Registered_location, actual_destination, status,
+#                   sort_code; cycle registerTS → closedTS
+#   parcel tables   location, destination, status, sort_code (hlc's
+#   (hlc / JK)      VerifiedSortReport; none for JK); cycle as in
+#                   time_series (registration → sort report)
+
+DIMENSIONS = ("location", "destination", "status", "sort_code")
+STATS = ("parcels", "cycled", "cycle_sum_s", "cycle_sumsq_s", "cycle_min_s", "cycle_max_s")
+ROLLUP = {"parcels": "sum", "cycled": "sum", "cycle_sum_s": "sum", "cycle_sumsq_s": "sum",
+          "cycle_min_s": "min", "cycle_max_s": "max"}  # how cells combine
+
+
+class ParcelCube:
+    def __init__(self, cells: pd.DataFrame, cell_of=None, cycle_s=None):
+        self.cells = cells      # one row per cell: DIMENSIONS + STATS
+        self.cell_of = cell_of  # per parcel row: its cell (row in cells), see subset()
+        self.cycle_s = cycle_s  # per parcel row: its cycle time, NaN if unknown
+
+    def __len__(self):
+        return len(self.cells)
+
+    @classmethod
+    def build(cls, location, destination, status, sort_code, cycle_s) -> "ParcelCube":
+        """
+        Cube of parcels given as columns (missing values as None / NaN);
+        *cycle_s* NaN if unknown. The dimensions are factorized into one
+        int64 key per parcel, so the group-by is a single sort.
+        """
+        cycle_s = np.asarray(cycle_s, dtype="float64")
+        key = np.zeros(len(cycle_s), dtype="int64")
+        levels = []
+        for values in (location, destination, status, sort_code):
+            # Lists stay object (ints with None would become floats); missing → -1
+            codes, uniques = pd.factorize(pd.Series(values, dtype=getattr(values, "dtype", object)))
+            key = key * (len(uniques) + 1) + (codes + 1)
+            levels.append((len(uniques) + 1, np.array([None, *uniques.tolist()], dtype=object)))
+
+        # One sort groups the parcels by cell; every stat is a reduceat over it
+        order = np.argsort(key, kind="stable")
+        key, cycle_s = key[order], cycle_s[order]
+        new_cell = np.r_[True, key[1:] != key[:-1]][:len(key)]
+        starts = np.flatnonzero(new_cell)
+        cells = key[starts]
+        cell_of = np.empty(len(key), dtype="int64")
+        cell_of[order] = np.cumsum(new_cell) - 1
+        known = ~np.isnan(cycle_s)
+        known_s = np.where(known, cycle_s, 0.0)
+        stats = {
+            "parcels": np.diff(np.r_[starts, len(key)]).astype("int64"),
+            "cycled": np.add.reduceat(known.astype("int64"), starts),
+            "cycle_sum_s": np.add.reduceat(known_s, starts),
+            "cycle_sumsq_s": np.add.reduceat(known_s * known_s, starts),
+            "cycle_min_s": np.fmin.reduceat(cycle_s, starts),  # fmin / fmax skip NaN
+            "cycle_max_s": np.fmax.reduceat(cycle_s, starts),
+        }
+
+        dims = {}
+        for dim, (size, names) in reversed(list(zip(DIMENSIONS, levels))):
+            dims[dim] = names[cells % size]
+            cells = cells // size
+        cycle_of = np.empty(len(key))
+        cycle_of[order] = cycle_s
+        dims["sort_code"] = pd.array(dims["sort_code"], dtype="Int32")
+        return cls(pd.DataFrame({dim: dims[dim] for dim in DIMENSIONS} | stats), cell_of, cycle_of)
+
+    def subset(self, rows) -> "ParcelCube":
+        """
+        Cube of some of the parcels it was built from (row positions), e.g.
+        a time window: bincounts over the cells they are already in, no
+        new group-by.
+        """
+        rows = np.asarray(rows, dtype="int64")
+        cell, cycle_s = self.cell_of[rows], self.cycle_s[rows]
+        n = len(self.cells)
+        known = ~np.isnan(cycle_s)
+        known_s = np.where(known, cycle_s, 0.0)
+        low, high = np.full(n, np.nan), np.full(n, np.nan)
+        np.fmin.at(low, cell, cycle_s)
+        np.fmax.at(high, cell, cycle_s)
+        stats = {
+            "parcels": np.bincount(cell, minlength=n),
+            "cycled": np.bincount(cell, weights=known, minlength=n).astype("int64"),
+            "cycle_sum_s": np.bincount(cell, weights=known_s, minlength=n),
+            "cycle_sumsq_s": np.bincount(cell, weights=known_s * known_s, minlength=n),
+            "cycle_min_s": low,
+            "cycle_max_s": high,
+        }
+        used = stats["parcels"] > 0
+        cells = self.cells[list(DIMENSIONS)].assign(**stats)[used].reset_index(drop=True)
+        return ParcelCube(cells, (np.cumsum(used) - 1)[cell], cycle_s)
+
+    def select(self, **filters) -> pd.DataFrame:
+        """Cells whose dimensions equal *filters* (None matches a missing value)."""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, value in filters.items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown cube dimension '{dim}', expected one of {DIMENSIONS}")
+            col = self.cells[dim]
+            mask &= (col.isna() if value is None else col == value).to_numpy(dtype=bool, na_value=False)
+        return self.cells[mask]
+
+    def rollup(self, *dims, **filters) -> pd.DataFrame:
+        """
+        Totals per combination of *dims* (all cells if none) over the cells
+        matching *filters*, with cycle_mean_s / cycle_std_s; busiest first.
+        """
+        cells = self.select(**filters)
+        if dims:
+            grouped = cells.groupby(list(dims), dropna=False, sort=False).agg(ROLLUP)
+            keys = {dim: grouped.index.get_level_values(dim).to_numpy(dtype=object, na_value=None) for dim in dims}
+            stats = {stat: grouped[stat].to_numpy() for stat in STATS}
+        else:
+            keys = {}
+            stats = {stat: np.array([cells[stat].agg(how)], dtype="float64") for stat, how in ROLLUP.items()}
+
+        cycled = stats["cycled"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(cycled > 0, stats["cycle_sum_s"] / cycled, np.nan)
+            std = np.sqrt(np.clip(stats["cycle_sumsq_s"] / cycled - mean * mean, 0, None))
+        order = np.argsort(-stats["parcels"], kind="stable")
+        return pd.DataFrame({
+            **{dim: values[order] for dim, values in keys.items()},
+            "parcels": stats["parcels"][order].astype("int64"),
+            "cycled": stats["cycled"][order].astype("int64"),
+            "cycle_min_s": stats["cycle_min_s"][order],
+            "cycle_max_s": stats["cycle_max_s"][order],
+            "cycle_mean_s": mean[order],
+            "cycle_std_s": std[order],
+        })
+
+    def values(self, dim: str) -> list:
+        """Distinct values of one dimension, missing ones left out."""
+        return sorted(self.cells[dim].dropna().unique().tolist())
+
+
+def cube_of_records(parcels) -> ParcelCube:
+    """Cube of KJ.parse_log() parcels."""
+    cycle_s = [
+        (parcel.closedTS - parcel.registerTS) / 1000.0
+        if parcel.registerTS is not None and parcel.closedTS is not None else np.nan
+        for parcel in parcels
+    ]
+    return ParcelCube.build(
+        [parcel.Registered_location for parcel in parcels],
+        [parcel.actual_destination for parcel in parcels],
+        [parcel.status for parcel in parcels],
+        [parcel.sort_code for parcel in parcels],
+        cycle_s,
+    )
+
+
+def cube_of_tables(parcels: pd.DataFrame, events: pd.DataFrame) -> ParcelCube:
+    """Cube of a parcel_table parcels / events pair."""
+    return ParcelCube.build(
+        parcels["location"].array, parcels["destination"].array, parcels["status"].array,  # categorical
+        parcels["sort_code"].array, cycle_times(parcels, events),
+    )
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # KJ.py
+
+    parser = argparse.ArgumentParser(description="Parcel counts and cycle times per location / destination.")
+    parser.add_argument("log_file", help="raw viMessageSocket log")
+    parser.add_argument("--parser", choices=["kj", "hlc"], default="kj")
+    parser.add_argument("--by", nargs="+", choices=DIMENSIONS, default=["destination"],
+                        help="dimensions to roll up to")
+    parser.add_argument("--location", help="only parcels inducted here")
+    parser.add_argument("--destination", help="only parcels for this destination (chute)")
+    parser.add_argument("--status", help="only parcels with this status")
+    parser.add_argument("--csv", help="write the roll-up here instead of printing it")
+    args = parser.parse_args()
+
+    with open(args.log_file, "rb") as f:
+        if args.parser == "kj":
+            import KJ
+
+            cube = cube_of_records(KJ.parse_log(f, echo=False))
+        else:
+            from hlc_parser import parse_log_table
+
+            cube = parse_log_table(f).cube
+    filters = {dim: getattr(args, dim) for dim in ("location", "destination", "status") if getattr(args, dim)}
+    table = cube.rollup(*args.by, **filters)
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+        print(f"✅ {len(table):,} rows saved to '{args.csv}'")
+    else:
+        with pd.option_context("display.max_rows", None, "display.width", 160):
+            print(table.to_string(index=False, float_format="{:.1f}".format))
@@ -0,0 +1,244 @@
+import json
+import os
+from collections import Counter, deque
+
+# --- Streaming parcel sinks ----------------------------------------
+# Write parcel records as a parser yields them (when each parcel closes)
+# instead of collecting the whole list for one indented json.dump():
+#   JsonLinesSink  one compact JSON object per line
+#   ParquetSink    columnar file with a typed, nested schema per parser
+#                  layout, written in row groups (needs pyarrow)
+# Records come out in close order. A parcel can still get a message after
+# it closes (typically a deregister right after the sort report), so
+# SettleWindow holds the last few closed parcels back before writing.
+# read_records() / load_tables() read either format back, e.g. for the
+# dashboard, without re-parsing the log. hlc_parser / JK times (int epoch
+# ms) are Parquet timestamp[ms] columns and come back as ints.
+
+SETTLE_PARCELS = 1000      # closed parcels held back before they are written
+PARQUET_ROW_GROUP = 16_384  # parcels per Parquet row group
+FORMATS = {".jsonl": "jsonl", ".parquet": "parquet"}
+STATS_KEY = b"parse_stats"  # Parquet footer metadata: log_tokenizer stats, as JSON
+
+
+def _record(parcel) -> dict:
+    """JSON layout of a parcel: KJ records via to_dict(), dicts as they are."""
+    return parcel.to_dict() if hasattr(parcel, "to_dict") else parcel
+
+
+def format_of(path) -> str:
+    ext = os.path.splitext(str(path))[1].lower()
+    try:
+        return FORMATS[ext]
+    except KeyError:
+        raise ValueError(f"Unknown result format '{ext}', expected one of {sorted(FORMATS)}") from None
+
+
+class JsonLinesSink:
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, parcel):
+        self._file.write(json.dumps(_record(parcel), ensure_ascii=False, separators=(",", ":")))
+        self._file.write("\n")
+        self.count += 1
+
+    def close(self, stats=None):
+        self._file.close()
+
+
+# ── Parquet ───────────────────────────────────────────────────────
+def parquet_schema(layout: str):
+    """Arrow schema for the records of one parser: "kj", "hlc" or "jk"."""
+    import pyarrow as pa
+
+    string, int32, int64 = pa.string(), pa.int32(), pa.int64()
+    if layout == "kj":
+        return pa.schema([
+            ("hostId", string), ("pic", int32), ("date", string),
+            ("registerTS", string), ("closedTS", string), ("status", string),
+            ("plc_number", string), ("Registered_location", string),
+            ("customer_location", string), ("sort_strategy", string),
+            ("destinations", pa.list_(string)),
+            ("barcode_data", pa.struct([
+                ("barcodes", pa.list_(string)), ("barcode_count", int32), ("barcode_state", int32),
+            ])),
+            ("barcode_error", pa.bool_()), ("alibi_id", string),
+            ("volume_data", pa.struct([
+                ("volume_state", int32), ("length", int32), ("width", int32), ("height", int32),
+                ("box_volume", int64), ("real_volume", int64),
+            ])),
+            ("volume_error", pa.bool_()), ("item_state", string),
+            ("actual_destination", string),
+            ("destination_status", pa.map_(int32, int32)),
+            ("sort_code", int32), ("entrance_state", string), ("exit_state", string),
+            ("events", pa.list_(pa.struct([
+                ("date", string), ("ts", string), ("msg_id", string),
+                ("type", string), ("location", string), ("raw", string),
+            ]))),
+        ])
+
+    if layout not in ("hlc", "jk"):
+        raise ValueError(f"Unknown record layout '{layout}', expected 'kj', 'hlc' or 'jk'")
+    ms = pa.timestamp("ms")
+    fields = [
+        ("pic", int32), ("hostId", string),
+        ("barcodes", pa.list_(string)), ("barcode_count", int32),
+        ("location", string), ("destination", string), ("sort_code", int32),
+        ("lifeCycle", pa.struct([("registeredAt", ms), ("closedAt", ms), ("status", string)])),
+        ("barcodeErr", pa.bool_()),
+        ("alibi_id", string),
+        ("events", pa.list_(pa.struct([("plc_ts", ms), ("log_ts", ms), ("type", string), ("raw", string)]))),
+        ("volume_data", pa.struct([(field, pa.float64()) for field in
+                                   ("length", "width", "height", "box_volume", "real_volume")])),
+    ]
+    if layout == "jk":
+        fields = [field for field in fields if field[0] not in ("alibi_id", "sort_code")]
+    return pa.schema(fields)
+
+
+def _int_times(type_):
+    """*type_* with every timestamp in it as int64 (epoch ms once cast)."""
+    import pyarrow as pa
+
+    if pa.types.is_timestamp(type_):
+        return pa.int64()
+    if pa.types.is_struct(type_):
+        return pa.struct([field.with_type(_int_times(field.type)) for field in type_])
+    if pa.types.is_list(type_):
+        return pa.list_(_int_times(type_.value_type))
+    return type_
+
+
+class ParquetSink:
+    def __init__(self, path, layout, row_group=PARQUET_ROW_GROUP):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow)") from None
+
+        self.path = path
+        self.count = 0
+        self.schema = parquet_schema(layout)
+        self.row_group = row_group
+        self._rows = []
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, parcel):
+        self._rows.append(_record(parcel))
+        self.count += 1
+        if len(self._rows) >= self.row_group:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+
+        if self._rows:
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+
+    def close(self, stats=None):
+        self._flush()
+        if stats is not None:
+            self._writer.add_key_value_metadata({STATS_KEY: json.dumps(stats)})
+        self._writer.close()
+
+
+# ── Settling and opening ──────────────────────────────────────────
+class SettleWindow:
+    """Sink wrapper: a parcel is written once *size* more parcels have closed after it."""
+
+    def __init__(self, sink, size=SETTLE_PARCELS):
+        self.sink = sink
+        self.size = size
+        self._held = deque()
+
+    @property
+    def count(self):
+        return self.sink.count + len(self._held)
+
+    def write(self, parcel):
+        self._held.append(parcel)
+        if len(self._held) > self.size:
+            self.sink.write(self._held.popleft())
+
+    def close(self, stats=None):
+        while self._held:
+            self.sink.write(self._held.popleft())
+        self.sink.close(stats)
+
+
+def open_sink(path, layout, settle=SETTLE_PARCELS, fmt=None):
+    """Sink for *path* by its extension (or *fmt*): .jsonl or .parquet, settled unless settle=0."""
+    fmt = fmt or format_of(path)
+    sink = JsonLinesSink(path) if fmt == "jsonl" else ParquetSink(path, layout)
+    return SettleWindow(sink, settle) if settle else sink
+
+
+# --- Reading results back ------------------------------------------
+def read_records(source, fmt):
+    """Yield the records of a .jsonl / .parquet result (a path or binary file object)."""
+    if fmt == "jsonl":
+        f = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            if f is not source:
+                f.close()
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(source)
+    schema = parquet.schema_arrow
+    schema = pa.schema([field.with_type(_int_times(field.type)) for field in schema])
+    for batch in parquet.iter_batches():
+        for record in pa.Table.from_batches([batch]).cast(schema).to_pylist():
+            # Arrow maps come back as pairs; JSON gives string keys
+            if "destination_status" in record:
+                record["destination_status"] = {str(k): v for k, v in record["destination_status"] or ()}
+            yield record
+
+
+def read_stats(source, fmt):
+    """Parse stats stored with a result (Parquet only), or None."""
+    if fmt != "parquet":
+        return None
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(source).metadata.metadata or {}
+    if STATS_KEY not in metadata:
+        return None
+    stats = json.loads(metadata[STATS_KEY])
+    return {"lines": stats["lines"], "messages": Counter(stats["messages"]), "skipped": Counter(stats["skipped"])}
+
+
+def record_layout(record) -> str:
+    """Parser layout of a record: "kj", "hlc" or "jk" (JK parcels have no sort_code)."""
+    if "lifeCycle" not in record:
+        return "kj"
+    return "hlc" if "sort_code" in record else "jk"
+
+
+def load_tables(source, fmt):
+    """hlc_parser / JK result file → parcel_table.ParcelTables, without the log."""
+    from log_tokenizer import new_stats
+    from parcel_table import build_parcel_tables  # pandas is only needed here
+
+    records = list(read_records(source, fmt))
+    layout = record_layout(records[0]) if records else "hlc"
+    if layout == "kj":
+        raise ValueError("Not an hlc_parser / JK result (KJ records cannot be shown)")
+    if hasattr(source, "seek"):
+        source.seek(0)
+    stats = read_stats(source, fmt)
+    if stats is None:
+        # Only what reached a parcel is known
+        stats = new_stats()
+        stats["messages"].update(event["type"] for record in records for event in record["events"])
+    return build_parcel_tables(records, stats, layout=layout)
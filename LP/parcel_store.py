@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from log_tokenizer import new_stats
+from parcel_table import NAT, STATUS, VOLUME_FIELDS, ParcelTables, event_raw, to_ms, with_indexes, with_times
+
+# --- SQLite parcel store -------------------------------------------
+# Parsed logs kept in one local SQLite file, so a parcel from another day
+# is a query rather than a re-upload of that day's log. Logs are keyed
+# by content hash: ingesting content that is already stored does nothing,
+# whatever it is called. The name (the log file name) is only a label, so
+# two days' logs with the same file name are both kept; what is stored
+# under a name is replaced (in the same transaction) only when asked
+# with replace=True. Parcels get id = log id << ID_BITS |
+# parcel_id, so a log's rows are one id range and the child tables need
+# no look-ups while writing. hostId, PIC, alibi_id, barcode and the times
+# are indexed: exact and prefix searches and day ranges are index reads.
+# load() / search() give parcel_table.ParcelTables, so the dashboard's
+# views run on the store unchanged; event text stays in the store until
+# a view shows it (StoreLines, like raw_store.RawLines).
+
+ID_BITS = 32
+STORE_PATH = os.environ.get(
+    "PARCEL_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "parcels.db")
+)
+SEARCH_COLUMNS = {"host_id": "host_id", "pic": "pic", "alibi_id": "alibi_id"}  # search_index field -> column
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,            -- label, not unique
+    hash        TEXT UNIQUE,
+    first_ms    INTEGER,
+    last_ms     INTEGER,
+    parcels     INTEGER NOT NULL,
+    ingested_ms INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parcels (
+    id            INTEGER PRIMARY KEY,  -- log << ID_BITS | parcel_id
+    log           INTEGER NOT NULL REFERENCES logs(id),
+    pic           INTEGER,
+    host_id       TEXT,
+    location      TEXT,
+    destination   TEXT,
+    status        TEXT,
+    registered_at INTEGER,
+    closed_at     INTEGER,
+    time_ms       INTEGER,              -- time_index time: registeredAt, else first event
+    barcode_err   INTEGER NOT NULL,
+    alibi_id      TEXT,
+    length REAL, width REAL, height REAL, box_volume REAL, real_volume REAL,
+    sort_code     INTEGER
+);
+CREATE TABLE IF NOT EXISTS barcodes (
+    parcel  INTEGER NOT NULL,
+    barcode TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id     INTEGER PRIMARY KEY,
+    parcel INTEGER NOT NULL,
+    ts     INTEGER,
+    type   TEXT NOT NULL,
+    raw    TEXT
+);
+CREATE INDEX IF NOT EXISTS parcels_host_id ON parcels(host_id);
+CREATE INDEX IF NOT EXISTS parcels_pic ON parcels(pic);
+CREATE INDEX IF NOT EXISTS parcels_alibi_id ON parcels(alibi_id);
+CREATE INDEX IF NOT EXISTS parcels_time ON parcels(time_ms);
+CREATE INDEX IF NOT EXISTS barcodes_barcode ON barcodes(barcode);
+CREATE INDEX IF NOT EXISTS barcodes_parcel ON barcodes(parcel);
+CREATE INDEX IF NOT EXISTS events_parcel ON events(parcel);
+CREATE INDEX IF NOT EXISTS events_ts ON events(ts);
+"""
+
+PARCEL_COLUMNS = ("id", "log", "pic", "host_id", "location", "destination", "status", "registered_at", "closed_at",
+                  "barcode_err", "alibi_id", *VOLUME_FIELDS, "sort_code")
+
+
+def _values(col: pd.Series) -> list:
+    """Column as Python values, missing ones as None."""
+    return col.astype(object).where(col.notna(), None).tolist()
+
+
+def _ms_values(ms: np.ndarray) -> list:
+    return [None if value == NAT else value for value in ms.tolist()]
+
+
+def _like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class StoreLines:
+    """Resolves events' raw_ref (their id in the store) to raw text, like raw_store.RawLines."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_many(self, refs) -> list[str]:
+        refs = [int(ref) for ref in refs]
+        with self.store.connect() as db:
+            raw = dict(db.execute("SELECT id, raw FROM events WHERE id IN (SELECT value FROM json_each(?))",
+                                  (json.dumps(refs),)))
+        return [raw.get(ref) or "" for ref in refs]
+
+
+class ParcelStore:
+    def __init__(self, path=STORE_PATH):
+        self.path = str(path)
+        with self.connect() as db:
+            db.execute("PRAGMA journal_mode = WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """A connection for one transaction, closed after it."""
+        db = sqlite3.connect(self.path)
+        try:
+            db.execute("PRAGMA synchronous = NORMAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ── Writing ───────────────────────────────────────────────────
+    def ingest(self, name: str, tables: ParcelTables, content_hash: str = None, replace: bool = False):
+        """
+        Store one parsed log labelled *name*; with *replace*, the logs
+        stored under that name are dropped first. Returns the number of
+        parcels written, or None when a log with *content_hash* is already
+        stored (under any name; nothing to do).
+        """
+        tables = with_times(tables)
+        parcels, barcodes, events = tables.parcels, tables.barcodes, tables.events
+        time_ms = np.empty(len(parcels), dtype="int64")
+        time_ms[tables.times.parcel_order] = tables.times.parcel_ms
+        span = tables.times.span() or (None, None)
+
+        with self.connect() as db:
+            if content_hash is not None and self._stored_as(db, content_hash) is not None:
+                return None
+            if replace:
+                for (log_id,) in db.execute("SELECT id FROM logs WHERE name = ?", (name,)).fetchall():
+                    self._drop(db, log_id)
+            log_id = db.execute(
+                "INSERT INTO logs (name, hash, first_ms, last_ms, parcels, ingested_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, content_hash, *span, len(parcels), int(time.time() * 1000)),
+            ).lastrowid
+
+            # One executemany per table, fed column by column
+            base = log_id << ID_BITS
+            ms = lambda col: _ms_values(col.to_numpy(dtype="datetime64[ms]").view("int64"))  # noqa: E731
+            db.executemany(
+                f"INSERT INTO parcels ({', '.join(PARCEL_COLUMNS[:9])}, time_ms, {', '.join(PARCEL_COLUMNS[9:])}) "
+                f"VALUES ({', '.join('?' * (len(PARCEL_COLUMNS) + 1))})",
+                zip(
+                    (base + parcels.index.to_numpy()).tolist(), [log_id] * len(parcels),
+                    parcels["pic"].tolist(), _values(parcels["hostId"]),
+                    _values(parcels["location"]), _values(parcels["destination"]), _values(parcels["status"]),
+                    ms(parcels["registeredAt"]), ms(parcels["closedAt"]), _ms_values(time_ms),
+                    parcels["barcodeErr"].astype(int).tolist(), _values(parcels["alibi_id"]),
+                    *(_values(parcels[field].astype("float64")) for field in VOLUME_FIELDS),
+                    _values(parcels["sort_code"]),
+                ),
+            )
+            db.executemany(
+                "INSERT INTO barcodes (parcel, barcode) VALUES (?, ?)",
+                zip((base + barcodes["parcel_id"].to_numpy("int64")).tolist(), barcodes["barcode"].tolist()),
+            )
+            db.executemany(
+                "INSERT INTO events (parcel, ts, type, raw) VALUES (?, ?, ?, ?)",
+                zip((base + events["parcel_id"].to_numpy("int64")).tolist(), ms(events["ts"]),
+                    events["type"].astype(str).tolist(), event_raw(tables, events).tolist()),
+            )
+        return len(parcels)
+
+    def stored_as(self, content_hash: str):
+        """Name of the stored log with this content hash (ingesting it again would do nothing), or None."""
+        with self.connect() as db:
+            return self._stored_as(db, content_hash)
+
+    def remove(self, name: str) -> int:
+        """Drop the logs stored under *name*; returns how many there were."""
+        with self.connect() as db:
+            rows = db.execute("SELECT id FROM logs WHERE name = ?", (name,)).fetchall()
+            for (log_id,) in rows:
+                self._drop(db, log_id)
+        return len(rows)
+
+    @staticmethod
+    def _stored_as(db, content_hash: str):
+        row = db.execute("SELECT name FROM logs WHERE hash = ?", (content_hash,)).fetchone()
+        return None if row is None else row[0]
+
+    @staticmethod
+    def _drop(db, log_id: int):
+        """Delete one log and its rows (one id range per table)."""
+        low, high = log_id << ID_BITS, (log_id + 1) << ID_BITS
+        for table, column in (("events", "parcel"), ("barcodes", "parcel"), ("parcels", "id")):
+            db.execute(f"DELETE FROM {table} WHERE {column} >= ? AND {column} < ?", (low, high))
+        db.execute("DELETE FROM logs WHERE id = ?", (log_id,))
+
+    # ── Reading ───────────────────────────────────────────────────
+    def logs(self) -> pd.DataFrame:
+        """One row per stored log: name, first / last time, parcels, ingested; oldest first."""
+        with self.connect() as db:
+            rows = db.execute("SELECT name, first_ms, last_ms, parcels, ingested_ms FROM logs ORDER BY first_ms")
+            logs = pd.DataFrame(rows.fetchall(), columns=["name", "first", "last", "parcels", "ingested"])
+        for col in ("first", "last", "ingested"):
+            logs[col] = pd.to_datetime(logs[col], unit="ms")
+        return logs
+
+    def version(self):
+        """Changes whenever a log is ingested or removed (a cache key for load())."""
+        with self.connect() as db:
+            return db.execute("SELECT count(*), max(ingested_ms) FROM logs").fetchone()
+
+    def load(self, start_ms: int = None, end_ms: int = None) -> ParcelTables:
+        """Every stored parcel whose time is in [start_ms, end_ms] (all if None), with its barcodes and events."""
+        where, args = [], []
+        if start_ms is not None:
+            where.append("p.time_ms >= ?")
+            args.append(start_ms)
+        if end_ms is not None:
+            where.append("p.time_ms <= ?")
+            args.append(end_ms)
+        return self._tables(" AND ".join(where) or "1", args)
+
+    def find(self, field: str, query: str, mode: str = "exact", limit: int = 100) -> list:
+        """
+        Store ids of the parcels of every stored log matching *query*, at
+        most *limit*; the fields and match modes of search_index's lookup().
+        Exact and prefix matches read the indexes, ends-with and contains scan.
+        """
+        if field == "pic":
+            try:
+                column, condition, value = "p.pic", "= ?", int(query)
+            except ValueError:
+                return []
+        else:
+            column = "b.barcode" if field == "barcode" else f"p.{SEARCH_COLUMNS[field]}"
+            condition, value = {
+                "exact": ("= ?", query),
+                "prefix": ("GLOB ?", query.replace("[", "[[]").replace("*", "[*]").replace("?", "[?]") + "*"),
+                "suffix": ("LIKE ? ESCAPE '\\'", "%" + _like(query)),
+                "contains": ("LIKE ? ESCAPE '\\'", "%" + _like(query) + "%"),
+            }[mode]
+        table, id_column = ("barcodes b", "b.parcel") if field == "barcode" else ("parcels p", "p.id")
+        with self.connect() as db:
+            return [row[0] for row in db.execute(
+                f"SELECT DISTINCT {id_column} FROM {table} WHERE {column} {condition} ORDER BY {id_column} LIMIT ?",
+                (value, limit),
+            )]
+
+    def search(self, field: str, query: str, mode: str = "exact", limit: int = 100) -> ParcelTables:
+        """find()'s parcels as ParcelTables for the search view (no time / filter indexes or cube)."""
+        ids = self.find(field, query, mode, limit)
+        return self._tables("p.id IN (SELECT value FROM json_each(?))", [json.dumps(ids)], indexes=False)
+
+    def _tables(self, where: str, args: list, indexes: bool = True) -> ParcelTables:
+        """ParcelTables of the parcels matching *where* (over parcels p), parcel_ids 0..n-1 in store order."""
+        with self.connect() as db:
+            rows = db.execute(
+                f"SELECT p.id, l.name, p.pic, p.host_id, p.location, p.destination, p.status, p.registered_at, "
+                f"p.closed_at, p.barcode_err, p.alibi_id, {', '.join('p.' + f for f in VOLUME_FIELDS)}, p.sort_code "
+                f"FROM parcels p JOIN logs l ON l.id = p.log WHERE {where} ORDER BY p.id", args,
+            ).fetchall()
+            barcode_rows = db.execute(
+                f"SELECT b.parcel, b.barcode FROM barcodes b JOIN parcels p ON p.id = b.parcel "
+                f"WHERE {where} ORDER BY b.parcel, b.rowid", args,
+            ).fetchall()
+            event_rows = db.execute(
+                f"SELECT e.id, e.parcel, e.ts, e.type FROM events e JOIN parcels p ON p.id = e.parcel "
+                f"WHERE {where} ORDER BY e.parcel, e.id", args,
+            ).fetchall()
+
+        columns = list(zip(*rows)) or [()] * (12 + len(VOLUME_FIELDS))
+        ids = np.array(columns[0], dtype="int64")
+        b_parcel, b_values = zip(*barcode_rows) if barcode_rows else ((), ())
+        e_ids, e_parcel, e_ts, e_types = zip(*event_rows) if event_rows else ((), (), (), ())
+        b_ids = np.searchsorted(ids, np.array(b_parcel, dtype="int64"))
+
+        # Same dtypes as parcel_table.build_parcel_tables, plus the log each parcel came from
+        parcels = pd.DataFrame({
+            "pic": pd.Series(columns[2], dtype="int32"),
+            "hostId": pd.Series(columns[3], dtype=object),
+            "location": pd.Series(columns[4], dtype="category"),
+            "destination": pd.Series(columns[5], dtype="category"),
+            "sort_code": pd.Series(columns[-1], dtype="Int32"),
+            "status": pd.Series(columns[6], dtype=STATUS),
+            "registeredAt": to_ms(columns[7]),
+            "closedAt": to_ms(columns[8]),
+            "barcodeErr": pd.Series(columns[9], dtype=bool),
+            "alibi_id": pd.Series(columns[10], dtype=object),
+            "barcode_count": np.bincount(b_ids, minlength=len(ids)).astype("int16"),
+            **{field: pd.Series(values, dtype="float32")
+               for field, values in zip(VOLUME_FIELDS, (np.array(col, dtype="float64") for col in columns[11:-1]))},
+            "log": pd.Series(columns[1], dtype="category"),
+        })
+        parcels.index.name = "parcel_id"
+        barcodes = pd.DataFrame({
+            "parcel_id": pd.Series(b_ids, dtype="int32"),
+            "barcode": pd.Series(b_values, dtype=object),
+        })
+        events = pd.DataFrame({
+            "parcel_id": pd.Series(np.searchsorted(ids, np.array(e_parcel, dtype="int64")), dtype="int32"),
+            "ts": to_ms(e_ts),
+            "type": pd.Series(e_types, dtype="category"),
+            "raw_ref": np.array(e_ids, dtype="int64"),
+        })
+
+        # Only what reached a parcel is known, as for a result file (parcel_sinks.load_tables)
+        stats = new_stats()
+        stats["messages"].update(events["type"].value_counts().to_dict())
+        if not indexes:
+            return ParcelTables(parcels, barcodes, events, stats, raw_lines=StoreLines(self))
+        return with_indexes(parcels, barcodes, events, stats, StoreLines(self))
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    from search_index import MATCH_MODES
+
+    parser = argparse.ArgumentParser(description="Keep parsed HLC logs in a SQLite store and look parcels up in it.")
+    parser.add_argument("--db", default=STORE_PATH, help="store file (default: $PARCEL_STORE_PATH or parcels.db here)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="parse logs (or load .jsonl / .parquet results) into the store")
+    ingest.add_argument("logs", nargs="+")
+    ingest.add_argument("--replace", action="store_true", help="drop the logs stored under the same file name first")
+    commands.add_parser("logs", help="list the stored logs")
+    lookup = commands.add_parser("lookup", help="find parcels across every stored log")
+    lookup.add_argument("field", choices=["host_id", "barcode", "pic", "alibi_id"])
+    lookup.add_argument("query")
+    lookup.add_argument("--match", choices=MATCH_MODES, default="exact")
+    lookup.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    store = ParcelStore(args.db)
+    if args.command == "ingest":
+        from hlc_parser import parse_log_table
+        from parcel_sinks import FORMATS, load_tables
+        from parse_cache import content_hash
+
+        for path in args.logs:
+            started = time.perf_counter()
+            name = os.path.basename(path)
+            with open(path, "rb") as f:
+                digest = content_hash(f)
+                stored = store.stored_as(digest)
+                if stored is not None:
+                    print(f"= {path}: already stored" + (f" as {stored}" if stored != name else ""))
+                    continue
+                ext = os.path.splitext(path)[1].lower()
+                tables = load_tables(f, FORMATS[ext]) if ext in FORMATS else parse_log_table(f)
+            count = store.ingest(name, tables, digest, replace=args.replace)
+            seconds = time.perf_counter() - started
+            print(f"✅ {path}: {count:,} parcels in {seconds:.1f}s")
+    elif args.command == "logs":
+        print(store.logs().to_string(index=False))
+    else:
+        started = time.perf_counter()
+        ids = store.find(args.field, args.query, args.match, args.limit)
+        seconds = time.perf_counter() - started
+        found = store.search(args.field, args.query, args.match, args.limit)
+        columns = ["log", "pic", "hostId", "status", "registeredAt", "location", "destination"]
+        print(found.parcels[columns].to_string())
+        print(f"{len(ids):,} parcels found in {seconds * 1000:.1f} ms")
@@ -0,0 +1,200 @@
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FilterIndex
+from parcel_cube import ParcelCube, cube_of_tables
+from raw_store import RawLines
+from search_index import SearchIndex
+from time_index import TimeIndex
+
+# --- Columnar parcel tables ----------------------------------------
+# Flattens the parser's list of parcel dicts (hlc_parser / JK schema) into
+# typed columns. Lists become child tables keyed by parcel_id, which is the
+# row position in the parcels table.
+# Events carry two clocks, "plc_ts" (the PLC stamp in the body) and "log_ts"
+# (the log-line header). The events table keeps one, as "ts": the clock the
+# parser runs the lifecycle on, so it lines up with registeredAt / closedAt.
+
+STATUS = pd.CategoricalDtype(["open", "sorted", "deregistered", "stale"])  # stale: evicted while open
+VOLUME_FIELDS = ("length", "width", "height", "box_volume", "real_volume")
+NAT = np.iinfo(np.int64).min  # datetime64's NaT as int64
+LIFECYCLE_CLOCKS = {"hlc": "plc_ts", "jk": "log_ts"}  # record layout -> event clock of its lifecycle
+
+
+class ParcelTables(NamedTuple):
+    parcels: pd.DataFrame   # index parcel_id; pic, hostId, status, registeredAt, closedAt, …
+    barcodes: pd.DataFrame  # parcel_id, barcode
+    events: pd.DataFrame    # parcel_id, ts (lifecycle clock), type, raw (or raw_ref, see event_raw)
+    stats: dict = None      # parse-time counters, see log_tokenizer.new_stats()
+    index: SearchIndex = None  # hostId / barcode / PIC / alibi_id lookups
+    raw_lines: RawLines = None  # resolves events' raw_ref column, if it has one
+    times: TimeIndex = None     # time-range lookups, see window()
+    cube: ParcelCube = None     # location × destination × status × sort_code counts
+    filters: FilterIndex = None  # per-value row bitmaps of the All Parcels filters
+
+
+def to_ms(values) -> pd.Series:
+    """Epoch-ms ints (None allowed) → datetime64[ms] Series."""
+    ms = np.fromiter((NAT if value is None else value for value in values), dtype="int64", count=len(values))
+    return pd.Series(ms.view("datetime64[ms]"))
+
+
+def build_parcel_tables(records, stats=None, raw_lines=None, layout="hlc") -> ParcelTables:
+    """
+    *layout* ("hlc" or "jk") picks the event clock behind the events' "ts".
+    With *raw_lines*, events' "raw" values are raw_store refs into it.
+    """
+    try:
+        clock = LIFECYCLE_CLOCKS[layout]
+    except KeyError:
+        raise ValueError(f"Unknown record layout '{layout}', expected 'hlc' or 'jk'") from None
+    pics, host_ids, locations, destinations, sort_codes = [], [], [], [], []
+    statuses, registered, closed, barcode_errs, alibi_ids = [], [], [], [], []
+    volumes = {field: [] for field in VOLUME_FIELDS}
+    bc_ids, bc_values = [], []
+    ev_ids, ev_ts, ev_types, ev_raw = [], [], [], []
+
+    for parcel_id, parcel in enumerate(records):
+        lifecycle = parcel["lifeCycle"]
+        pics.append(parcel["pic"])
+        host_ids.append(parcel["hostId"])
+        locations.append(parcel["location"])
+        destinations.append(parcel["destination"])
+        sort_codes.append(parcel.get("sort_code"))  # hlc only
+        statuses.append(lifecycle["status"])
+        registered.append(lifecycle["registeredAt"])
+        closed.append(lifecycle["closedAt"])
+        barcode_errs.append(parcel["barcodeErr"])
+        alibi_ids.append(parcel.get("alibi_id"))
+
+        volume = parcel.get("volume_data") or {}
+        for field in VOLUME_FIELDS:
+            value = volume.get(field)
+            volumes[field].append(np.nan if value is None else value)
+
+        for barcode in parcel["barcodes"]:
+            bc_ids.append(parcel_id)
+            bc_values.append(barcode)
+
+        for event in parcel["events"]:
+            ev_ids.append(parcel_id)
+            ev_ts.append(event[clock])
+            ev_types.append(event["type"])
+            ev_raw.append(event["raw"])
+
+    parcels = pd.DataFrame({
+        "pic": pd.Series(pics, dtype="int32"),
+        "hostId": pd.Series(host_ids, dtype=object),
+        "location": pd.Series(locations, dtype="category"),
+        "destination": pd.Series(destinations, dtype="category"),
+        "sort_code": pd.Series(sort_codes, dtype="Int32"),
+        "status": pd.Series(statuses, dtype=STATUS),
+        "registeredAt": to_ms(registered),
+        "closedAt": to_ms(closed),
+        "barcodeErr": pd.Series(barcode_errs, dtype=bool),
+        "alibi_id": pd.Series(alibi_ids, dtype=object),
+        "barcode_count": np.bincount(bc_ids, minlength=len(pics)).astype("int16"),
+        **{field: pd.Series(values, dtype="float32") for field, values in volumes.items()},
+    })
+    parcels.index.name = "parcel_id"
+
+    barcodes = pd.DataFrame({
+        "parcel_id": pd.Series(bc_ids, dtype="int32"),
+        "barcode": pd.Series(bc_values, dtype=object),
+    })
+
+    events = pd.DataFrame({
+        "parcel_id": pd.Series(ev_ids, dtype="int32"),
+        "ts": to_ms(ev_ts),
+        "type": pd.Series(ev_types, dtype="category"),
+    })
+    if raw_lines is None:
+        events["raw"] = pd.Series(ev_raw, dtype=object)
+    else:
+        events["raw_ref"] = np.array(ev_raw, dtype="int64")
+
+    return with_indexes(parcels, barcodes, events, stats, raw_lines)
+
+
+def with_indexes(parcels, barcodes, events, stats=None, raw_lines=None) -> ParcelTables:
+    """ParcelTables of typed tables (parcel_id = row position) with their search / time / filter indexes and cube."""
+    index = SearchIndex(
+        parcels["hostId"].tolist(), parcels["pic"].tolist(), parcels["alibi_id"].tolist(),
+        zip(barcodes["barcode"].tolist(), barcodes["parcel_id"].tolist()),
+    )
+    return ParcelTables(parcels, barcodes, events, stats, index, raw_lines, TimeIndex(parcels, events),
+                        cube_of_tables(parcels, events), FilterIndex(parcels))
+
+
+# --- Helpers for the views -----------------------------------------
+def child_rows(table: pd.DataFrame, parcel_ids) -> pd.DataFrame:
+    """
+    Rows of a child table (barcodes, events) belonging to *parcel_ids*.
+    Built tables (and windows of them) are in parcel_id order, so this is
+    two binary searches per parcel; live tables, appended to per poll, are
+    scanned.
+    """
+    ids = np.asarray(parcel_ids, dtype="int64")
+    col = table["parcel_id"].to_numpy()
+    if col.size > 1 and not (col[1:] >= col[:-1]).all():
+        return table[np.isin(col, ids)]
+    starts, ends = np.searchsorted(col, ids, side="left"), np.searchsorted(col, ids, side="right")
+    lengths = ends - starts
+    # Concatenated ranges [start, end) without a Python loop
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return table.iloc[np.sort(positions)]
+
+
+def barcodes_of(tables: ParcelTables, parcel_id: int) -> list:
+    return child_rows(tables.barcodes, [parcel_id])["barcode"].tolist()
+
+
+def events_of(tables: ParcelTables, parcel_id: int) -> pd.DataFrame:
+    return child_rows(tables.events, [parcel_id])
+
+
+def event_raw(tables: ParcelTables, events: pd.DataFrame) -> pd.Series:
+    """Raw text of some rows of tables.events, decoded only now if they hold refs."""
+    if "raw" in events:
+        return events["raw"]
+    return pd.Series(tables.raw_lines.get_many(events["raw_ref"].to_numpy()), index=events.index, dtype=object)
+
+
+def with_times(tables: ParcelTables) -> ParcelTables:
+    """*tables* with a time index, building it if it has none (live tables, old cache entries)."""
+    if tables.times is not None:
+        return tables
+    return tables._replace(times=TimeIndex(tables.parcels, tables.events))
+
+
+def window(tables: ParcelTables, start_ms: int, end_ms: int) -> ParcelTables:
+    """
+    The parcels whose time is in [start_ms, end_ms] (see time_index), with
+    all their barcodes and events; parcel_ids and the search index are
+    kept. stats["messages"] counts the events in the window, parcel or
+    not; the rest of stats still covers the whole log. The cube and filter
+    index are cut down to the window's parcels.
+    """
+    tables = with_times(tables)
+    ids = tables.times.parcels_between(start_ms, end_ms)
+    keep = np.zeros(int(tables.parcels.index.max()) + 1 if len(tables.parcels) else 0, dtype=bool)
+    keep[ids] = True
+
+    ev = tables.events
+    codes = ev["type"].cat.codes.to_numpy()[tables.times.events_between(start_ms, end_ms)]
+    counts = np.bincount(codes[codes >= 0], minlength=len(ev["type"].cat.categories))
+    stats = dict(tables.stats or {})
+    stats["messages"] = Counter({msg: int(n) for msg, n in zip(ev["type"].cat.categories, counts) if n})
+    parcels, events = tables.parcels.loc[ids], ev[keep[ev["parcel_id"].to_numpy()]]
+    rows = tables.parcels.index.get_indexer(ids)
+    return tables._replace(
+        parcels=parcels,
+        barcodes=tables.barcodes[keep[tables.barcodes["parcel_id"].to_numpy()]],
+        events=events,
+        stats=stats,
+        cube=None if tables.cube is None else tables.cube.subset(rows),
+        filters=None if tables.filters is None else tables.filters.subset(rows),
+    )
@@ -1,7 +1,8 @@
 import re
 import json
 from collections import defaultdict
-from datetime import datetime
+
+from message_engine import log_clock
 
 # ── Message‑type mapping ────────────────────────────────────────────
 ID_MAP = {
@@ -16,7 +17,6 @@ ID_MAP = {
 }
 
 # ── Regex helpers ───────────────────────────────────────────────────
-LOG_TS   = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3})')
 RAW_BODY = re.compile(r'\): (.*?)(?: \[\]$)')
 LOC_PAT  = re.compile(r'\b\d{4}\.\d{4}\.\d{4}\.B\d{2}\b')   # chute/station code
 
@@ -27,6 +27,7 @@ def parse_log(text: str):
     Dict schema:
         pic, hostId, barcodes[], location, destination,
         lifeCycle{registeredAt, closedAt, status}, barcodeErr, events[].
+    Times are int epoch ms (log-line header).
     """
     parcels = defaultdict(lambda: {
         "pic": None,
@@ -39,16 +40,13 @@ def parse_log(text: str):
         "events": []
     })
 
+    log_ms = log_clock()
     for line in text.splitlines():
         # timestamp & body extraction
-        ts_m, body_m = LOG_TS.search(line), RAW_BODY.search(line)
-        if not (ts_m and body_m):
+        ts, body_m = log_ms(None, None, line), RAW_BODY.search(line)
+        if ts is None or not body_m:
             continue
 
-        ts_iso = datetime.strptime(
-            f"{ts_m.group(1)}.{ts_m.group(2)}", "%Y-%m-%d %H:%M:%S.%f"
-        ).isoformat()
-
         parts = body_m.group(1).strip().split("|")
         if len(parts) < 5 or ID_MAP.get(parts[3], "").startswith("Watchdog"):
             continue
@@ -72,7 +70,7 @@ def parse_log(text: str):
         # ── message‑specific handling ─────────────────────────────
         if msg == "ItemRegister":
             parcel["lifeCycle"]["registeredAt"] = (
-                parcel["lifeCycle"]["registeredAt"] or ts_iso
+                parcel["lifeCycle"]["registeredAt"] or ts
             )
 
         elif msg == "ItemInstruction":
@@ -111,10 +109,10 @@ def parse_log(text: str):
         elif msg == "ItemDeRegister":
             if parcel["lifeCycle"]["status"] != "sorted":
                 parcel["lifeCycle"]["status"] = "deregistered"
-            parcel["lifeCycle"]["closedAt"] = ts_iso
+            parcel["lifeCycle"]["closedAt"] = ts
 
         # store raw event
-        parcel["events"].append({"ts": ts_iso, "type": msg, "raw": "|".join(parts)})
+        parcel["events"].append({"ts": ts, "type": msg, "raw": "|".join(parts)})
 
     # defaultdict → list[dict]
     return list(parcels.values())
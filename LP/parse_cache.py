@@ -0,0 +1,227 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from raw_store import RawLines
+
+# --- Parse-result cache --------------------------------------------
+# Results are keyed by a hash of the raw log bytes plus the name of the
+# parse function, so re-opening a log (or a second operator opening the
+# same one) skips parsing. Two layers:
+#   memory  module-level, shared by every Streamlit session in the process
+#   disk    pickles under CACHE_DIR, evicted least-recently-used by size
+# The same directory also keeps copies of uploaded logs to memory-map,
+# with a budget of their own; a copy that is mapped is never evicted.
+
+CACHE_VERSION = 10  # bump when the parsers' output changes
+CACHE_DIR = os.environ.get(
+    "PARSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".parse_cache")
+)
+MAX_DISK_BYTES = int(os.environ.get("PARSE_CACHE_MAX_BYTES", 2 << 30))
+MAX_SOURCE_BYTES = int(os.environ.get("PARSE_CACHE_MAX_SOURCE_BYTES", 8 << 30))  # log copies
+MAX_MEMORY_ENTRIES = int(os.environ.get("PARSE_CACHE_MEMORY_ENTRIES", 4))
+
+HASH_CHUNK = 1 << 20
+
+
+def content_hash(source) -> str:
+    """blake2b of bytes or of a binary file object (its position is restored)."""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+
+    position = source.tell()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(HASH_CHUNK), b""):
+        digest.update(chunk)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, directory=CACHE_DIR, max_disk_bytes=MAX_DISK_BYTES,
+                 max_memory_entries=MAX_MEMORY_ENTRIES, max_source_bytes=MAX_SOURCE_BYTES):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_entries = max_memory_entries
+        self.max_source_bytes = max_source_bytes
+        self._mapped = weakref.WeakKeyDictionary()  # RawLines -> path of the copy it maps
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, sessions using it]; dropped when the last one is done
+
+    # ── public API ────────────────────────────────────────────────
+    def load(self, source, parse, name=None, digest=None, restore=None):
+        """
+        Return (result, origin, seconds) for parse(source), where origin is
+        "memory", "disk" or "parsed" and seconds is the time it took.
+        *source* is bytes or a seekable binary file object; *digest* is its
+        content_hash() if the caller has it already. restore(result) is
+        applied to a result read from disk before it is kept in memory
+        (to re-attach what pickling dropped, like a memory-mapped log).
+        """
+        start = time.perf_counter()
+        name = name or f"{parse.__module__}.{parse.__qualname__}"
+        key = f"{digest or content_hash(source)}-{hashlib.blake2b(name.encode(), digest_size=6).hexdigest()}-v{CACHE_VERSION}"
+
+        # One parse per key even if several sessions ask at the same time
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                result = self._memory_get(key)
+                if result is not None:
+                    return result, "memory", time.perf_counter() - start
+
+                result = self._disk_get(key)
+                origin = "disk"
+                if result is not None and restore is not None:
+                    result = restore(result)
+                if result is None:
+                    if hasattr(source, "seek"):
+                        source.seek(0)
+                    result = parse(source)
+                    origin = "parsed"
+                    self._disk_put(key, result)
+
+                self._memory_put(key, result)
+            return result, origin, time.perf_counter() - start
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def source_lines(self, source, digest=None):
+        """
+        RawLines memory-mapping an on-disk copy of *source* (bytes or a
+        binary file object) in the cache directory, written once per
+        content, so a log that was uploaded can be parsed with raw refs
+        (see hlc_parser.parse_log_table). The copy is kept while the
+        RawLines is in use. None if *source* is bigger than the budget for
+        copies (parse it without raw refs then). *digest* as for load().
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            size = len(source)
+        else:
+            position = source.tell()
+            size = source.seek(0, os.SEEK_END)
+            source.seek(position)
+        if size > self.max_source_bytes:
+            return None
+
+        path = os.path.join(self.directory, f"{digest or content_hash(source)}.log")
+        if os.path.exists(path):
+            os.utime(path)  # mark as recently used
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    f.write(source)
+                else:
+                    position = source.tell()
+                    source.seek(0)
+                    for chunk in iter(lambda: source.read(HASH_CHUNK), b""):
+                        f.write(chunk)
+                    source.seek(position)
+            os.replace(tmp_path, path)
+
+        raw_lines = RawLines.map_file(path)
+        with self._lock:
+            self._mapped[raw_lines] = path
+        self._evict(".log", self.max_source_bytes)
+        return raw_lines
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            mapped = set(self._mapped.values())
+        for path, _, _ in self._disk_entries((".pkl", ".log")):
+            if path not in mapped:
+                os.remove(path)
+
+    # ── memory layer ──────────────────────────────────────────────
+    def _memory_get(self, key):
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+            return result
+
+    def _memory_put(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    # ── disk layer ────────────────────────────────────────────────
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _disk_get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)  # mark as recently used
+        return result
+
+    def _disk_put(self, key, result):
+        if self.max_disk_bytes <= 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict(".pkl", self.max_disk_bytes)
+
+    def _disk_entries(self, suffix):
+        """[(path, size, mtime)] of the cached files ending in *suffix*, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def _evict(self, suffix, max_bytes):
+        """Delete the oldest *suffix* files until they fit in *max_bytes*; mapped log copies stay."""
+        entries = self._disk_entries(suffix)
+        with self._lock:
+            mapped = set(self._mapped.values())
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            if path in mapped:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+# Shared by every session of the dashboard process
+PARSE_CACHE = ParseCache()
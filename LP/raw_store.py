@@ -0,0 +1,48 @@
+import mmap
+
+# --- Raw message references ----------------------------------------
+# Instead of a copy of every message body, an event can keep one int that
+# packs the body's byte offset and length in the log; RawLines turns it
+# back into text only when a view shows it. The log stays memory-mapped,
+# so its pages live in the OS page cache rather than on the Python heap.
+
+LENGTH_BITS = 24  # bodies up to 16 MiB
+LENGTH_MASK = (1 << LENGTH_BITS) - 1
+
+
+def body_ref(offset: int, line: str, body: str, encoding: str = "utf-8") -> int:
+    """Packed ref to *body* inside *line*, which starts at byte *offset*."""
+    start = line.rfind(body)
+    if line.isascii():
+        return (offset + start) << LENGTH_BITS | len(body)
+    start = offset + len(line[:start].encode(encoding))
+    return start << LENGTH_BITS | len(body.encode(encoding))
+
+
+class RawLines:
+    """Resolves body refs against a log buffer (an mmap of the file, or bytes)."""
+
+    def __init__(self, buffer, encoding: str = "utf-8"):
+        self.buffer = buffer
+        self.encoding = encoding
+
+    @classmethod
+    def map_file(cls, path, encoding: str = "utf-8"):
+        with open(path, "rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                buffer = b""
+        return cls(buffer, encoding)
+
+    def get(self, ref: int) -> str:
+        offset = ref >> LENGTH_BITS
+        return str(self.buffer[offset:offset + (ref & LENGTH_MASK)], self.encoding)
+
+    def get_many(self, refs) -> list[str]:
+        get = self.get
+        return [get(ref) for ref in refs.tolist()] if hasattr(refs, "tolist") else [get(ref) for ref in refs]
+
+    def __reduce__(self):
+        # The buffer is an mmap or an upload; whoever unpickles re-attaches one
+        return RawLines, (None, self.encoding)
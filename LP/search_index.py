@@ -0,0 +1,115 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate
+
+# --- Parcel search indexes -----------------------------------------
+# Built once per parse (see parcel_table.build_parcel_tables) so the search
+# view never scans the parcels table. Every lookup returns parcel_ids.
+
+MATCH_MODES = ("exact", "prefix", "suffix", "contains")
+_MAX_CHAR = "\U0010ffff"
+
+
+class KeyIndex:
+    """Inverted index string key → parcel_ids with exact/prefix/suffix/contains lookups."""
+
+    def __init__(self, pairs):
+        postings = {}
+        for key, parcel_id in pairs:
+            if key:
+                postings.setdefault(key, []).append(parcel_id)
+        self.postings = postings
+        self._keys = sorted(postings)
+        self._reversed = None  # built on first suffix lookup
+        self._blob = None      # built on first contains lookup
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.postings)
+
+    def add(self, pairs):
+        """Add (key, parcel_id) pairs to a built index (follow mode)."""
+        for key, parcel_id in pairs:
+            if not key:
+                continue
+            ids = self.postings.get(key)
+            if ids is None:
+                self.postings[key] = [parcel_id]
+                insort(self._keys, key)
+                if self._reversed is not None:
+                    insort(self._reversed, key[::-1])
+                self._blob = self._offsets = None
+            elif parcel_id not in ids:
+                ids.append(parcel_id)
+
+    # ── matching keys ─────────────────────────────────────────────
+    def _prefix_keys(self, sorted_keys, query, limit):
+        start = bisect_left(sorted_keys, query)
+        end = bisect_right(sorted_keys, query + _MAX_CHAR, lo=start)
+        return sorted_keys[start:min(end, start + limit)]
+
+    def keys(self, query: str, mode: str = "exact", limit: int = 100) -> list:
+        if mode == "exact":
+            return [query] if query in self.postings else []
+
+        if mode == "prefix":
+            return self._prefix_keys(self._keys, query, limit)
+
+        if mode == "suffix":
+            if self._reversed is None:
+                self._reversed = sorted(key[::-1] for key in self._keys)
+            return [key[::-1] for key in self._prefix_keys(self._reversed, query[::-1], limit)]
+
+        if mode == "contains":
+            # One "\n"-joined string searched with str.find runs at C speed;
+            # match positions map back to keys through the offsets.
+            if self._blob is None:
+                self._blob = "\n".join(self._keys)
+                self._offsets = [0] + list(accumulate(len(key) + 1 for key in self._keys))
+            found, pos = [], 0
+            while len(found) < limit:
+                pos = self._blob.find(query, pos)
+                if pos < 0:
+                    break
+                i = bisect_right(self._offsets, pos) - 1
+                found.append(self._keys[i])
+                pos = self._offsets[i + 1]  # continue with the next key
+            return found
+
+        raise ValueError(f"Unknown match mode '{mode}', expected one of {MATCH_MODES}")
+
+    def lookup(self, query: str, mode: str = "exact", limit: int = 100) -> list:
+        """parcel_ids of every key matching *query*, at most *limit* keys."""
+        ids = []
+        for key in self.keys(query, mode, limit):
+            ids.extend(self.postings[key])
+        return sorted(set(ids))
+
+
+class SearchIndex:
+    """hostId, barcode, PIC and alibi_id indexes over one parse."""
+
+    def __init__(self, host_ids, pics, alibi_ids, barcode_pairs):
+        self.host_id = KeyIndex(zip(host_ids, range(len(host_ids))))
+        self.alibi_id = KeyIndex(zip(alibi_ids, range(len(alibi_ids))))
+        self.barcode = KeyIndex(barcode_pairs)
+        self.pic = {}
+        for parcel_id, pic in enumerate(pics):
+            self.pic.setdefault(pic, []).append(parcel_id)
+
+    def add(self, parcel_ids, host_ids, pics, alibi_ids, barcode_pairs):
+        """Index new or updated parcels; barcode_pairs carry real parcel_ids."""
+        self.host_id.add(zip(host_ids, parcel_ids))
+        self.alibi_id.add(zip(alibi_ids, parcel_ids))
+        self.barcode.add(barcode_pairs)
+        for parcel_id, pic in zip(parcel_ids, pics):
+            ids = self.pic.setdefault(pic, [])
+            if parcel_id not in ids:
+                ids.append(parcel_id)
+
+    def lookup(self, field: str, query: str, mode: str = "exact", limit: int = 100) -> list:
+        if field == "pic":
+            try:
+                return list(self.pic.get(int(query), []))
+            except ValueError:
+                return []
+        return getattr(self, field).lookup(query, mode, limit)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# --- Time-range index ----------------------------------------------
+# Sorted epoch-ms keys over the parcels and events tables (see
+# parcel_table.py) so a shift or incident window is two binary searches
+# instead of a scan. Built once per parse; windows are inclusive at both
+# ends. A parcel's time is its registeredAt, or its first event's when it
+# has none (JK records, parcels first seen mid-life). Rows without any
+# time sort first and are never inside a window.
+
+NAT = np.iinfo(np.int64).min  # datetime64's NaT as int64
+
+
+def _ms(col: pd.Series) -> np.ndarray:
+    """datetime64 column → int64 epoch ms, NaT as NAT."""
+    return col.to_numpy(dtype="datetime64[ms]").view("int64")
+
+
+class TimeIndex:
+    def __init__(self, parcels: pd.DataFrame, events: pd.DataFrame):
+        event_ms = _ms(events["ts"])
+        self.event_order = np.argsort(event_ms, kind="stable")
+        self.event_ms = event_ms[self.event_order]
+
+        # First event per parcel, read off the time-sorted events
+        parcel_ids = parcels.index.to_numpy()
+        positions = pd.Index(parcel_ids).get_indexer(events["parcel_id"].to_numpy())
+        parcel_ms = _ms(parcels["registeredAt"]).copy()
+        by_time = positions[self.event_order]
+        timed = (self.event_ms != NAT) & (by_time >= 0)
+        first, at = np.unique(by_time[timed], return_index=True)
+        missing = parcel_ms[first] == NAT
+        parcel_ms[first[missing]] = self.event_ms[timed][at[missing]]
+
+        self.parcel_order = np.argsort(parcel_ms, kind="stable")
+        self.parcel_ms = parcel_ms[self.parcel_order]
+        self.parcel_ids = parcel_ids[self.parcel_order]
+
+    def __len__(self):
+        return len(self.parcel_ids)
+
+    def span(self):
+        """(first, last) epoch ms over parcels and events, or None if nothing has a time."""
+        times = [keys[np.searchsorted(keys, NAT, side="right"):] for keys in (self.parcel_ms, self.event_ms)]
+        times = [keys for keys in times if keys.size]
+        if not times:
+            return None
+        return min(keys[0] for keys in times).item(), max(keys[-1] for keys in times).item()
+
+    @staticmethod
+    def _between(keys, start_ms, end_ms):
+        return slice(np.searchsorted(keys, start_ms, side="left"), np.searchsorted(keys, end_ms, side="right"))
+
+    def parcels_between(self, start_ms: int, end_ms: int) -> np.ndarray:
+        """parcel_ids whose time is in [start_ms, end_ms], in parcel_id order."""
+        return np.sort(self.parcel_ids[self._between(self.parcel_ms, start_ms, end_ms)])
+
+    def events_between(self, start_ms: int, end_ms: int) -> np.ndarray:
+        """Row positions in the events table of events in [start_ms, end_ms], in table order."""
+        return np.sort(self.event_order[self._between(self.event_ms, start_ms, end_ms)])
+
+    def events_in_time_order(self, start_ms: int, end_ms: int):
+        """(row positions, epoch ms) of the events in [start_ms, end_ms], in time order."""
+        between = self._between(self.event_ms, start_ms, end_ms)
+        return self.event_order[between], self.event_ms[between]
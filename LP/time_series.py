@@ -0,0 +1,234 @@
+import argparse
+import os
+import sys
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+
+# --- Lifecycle time series -----------------------------------------
+# Per-minute / per-15-minute series from the parcels and events tables
+# (parcel_table.py), so peaks and stoppages show up instead of one
+# log-wide average. Per bin:
+#   registrations    parcels whose registeredAt falls in it
+#   sorts            sorted parcels whose first VerifiedSortReport does
+#                    (closedAt if there is none)
+#   deregistrations  deregistered parcels whose closedAt does
+#   tph              sorts + deregistrations, per hour
+#   cycle_pNN_s      percentiles of registration → sort / deregister over
+#                    the parcels finished in it, NaN if none were
+# Every bin from the first to the last is there, so a stoppage is a run
+# of zeros. lifecycle_series() does a whole table at once; SeriesBuilder
+# keeps the same series up to date as parcels change (live_log.LiveLog).
+
+BINS = {"1min": 60_000, "15min": 900_000}  # name -> bin width in ms
+PERCENTILES = (50, 95, 99)
+SORT_EVENT = "VerifiedSortReport"
+NAT = np.iinfo(np.int64).min  # datetime64's NaT as int64
+SORTED, DEREGISTERED = 1, 2    # kinds of finish, 0 = still open
+
+
+def _ms(col: pd.Series) -> np.ndarray:
+    """datetime64 column → int64 epoch ms, NaT as NAT."""
+    return col.to_numpy(dtype="datetime64[ms]").view("int64")
+
+
+def first_sorts(parcels: pd.DataFrame, events: pd.DataFrame) -> np.ndarray:
+    """Epoch ms of each parcel's first sort report in *events*, NAT if none; aligned with parcels rows."""
+    sort_ms = np.full(len(parcels), NAT, dtype="int64")
+    is_sort = (events["type"] == SORT_EVENT).to_numpy()
+    rows = parcels.index.get_indexer(events["parcel_id"].to_numpy()[is_sort])
+    ts = _ms(events["ts"])[is_sort]
+    keep = (rows >= 0) & (ts != NAT)
+    rows, ts = rows[keep], ts[keep]
+    order = np.lexsort((ts, rows))
+    first, at = np.unique(rows[order], return_index=True)
+    sort_ms[first] = ts[order][at]
+    return sort_ms
+
+
+def _finished(parcels, sort_ms):
+    """(finished ms, kind) arrays aligned with parcels rows, given their first sort reports."""
+    is_sorted = (parcels["status"] == "sorted").to_numpy()
+    is_dereg = (parcels["status"] == "deregistered").to_numpy()
+    closed = _ms(parcels["closedAt"])
+    finished = np.where(is_sorted, np.where(sort_ms != NAT, sort_ms, closed), np.where(is_dereg, closed, NAT))
+    kind = np.where(finished == NAT, 0, np.where(is_sorted, SORTED, DEREGISTERED))
+    return finished, kind
+
+
+def cycle_times(parcels: pd.DataFrame, events: pd.DataFrame) -> np.ndarray:
+    """Registration → sort / deregister in seconds per parcels row (as in the series), NaN if unknown."""
+    registered = _ms(parcels["registeredAt"])
+    finished, _ = _finished(parcels, first_sorts(parcels, events))
+    known = (registered != NAT) & (finished != NAT)
+    return np.where(known, (finished - registered) / 1000.0, np.nan)
+
+
+def _grouped_percentiles(groups, values, n) -> np.ndarray:
+    """
+    np.percentile (linear) of int *values* per group 0..n-1 for each of
+    PERCENTILES; NaN for empty groups. Group and value are packed into one
+    int64 key, so a single sort orders both.
+    """
+    out = np.full((len(PERCENTILES), n), np.nan)
+    if not values.size:
+        return out
+    low = values.min()
+    width = int(values.max() - low) + 1
+    keys = np.sort(groups * width + (values - low))
+    groups, values = keys // width, keys % width + low
+    present, start, count = np.unique(groups, return_index=True, return_counts=True)
+    for row, p in enumerate(PERCENTILES):
+        pos = start + (count - 1) * (p / 100)
+        lo, hi = np.floor(pos).astype("int64"), np.ceil(pos).astype("int64")
+        out[row, present] = values[lo] + (values[hi] - values[lo]) * (pos - lo)
+    return out
+
+
+def _frame(first_bin, bin_ms, counts, percentiles) -> pd.DataFrame:
+    """Series frame from per-bin counts (3 × n: registrations, sorts, deregistrations) and percentiles."""
+    n = counts.shape[1]
+    index = pd.DatetimeIndex(((first_bin + np.arange(n)) * bin_ms).view("datetime64[ms]"), name="bin")
+    frame = pd.DataFrame({
+        "registrations": counts[0], "sorts": counts[1], "deregistrations": counts[2],
+        "tph": (counts[1] + counts[2]) * (3_600_000 / bin_ms),
+        **{f"cycle_p{p}_s": percentiles[row] for row, p in enumerate(PERCENTILES)},
+    }, index=index)
+    return frame.astype({"registrations": "int32", "sorts": "int32", "deregistrations": "int32"})
+
+
+def empty_series() -> pd.DataFrame:
+    return _frame(0, BINS["1min"], np.zeros((3, 0), dtype="int64"), np.zeros((len(PERCENTILES), 0)))
+
+
+def lifecycle_series(parcels: pd.DataFrame, events: pd.DataFrame, bin_ms: int = BINS["1min"]) -> pd.DataFrame:
+    """The series of one parcels / events table pair, *bin_ms* wide bins (see BINS)."""
+    registered = _ms(parcels["registeredAt"])
+    finished, kind = _finished(parcels, first_sorts(parcels, events))
+
+    reg_bins = registered[registered != NAT] // bin_ms
+    done = finished != NAT
+    end_bins = finished[done] // bin_ms
+    if not (reg_bins.size or end_bins.size):
+        return empty_series()
+    first = min(b.min() for b in (reg_bins, end_bins) if b.size)
+    last = max(b.max() for b in (reg_bins, end_bins) if b.size)
+    n = int(last - first + 1)
+
+    kinds = kind[done]
+    counts = np.stack([
+        np.bincount(reg_bins - first, minlength=n),
+        np.bincount(end_bins[kinds == SORTED] - first, minlength=n),
+        np.bincount(end_bins[kinds == DEREGISTERED] - first, minlength=n),
+    ])
+    timed = registered[done] != NAT
+    cycles_ms = (finished[done] - registered[done])[timed]
+    return _frame(first, bin_ms, counts, _grouped_percentiles(end_bins[timed] - first, cycles_ms, n) / 1000.0)
+
+
+def series_of(tables, bin_name: str = "1min") -> pd.DataFrame:
+    """lifecycle_series() of a parcel_table.ParcelTables."""
+    return lifecycle_series(tables.parcels, tables.events, BINS[bin_name])
+
+
+# ── Incremental ───────────────────────────────────────────────────
+class SeriesBuilder:
+    """
+    lifecycle_series() kept up to date as parcels change: update() takes
+    the new or changed parcels (parcel_id index) and events that may be
+    only their new ones, and re-counts just those parcels.
+    """
+
+    def __init__(self, bin_ms: int = BINS["1min"]):
+        self.bin_ms = bin_ms
+        self.parcels = {}   # parcel_id -> (registered, first sort, finished, kind) as counted
+        self.counts = {}    # bin -> [registrations, sorts, deregistrations]
+        self.cycles = {}    # bin -> sorted cycle seconds of the parcels finished in it
+        self._percentiles = {}  # bin -> percentiles of its cycles, dropped when they change
+
+    def update(self, parcels: pd.DataFrame, events: pd.DataFrame):
+        old = [self.parcels.get(parcel_id) for parcel_id in parcels.index.tolist()]
+        sort_ms = first_sorts(parcels, events)
+        # Events only ever grow: a first sort report seen before stays the first
+        sort_ms = np.array([entry[1] if entry is not None and entry[1] != NAT else ms
+                            for entry, ms in zip(old, sort_ms.tolist())], dtype="int64")
+        registered = _ms(parcels["registeredAt"])
+        finished, kind = _finished(parcels, sort_ms)
+
+        for parcel_id, before, *entry in zip(parcels.index.tolist(), old, registered.tolist(), sort_ms.tolist(),
+                                             finished.tolist(), kind.tolist()):
+            entry = tuple(entry)
+            if entry == before:
+                continue
+            if before is not None:
+                self._count(before, -1)
+            self._count(entry, 1)
+            self.parcels[parcel_id] = entry
+
+    def _count(self, entry, sign):
+        registered, _, finished, kind = entry
+        if registered != NAT:
+            self.counts.setdefault(registered // self.bin_ms, [0, 0, 0])[0] += sign
+        if finished == NAT:
+            return
+        end_bin = finished // self.bin_ms
+        self.counts.setdefault(end_bin, [0, 0, 0])[kind] += sign
+        if registered != NAT:
+            cycles = self.cycles.setdefault(end_bin, [])
+            cycle = (finished - registered) / 1000.0
+            if sign > 0:
+                insort(cycles, cycle)
+            else:
+                del cycles[bisect_left(cycles, cycle)]
+            self._percentiles.pop(end_bin, None)
+
+    def frame(self) -> pd.DataFrame:
+        bins = [b for b, counts in self.counts.items() if any(counts)]
+        if not bins:
+            return empty_series()
+        first, last = min(bins), max(bins)
+        n = last - first + 1
+        counts = np.zeros((3, n), dtype="int64")
+        percentiles = np.full((len(PERCENTILES), n), np.nan)
+        for b in bins:
+            counts[:, b - first] = self.counts[b]
+            cycles = self.cycles.get(b)
+            if cycles:
+                if b not in self._percentiles:
+                    self._percentiles[b] = np.percentile(cycles, PERCENTILES)
+                percentiles[:, b - first] = self._percentiles[b]
+        return _frame(first, self.bin_ms, counts, percentiles)
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-minute / per-15-minute throughput and cycle-time series of a log.")
+    parser.add_argument("log_file", help="raw HLC log (.txt) or a parsed hlc / JK result (.jsonl / .parquet)")
+    parser.add_argument("--bin", choices=sorted(BINS), default="1min", help="bin width")
+    parser.add_argument("-o", "--output", help="write the series here (.csv, .json or .parquet) instead of stdout")
+    args = parser.parse_args()
+
+    from parcel_sinks import FORMATS, load_tables
+
+    ext = os.path.splitext(args.log_file)[1].lower()
+    if ext in FORMATS:
+        tables = load_tables(args.log_file, FORMATS[ext])
+    else:
+        from hlc_parser import parse_log_table
+
+        with open(args.log_file, "rb") as f:
+            tables = parse_log_table(f)
+    series = series_of(tables, args.bin)
+
+    out_ext = os.path.splitext(args.output or "")[1].lower()
+    if not args.output:
+        series.to_csv(sys.stdout)
+    elif out_ext == ".parquet":
+        series.to_parquet(args.output)
+    elif out_ext == ".json":
+        series.reset_index().to_json(args.output, orient="records", date_format="iso", indent=2)
+    else:
+        series.to_csv(args.output)
+    if args.output:
+        print(f"✅ {len(series):,} {args.bin} bins saved to '{args.output}'")
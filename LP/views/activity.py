@@ -0,0 +1,36 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from event_density import MAX_BINS, event_density
+
+ROW_LABELS = {"Message type": "type", "Location": "location"}
+
+
+def _width(step: pd.Timedelta) -> str:
+    seconds = int(step.total_seconds())
+    return f"{seconds // 60} min" if seconds >= 60 else f"{seconds} s"
+
+
+def activity_view(tables, shift=None):
+    """
+    Event density of the whole sorter: a heatmap of events per time bin and
+    message type / location, binned here (event_density) over the
+    dashboard's time window *shift*, or the whole log; bins get finer as the
+    window narrows.
+    """
+    by = ROW_LABELS[st.radio("Rows", list(ROW_LABELS), horizontal=True, key="density_by")]
+    density = event_density(tables, *(shift or (None, None)), by=by, max_bins=MAX_BINS)
+    if density.empty:
+        st.info("No events with a time in this range.")
+        return
+
+    bins = density.columns
+    step = bins[1] - bins[0] if len(bins) > 1 else pd.Timedelta(seconds=1)
+    st.caption(f"{int(density.to_numpy().sum()):,} events in {len(bins)} bins of {_width(step)}.")
+    fig = px.imshow(
+        density, aspect="auto", color_continuous_scale="Viridis",
+        labels={"x": "Time", "y": "", "color": "Events"},
+    )
+    fig.update_layout(height=120 + 28 * len(density), xaxis_title="Time")
+    st.plotly_chart(fig, use_container_width=True)
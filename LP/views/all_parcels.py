@@ -1,87 +1,126 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-from datetime import datetime
-
-def all_parcels_view(df: pd.DataFrame) -> None:
-    # ── 1. Helpers ──────────────────────────────────────────────────
-    def iso_to_hms(iso_ts: str | None) -> str:
-        """Return HH:MM:SS for a valid ISO string, else '—'."""
-        if isinstance(iso_ts, str):
-            try:
-                return datetime.fromisoformat(iso_ts).strftime("%H:%M:%S")
-            except ValueError:
-                pass
-        return "—"
-
-    def stringify_barcodes(lst) -> str:
-        """Show every barcode as‑is, or '—' if empty / bad."""
-        if not isinstance(lst, list) or not lst:
-            return "—"
-        return ", ".join(str(b) for b in lst)
-
-    def extract_report(events: list, status: str) -> str:
-        """Return raw log text based on lifecycle status."""
-        if not isinstance(events, list):
-            return "—"
-        match status:
-            case "sorted":
-                types = {"UnverifiedSortReport", "VerifiedSortReport"}
-            case "deregistered":
-                types = {"ItemDeRegister"}
-            case "open":
-                types = {"ItemInstruction"}
-            case _:
-                return "—"
-
-        logs = [ev["raw"] for ev in events if ev.get("type") in types and "raw" in ev]
-        return "\n".join(logs) if logs else "—"
-
-    # ── 2. Extract status and registered time first ─────────────────
-    df["status"] = df["lifeCycle"].apply(lambda x: x.get("status", "—") if isinstance(x, dict) else "—")
-    df["registeredAt"] = df["lifeCycle"].apply(lambda x: x.get("registeredAt", None) if isinstance(x, dict) else None)
-
-    # ── 3. Build main table ─────────────────────────────────────────
-    tbl = pd.DataFrame({
-        "Time":        df["registeredAt"].apply(iso_to_hms),
-        "Status":      df["status"],
-        "HOSTID":      df["hostId"],
-        "BARCODES":    df["barcodes"].apply(stringify_barcodes),
-        "LOCATION":    df["location"].fillna("—"),
-        "DESTINATION": df["destination"].fillna("—"),
+
+from filter_index import FILTERS, FilterIndex
+from parcel_table import ParcelTables, child_rows, event_raw, with_times
+
+# Raw log lines shown in the Report column, per lifecycle status
+REPORT_TYPES = {
+    "sorted": {"UnverifiedSortReport", "VerifiedSortReport"},
+    "deregistered": {"ItemDeRegister"},
+    "open": {"ItemInstruction"},
+    "stale": {"ItemInstruction"},
+}
+
+# Filtering (filter_index bitmaps) and sorting work on the whole
+# (windowed) table; the display columns (times, barcodes, Report) are
+# only built for the rows of the page shown.
+SORT_COLUMNS = {"Time": "registeredAt", "Status": "status", "HOSTID": "hostId",
+                "LOCATION": "location", "DESTINATION": "destination"}
+PAGE_SIZES = (25, 50, 100, 250)
+MISSING = "—"
+
+
+def _sort_order(tables: ParcelTables, df: pd.DataFrame, rows: np.ndarray, column: str) -> np.ndarray:
+    """*rows* (positions in df) in the order of one SORT_COLUMNS column, missing values last."""
+    if not len(rows):
+        return rows
+    if column == "registeredAt":
+        # Already sorted in the time index (registeredAt, else first event time)
+        times = with_times(tables).times
+        position = np.full(int(df.index.max()) + 1, -1)
+        position[df.index.to_numpy()] = np.arange(len(df))
+        in_rows = np.zeros(len(df), dtype=bool)
+        in_rows[rows] = True
+        ordered = position[times.parcel_ids[times.parcel_ids <= df.index.max()]]
+        ordered = ordered[ordered >= 0]
+        return ordered[in_rows[ordered]]
+    col = df[column].iloc[rows]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # Rank the categories by value once, then sort the small int ranks
+        rank = np.argsort(np.argsort(col.cat.categories.astype(str), kind="stable"), kind="stable")
+        codes = col.cat.codes.to_numpy()
+        keys = np.where(codes >= 0, rank[codes], len(rank))
+    else:
+        keys = col.fillna("\U0010ffff").to_numpy(dtype=str)
+    return rows[np.argsort(keys, kind="stable")]
+
+
+def _page_table(tables: ParcelTables, page: pd.DataFrame) -> pd.DataFrame:
+    """Display rows for the parcels of one page."""
+    ids = page.index.to_numpy()
+
+    barcodes = child_rows(tables.barcodes, ids).groupby("parcel_id")["barcode"].agg(", ".join)
+
+    # Report: raw log text based on lifecycle status
+    ev = child_rows(tables.events, ids)
+    status = page["status"].reindex(ev["parcel_id"]).to_numpy()
+    keep = np.zeros(len(ev), dtype=bool)
+    for status_name, types in REPORT_TYPES.items():
+        keep |= (status == status_name) & ev["type"].isin(types).to_numpy()
+    report = ev[keep]
+    logs = event_raw(tables, report).groupby(report["parcel_id"]).agg("\n".join)
+
+    def or_dash(col: pd.Series) -> pd.Series:
+        return col.astype(object).where(col.notna(), MISSING)
+
+    return pd.DataFrame({
+        "Time":        page["registeredAt"].dt.strftime("%H:%M:%S").fillna(MISSING),
+        "Status":      or_dash(page["status"]),
+        "HOSTID":      page["hostId"],
+        "BARCODES":    barcodes.reindex(page.index, fill_value=MISSING),
+        "LOCATION":    or_dash(page["location"]),
+        "DESTINATION": or_dash(page["destination"]),
+        "Report":      logs.reindex(page.index, fill_value=MISSING),
     })
 
-    # ── 4. Add Report column with raw logs ──────────────────────────
-    tbl["Report"] = df.apply(
-        lambda row: extract_report(row.get("events", []), row.get("status", "")),
-        axis=1
-    )
 
-    # ── 5. Filters ──────────────────────────────────────────────────
-    filter_targets = ["Status", "LOCATION", "DESTINATION"]
-    filters = {col: "All" for col in filter_targets}
+def all_parcels_view(tables: ParcelTables) -> None:
+    df = tables.parcels
+    filters = tables.filters if tables.filters is not None else FilterIndex(df)  # live tables have none
 
-    cols = st.columns(len(tbl.columns))
-    for col_name, col_widget in zip(tbl.columns, cols):
+    # ── 1. Filters ──────────────────────────────────────────────────
+    cols = st.columns(len(FILTERS) + 3)
+    choices = {}
+    for (label, column), col_widget in zip(FILTERS.items(), cols):
         with col_widget:
-            if col_name in filter_targets:
-                options = ["All"] + sorted(tbl[col_name].dropna().unique())
-                filters[col_name] = st.selectbox(
-                    f"{col_name} filter", options, index=0,
-                    label_visibility="collapsed", key=f"{col_name.lower()}_filter"
-                )
-            else:
-                st.markdown("&nbsp;", unsafe_allow_html=True)
-
-    # ── 6. Apply filters ────────────────────────────────────────────
-    for col_name, choice in filters.items():
+            choice = st.selectbox(
+                f"{label} filter", ["All", *filters.options(column)], index=0,
+                format_func=lambda value, label=label: f"{label}: {MISSING if value is None else value}",
+                label_visibility="collapsed", key=f"{label.lower()}_filter"
+            )
         if choice != "All":
-            tbl = tbl[tbl[col_name] == choice]
+            choices[column] = choice
+    rows = filters.rows(**choices)
+
+    # ── 2. Sorting and paging ───────────────────────────────────────
+    with cols[-3]:
+        sort_by = st.selectbox("Sort by", list(SORT_COLUMNS), index=0, label_visibility="collapsed",
+                               key="parcels_sort")
+    with cols[-2]:
+        descending = st.toggle("Descending", key="parcels_desc")
+    with cols[-1]:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, label_visibility="collapsed",
+                                 key="parcels_page_size")
 
-    # ── 7. Display table ────────────────────────────────────────────
-    st.dataframe(tbl, use_container_width=True)
+    pages = max(1, -(-len(rows) // page_size))
+    page_no = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1,
+                              key="parcels_page")
+    # Only the page's slice of the sort order is needed; missing values stay last either way
+    order = _sort_order(tables, df, rows, SORT_COLUMNS[sort_by])
+    if descending:
+        order = order[::-1]
+    first = (min(page_no, pages) - 1) * page_size
+    page = df.iloc[order[first:first + page_size]]
+
+    # ── 3. Display the page ─────────────────────────────────────────
+    st.caption(f"Parcels {first + 1 if len(page) else 0:,}–{first + len(page):,} of {len(rows):,}"
+               + (f" (filtered from {len(df):,})" if len(rows) != len(df) else ""))
+    st.dataframe(_page_table(tables, page), use_container_width=True)
+
+    # ── 4. CSS tweak for compact select boxes ───────────────────────
 
-    # ── 8. CSS tweak for compact select boxes ───────────────────────
-  
     st.markdown(
     """
     <style>
@@ -94,4 +133,3 @@ def all_parcels_view(df: pd.DataFrame) -> None:
     """,
     unsafe_allow_html=True
 )
-
@@ -0,0 +1,44 @@
+import streamlit as st
+import pandas as pd
+
+from parcel_cube import ParcelCube
+
+DRILL_BY = {"Destination (chute)": ("destination", "location"), "Induction location": ("location", "destination")}
+COLUMN_LABELS = {
+    "location": "Location", "destination": "Destination", "status": "Status", "sort_code": "Sort code",
+    "parcels": "Parcels", "cycled": "With cycle", "cycle_mean_s": "Avg cycle (s)", "cycle_std_s": "Std (s)",
+    "cycle_min_s": "Min (s)", "cycle_max_s": "Max (s)",
+}
+
+
+def _show(table: pd.DataFrame):
+    st.dataframe(table.rename(columns=COLUMN_LABELS).round(1), use_container_width=True, hide_index=True)
+
+
+def chutes_view(cube: ParcelCube):
+    """Per-chute / per-induction drill-down, read from the parse-time cube only."""
+    if not len(cube):
+        st.info("No parcels.")
+        return
+
+    dim, other = DRILL_BY[st.radio("Drill down by", list(DRILL_BY), horizontal=True, key="drill_by")]
+
+    # ── Overview: one row per chute (or location), statuses as columns ──
+    overview = cube.rollup(dim)
+    by_status = cube.rollup(dim, "status").pivot_table(
+        index=dim, columns="status", values="parcels", aggfunc="sum", fill_value=0, dropna=False,
+    )
+    overview = overview.join(by_status, on=dim)
+    _show(overview[[dim, "parcels", *by_status.columns, "cycle_mean_s", "cycle_std_s", "cycle_max_s"]])
+
+    # ── One chute ───────────────────────────────────────────────────
+    choice = st.selectbox(COLUMN_LABELS[dim], cube.values(dim), index=None, placeholder=f"Pick a {dim}…")
+    if choice is None:
+        return
+
+    total = cube.rollup(**{dim: choice}).iloc[0]
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Parcels", f"{int(total['parcels']):,}")
+    c2.metric("Avg cycle (s)", "—" if pd.isna(total["cycle_mean_s"]) else f"{total['cycle_mean_s']:.1f}")
+    c3.metric("Max cycle (s)", "—" if pd.isna(total["cycle_max_s"]) else f"{total['cycle_max_s']:.1f}")
+    _show(cube.rollup(other, "status", "sort_code", **{dim: choice}))
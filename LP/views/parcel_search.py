@@ -1,64 +1,94 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime, time
 
-def parcel_search_view(df):
-    search_mode = st.radio("Search by", ["Host ID", "Barcode"], horizontal=True)
-    search_input = st.text_input(f"Enter {search_mode}")
+from parcel_table import ParcelTables, VOLUME_FIELDS, barcodes_of, events_of
+
+
+def iso_or_none(ts):
+    return None if pd.isna(ts) else ts.isoformat(timespec="milliseconds")
+
+
+# Search mode → SearchIndex field
+SEARCH_FIELDS = {"Host ID": "host_id", "Barcode": "barcode", "PIC": "pic", "Alibi ID": "alibi_id"}
+MATCH_LABELS = {"Exact": "exact", "Prefix": "prefix", "Ends with": "suffix", "Contains": "contains"}
+MAX_RESULTS = 20
+
+
+def parcel_search_view(tables: ParcelTables, store=None):
+    """With a parcel_store.ParcelStore, searches every log in it instead of *tables*."""
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        search_mode = st.radio("Search by", list(SEARCH_FIELDS), horizontal=True)
+    with c2:
+        match = "Exact"
+        if search_mode != "PIC":
+            match = st.selectbox("Match", list(MATCH_LABELS), index=0)
+    search_input = st.text_input(f"Enter {search_mode}").strip()
     if not search_input:
         return
 
     try:
-        if search_mode == "Host ID":
-            result = df[df["hostId"] == search_input]
-        elif search_mode == "Barcode":
-            result = df[df["barcodes"].apply(lambda barcodes: search_input in (barcodes or []))]
+        if store is not None:
+            tables = store.search(SEARCH_FIELDS[search_mode], search_input, MATCH_LABELS[match], limit=MAX_RESULTS + 1)
+            parcel_ids = tables.parcels.index.tolist()
+        else:
+            parcel_ids = tables.index.lookup(
+                SEARCH_FIELDS[search_mode], search_input, MATCH_LABELS[match], limit=MAX_RESULTS
+            )
+        df = tables.parcels
+        result = df.loc[parcel_ids]
 
         if result.empty:
             st.warning(f"{search_mode} not found.")
             return
+        if len(result) > MAX_RESULTS:
+            matches = f"More than {MAX_RESULTS}" if store is not None else len(result)  # the store stops at one more
+            st.info(f"{matches} parcels match; showing the first {MAX_RESULTS}.")
+            result = result.head(MAX_RESULTS)
 
-        for idx, parcel in result.iterrows():
-            volume = parcel.get("volume_data") or {}
-
+        for parcel_id, parcel in result.iterrows():
+            labels = dict(zip(VOLUME_FIELDS, (
+                "Length (cm)", "Width (cm)", "Height (cm)", "Box Volume (cm³)", "Real Volume (cm³)"
+            )))
             volume_info = {
-                "Length (cm)": volume.get("length") or "—",
-                "Width (cm)": volume.get("width") or "—",
-                "Height (cm)": volume.get("height") or "—",
-                "Box Volume (cm³)": volume.get("box_volume") or "—",
-                "Real Volume (cm³)": volume.get("real_volume") or "—"
+                label: (float(parcel[field]) if pd.notna(parcel[field]) and parcel[field] else "—")
+                for field, label in labels.items()
             }
 
-            lifecycle = parcel.get("lifeCycle") or {}
-            registered_at = lifecycle.get("registeredAt") or "—"
+            lifecycle = {
+                "registeredAt": iso_or_none(parcel["registeredAt"]),
+                "closedAt": iso_or_none(parcel["closedAt"]),
+                "status": parcel["status"],
+            }
+            registered_at = lifecycle["registeredAt"] or "—"
 
             parcel_summary = {
-                "PIC": parcel.get("pic"),
-                "Host ID": parcel.get("hostId"),
-                "Barcodes": parcel.get("barcodes"),
-                "Location": parcel.get("location"),
-                "Destination": parcel.get("destination"),
+                "PIC": int(parcel["pic"]),
+                "Host ID": parcel["hostId"],
+                "Barcodes": barcodes_of(tables, parcel_id),
+                "Location": None if pd.isna(parcel["location"]) else parcel["location"],
+                "Destination": None if pd.isna(parcel["destination"]) else parcel["destination"],
                 "Registered At": registered_at,
                 "Volume Data": volume_info,
                 "Lifecycle": lifecycle,
-                "Barcode Error": parcel.get("barcodeErr"),
-                "Recirculation Count": parcel.get("recirculationCount", 0)
+                "Barcode Error": bool(parcel["barcodeErr"]),
+                "Alibi ID": parcel["alibi_id"],
+                "Recirculation Count": 0
             }
+            if "log" in parcel:  # parcels read from the store
+                parcel_summary["Log"] = parcel["log"]
 
             st.subheader("📦 Parcel Information")
             st.json(parcel_summary)
 
             # ── Event timeline ──
-            ev = pd.DataFrame(parcel.get("events") or [])
+            ev = events_of(tables, parcel_id)
             if ev.empty:
                 st.info("No event data available.")
                 continue
 
             ev = ev[ev["type"] != "Lifecycle"]
-
-            # Convert HH:MM:SS to datetime (for plotting)
-            ev["ts"] = ev["ts"].apply(lambda t: datetime.strptime(t, "%H:%M:%S"))
             ev = ev.sort_values("ts")
 
             # Duration and Finish
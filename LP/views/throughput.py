@@ -0,0 +1,49 @@
+import streamlit as st
+import plotly.express as px
+
+from time_series import BINS, PERCENTILES
+
+COUNT_LABELS = {"registrations": "Registered", "sorts": "Sorted", "deregistrations": "Deregistered"}
+CYCLE_LABELS = {f"cycle_p{p}_s": f"p{p}" for p in PERCENTILES}
+
+
+def throughput_view(series_of, shift=None):
+    """
+    Throughput and cycle-time charts. series_of(bin_name) returns the
+    time_series frame for a time_series.BINS name; *shift* is the
+    dashboard's (start_ms, end_ms) time window, if one is picked.
+    """
+    bin_name = st.radio("Resolution", list(BINS), horizontal=True, key="series_bin")
+    series = series_of(bin_name)
+    if shift:
+        # Bins that overlap the window
+        start_ms, end_ms = shift
+        bin_start = series.index.as_unit("ms").asi8
+        series = series[(bin_start + BINS[bin_name] > start_ms) & (bin_start <= end_ms)]
+    if series.empty:
+        st.info("No parcel has a registration or finish time in this range.")
+        return
+
+    working = series[series["registrations"] + series["sorts"] + series["deregistrations"] > 0]
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Peak tph", f"{series['tph'].max():,.0f}", help=f"busiest {bin_name} bin, {series['tph'].idxmax():%H:%M}")
+    c2.metric("Median tph", f"{working['tph'].median():,.0f}" if len(working) else "—")
+    c3.metric("Idle bins", f"{int((series['tph'] == 0).sum())} of {len(series)}",
+              help="bins in which no parcel was sorted or deregistered")
+
+    counts = series[list(COUNT_LABELS)].rename(columns=COUNT_LABELS).reset_index()
+    fig = px.bar(counts, x="bin", y=list(COUNT_LABELS.values()), barmode="group")
+    fig.update_layout(title=f"Parcels per {bin_name}", xaxis_title="Time", yaxis_title="Parcels",
+                      legend_title="", height=320)
+    st.plotly_chart(fig, use_container_width=True)
+
+    fig = px.line(series.reset_index(), x="bin", y="tph")
+    fig.update_layout(title="Throughput (tph, sorted + deregistered)", xaxis_title="Time", yaxis_title="tph",
+                      height=280)
+    st.plotly_chart(fig, use_container_width=True)
+
+    cycles = series[list(CYCLE_LABELS)].rename(columns=CYCLE_LABELS).reset_index()
+    fig = px.line(cycles, x="bin", y=list(CYCLE_LABELS.values()))
+    fig.update_layout(title="Cycle time (registration → sort / deregister)", xaxis_title="Time",
+                      yaxis_title="Seconds", legend_title="", height=320)
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,75 @@
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+import KJ
+
+# --- Record memory benchmark ---------------------------------------
+# Bytes per parcel and per event for KJ.parse_log()'s slotted records
+# against the nested-dict layout they replaced (rebuilt with to_dict()).
+# Objects reachable from several records (interned strings, shared
+# dicts) are counted once.
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LP", "logs.txt")
+
+
+def deep_size(obj, seen) -> int:
+    if id(obj) in seen or obj is None or isinstance(obj, bool):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_size(getattr(obj, name, None), seen) for name in obj.__slots__)
+    return size
+
+
+def breakdown(parcels, events_of):
+    """(bytes per parcel without its events, bytes per event, events)"""
+    seen = set()
+    events = [event for parcel in parcels for event in events_of(parcel)]
+    event_bytes = sum(deep_size(event, seen) for event in events)
+    # The events lists themselves belong to the parcel
+    parcel_bytes = sum(deep_size(parcel, seen) for parcel in parcels)
+    return parcel_bytes / len(parcels), event_bytes / max(len(events), 1), len(events)
+
+
+def traced(build):
+    """(result, bytes still allocated by build() once it returns)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _parse(data):
+    return KJ.parse_log(data, echo=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per parcel and per event of KJ.parse_log() output.")
+    parser.add_argument("log_file", nargs="?", default=DEFAULT_LOG)
+    args = parser.parse_args()
+
+    with open(args.log_file, "rb") as f:
+        data = f.read()
+
+    records, records_total = traced(lambda: _parse(data))
+    dicts, dicts_total = traced(lambda: [parcel.to_dict() for parcel in _parse(data)])
+
+    rows = [
+        ("records", records_total, *breakdown(records, lambda p: p.events)),
+        ("dicts", dicts_total, *breakdown(dicts, lambda p: p["events"])),
+    ]
+    print(f"{len(records):,} parcels from {args.log_file}")
+    print(f"{'layout':<8} {'total MB':>9} {'B/parcel':>9} {'B/event':>8} {'events':>8}")
+    for name, total, per_parcel, per_event, events in rows:
+        print(f"{name:<8} {total / 1e6:>9.2f} {per_parcel:>9.0f} {per_event:>8.0f} {events:>8,}")
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from log_generator import write_log
+
+# --- Parser throughput benchmark -----------------------------------
+# Lines/s, peak RSS and output size of the three log parsers on
+# generated logs (log_generator.py) or a given one. Every parser runs in
+# its own interpreter, so peak RSS is that parse alone plus the log bytes.
+# Each run appends one JSON line to the results file, tagged with the git
+# revision, so numbers from different commits can be compared.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(ROOT, "bench_logs")
+RESULTS = os.path.join(ROOT, "bench_results.jsonl")
+PARSERS = ("kj", "hlc", "jk")
+DEFAULT_SIZES = (10_000, 100_000)
+
+
+def _parse(name, data):
+    """(records, to_jsonable) for one parser."""
+    sys.path.insert(0, os.path.join(ROOT, "LP"))
+    if name == "kj":
+        import KJ
+
+        records = KJ.parse_log(data, echo=False)
+        return records, lambda: [parcel.to_dict() for parcel in records]
+    if name == "hlc":
+        import hlc_parser
+
+        records = hlc_parser.parse_log(data)
+    else:
+        import JK
+
+        records = JK.parse_log(data)
+    return records, lambda: records
+
+
+def run_worker(name, path) -> dict:
+    """Parse *path* with one parser in this process and measure it."""
+    with open(path, "rb") as f:
+        data = f.read()
+    start = time.perf_counter()
+    records, to_jsonable = _parse(name, data)
+    seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    output = json.dumps(to_jsonable(), default=str).encode()
+    return {"parser": name, "seconds": seconds, "parcels": len(records),
+            "peak_rss_bytes": peak_rss, "output_bytes": len(output)}
+
+
+def measure(name, path) -> dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", name, path],
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def _count_lines(path) -> int:
+    with open(path, "rb") as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generated_log(lines, seed, log_dir=LOG_DIR) -> str:
+    """Path of a generated log with *lines* lines, written on first use."""
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, f"gen_{lines}_s{seed}.txt")
+    if not os.path.exists(path):
+        print(f"Generating {lines:,} lines → {path}", flush=True)
+        write_log(path + ".part", lines, seed)
+        os.replace(path + ".part", path)
+    return path
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark KJ, hlc_parser and JK parse_log on viMessageSocket logs.")
+    parser.add_argument("--lines", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="sizes of the generated logs to benchmark")
+    parser.add_argument("--log", nargs="+", help="benchmark these log files instead of generated ones")
+    parser.add_argument("--parsers", nargs="+", choices=PARSERS, default=list(PARSERS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-dir", default=LOG_DIR, help="where generated logs are kept between runs")
+    parser.add_argument("--output", default=RESULTS, help="JSON-lines file the results are appended to")
+    parser.add_argument("--worker", nargs=2, metavar=("PARSER", "LOG"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(*args.worker)))
+        sys.exit()
+
+    logs = args.log or [generated_log(lines, args.seed, args.log_dir) for lines in args.lines]
+    run = {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "git_revision": _git_revision(), "python": platform.python_version(),
+           "machine": platform.machine(), "cpus": os.cpu_count()}
+
+    print(f"{'log':<28} {'parser':<6} {'lines':>11} {'lines/s':>10} {'peak RSS MB':>12} {'output MB':>10} {'parcels':>9}")
+    with open(args.output, "a", encoding="utf-8") as out:
+        for path in logs:
+            lines, size = _count_lines(path), os.path.getsize(path)
+            for name in args.parsers:
+                result = measure(name, path)
+                record = {**run, "log": os.path.basename(path), "log_lines": lines, "log_bytes": size,
+                          **result, "lines_per_s": lines / result["seconds"]}
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                print(f"{record['log']:<28} {name:<6} {lines:>11,} {record['lines_per_s']:>10,.0f} "
+                      f"{result['peak_rss_bytes'] / 1e6:>12.1f} {result['output_bytes'] / 1e6:>10.1f} "
+                      f"{result['parcels']:>9,}", flush=True)
+    print(f"\nResults appended to {args.output}")
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from operator import itemgetter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "LP"))
+from KJ import _correlate, _decode_lines, _held, new_state
+from message_engine import CLOSED_GRACE_S, STALE_AFTER_S, new_retention
+from parcel_sinks import FORMATS, SETTLE_PARCELS, open_sink
+
+# --- viMessageSocket TCP ingestion ---------------------------------
+# Accepts the pipe-delimited PLC/host message stream over TCP, one message
+# per line ("PLC-1001|HOST-0001|ts|msgId|PIC|hostId|..."), and feeds it to
+# the same state machine as KJ.parse_log(). Bare messages are wrapped in
+# the viMessageSocket log layout, stamped with their receive time, so they
+# decode exactly like logged ones; full log lines are accepted as they are.
+#
+# Backpressure: connection handlers read in chunks and hand complete lines
+# to a bounded queue of batches. When the state machine falls behind the
+# queue fills, handlers stop reading and TCP flow control slows the senders.
+#
+# Memory: with a retention (--evict) the state machine drops parcels a
+# grace period after they close and flushes ones left open as "stale"; with
+# keep_closed=False (streamed --output) closed parcels only go to on_parcel.
+# Together they let the server run for days in constant memory.
+
+HOST = "127.0.0.1"
+PORT = 5031
+READ_BYTES = 64 << 10   # bytes per socket read, roughly one batch
+QUEUE_BATCHES = 16      # batches waiting for the state machine before reads pause
+REPORT_EVERY_S = 5.0
+
+
+def to_log_line(message: str, peer: str, stamp: str) -> str:
+    """Wrap a bare socket message in the viMessageSocket log-line layout."""
+    if message.endswith(" []") and "): " in message:
+        return message  # already a log line (plc_emulator.py --log-lines)
+    direction = "Incoming" if message.startswith("PLC-") else "Outgoing"
+    return (f"{stamp} hlcpFramework.Communications.viMessageSocket DEBUG [ingest] | "
+            f"Equipment/{direction} ({peer}): {message} []")
+
+
+def _stamp() -> str:
+    now = datetime.now()
+    return now.strftime("%Y-%m-%d %H:%M:%S,") + f"{now.microsecond // 1000:03d}"
+
+
+class IngestServer:
+    def __init__(self, host=HOST, port=PORT, tokenizer="fast", queue_batches=QUEUE_BATCHES,
+                 echo=False, on_parcel=None, retention=None, keep_closed=True):
+        self.host, self.port = host, port
+        self.echo = echo
+        self.on_parcel = on_parcel  # called with each parcel as it closes (or is evicted)
+        self.state = new_state(retention)
+        self.keep_closed = keep_closed
+        self.closed = []  # (creation_index, parcel), in close order, if keep_closed
+        self.counters = {"connections": 0, "lines": 0, "messages": 0, "batches": 0,
+                         "parcels_closed": 0, "queue_high_water": 0}
+        self.queue = asyncio.Queue(maxsize=queue_batches)
+        self.tokenizer = tokenizer
+        self._server = None
+        self._consumer = None
+        self._handlers = set()
+
+    # ── network side ──────────────────────────────────────────────
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self._consumer = asyncio.create_task(self._consume())
+        self.port = self._server.sockets[0].getsockname()[1]  # when started on port 0
+        return self._server
+
+    async def close(self):
+        """Stop accepting, let connected senders finish, then drain the queue."""
+        self._server.close()
+        await self._server.wait_closed()
+        if self._handlers:
+            await asyncio.wait(self._handlers)
+        await self.queue.join()
+        self._consumer.cancel()
+
+    async def _handle_client(self, reader, writer):
+        peer = "%s:%s" % writer.get_extra_info("peername")[:2]
+        self.counters["connections"] += 1
+        self._handlers.add(asyncio.current_task())
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(READ_BYTES)
+                if not data:
+                    break
+                data = pending + data
+                cut = data.rfind(b"\n") + 1
+                pending = data[cut:]
+                if cut:
+                    lines = data[:cut].decode("utf-8", errors="replace").splitlines()
+                    await self.queue.put((peer, _stamp(), lines))  # waits while the queue is full
+                    self.counters["queue_high_water"] = max(self.counters["queue_high_water"], self.queue.qsize())
+            if pending.strip():
+                await self.queue.put((peer, _stamp(), pending.decode("utf-8", errors="replace").splitlines()))
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    # ── state machine side ────────────────────────────────────────
+    async def _consume(self):
+        while True:
+            batch = await self.queue.get()
+            try:
+                self._process(*batch)
+            finally:
+                self.queue.task_done()
+
+    def _process(self, peer, stamp, lines):
+        decoded = list(_decode_lines(
+            (to_log_line(message, peer, stamp) for message in lines if message), self.tokenizer))
+
+        closed = 0
+        for numbered in _correlate(decoded, self.state, echo=self.echo):
+            closed += 1
+            if self.keep_closed:
+                self.closed.append(numbered)
+            if self.on_parcel is not None:
+                self.on_parcel(numbered[1])
+
+        self.counters["lines"] += len(lines)
+        self.counters["messages"] += len(decoded)
+        self.counters["batches"] += 1
+        self.counters["parcels_closed"] += closed
+
+    def snapshot(self) -> list:
+        """
+        Every parcel record so far, closed or open, in creation order (as
+        parse_log returns them); closed ones only if keep_closed.
+        """
+        numbered = self.closed + list(_held(self.state))
+        return [parcel for _, parcel in sorted(numbered, key=itemgetter(0))]
+
+    async def report(self, every=REPORT_EVERY_S):
+        last_lines, last_t = 0, time.perf_counter()
+        while True:
+            await asyncio.sleep(every)
+            now = time.perf_counter()
+            c = self.counters
+            print(f"{c['lines'] - last_lines:>8,} lines ({(c['lines'] - last_lines) / (now - last_t):,.0f}/s) | "
+                  f"total {c['lines']:,} | parcels closed {c['parcels_closed']:,} "
+                  f"open {len(self.state['unreported']):,} | queue {self.queue.qsize()}/{self.queue.maxsize} "
+                  f"(max {c['queue_high_water']})", flush=True)
+            last_lines, last_t = c["lines"], now
+
+
+# --- CLI -----------------------------------------------------------
+async def _main(args):
+    # .jsonl / .parquet outputs are written as parcels close; .json on exit
+    sink = None
+    if args.output and os.path.splitext(args.output)[1].lower() in FORMATS:
+        # Evicted parcels are final, the settle window is only needed without
+        sink = open_sink(args.output, "kj", settle=0 if args.evict else SETTLE_PARCELS)
+    retention = new_retention(args.grace, args.stale_after) if args.evict else None
+    server = IngestServer(args.host, args.port, queue_batches=args.queue, echo=args.echo,
+                          on_parcel=sink.write if sink else None, retention=retention,
+                          keep_closed=sink is None)
+    await server.start()
+    print(f"Listening on {server.host}:{server.port}", flush=True)
+    reporter = asyncio.create_task(server.report(args.report_every))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        reporter.cancel()
+        await server.close()
+        if sink is not None:
+            for _, parcel in _held(server.state):
+                sink.write(parcel)  # still in their grace, then the open ones
+            sink.close()
+            print(f"\n✅ {sink.count:,} parcels saved to '{args.output}'")
+        elif args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump([parcel.to_dict() for parcel in server.snapshot()], f, indent=4)
+            print(f"\n✅ Parsed data saved to '{args.output}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the viMessageSocket PLC/host stream over TCP.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--queue", type=int, default=QUEUE_BATCHES, help="batches buffered before reads pause")
+    parser.add_argument("--report-every", type=float, default=REPORT_EVERY_S, help="seconds between status lines")
+    parser.add_argument("--output", help="write the parsed parcels here: .jsonl / .parquet as they close, "
+                                                  ".json on exit")
+    parser.add_argument("--echo", action="store_true", help="print every message, like KJ.parse_log")
+    parser.add_argument("--evict", action="store_true",
+                        help="drop closed parcels after --grace and flush ones open for --stale-after "
+                             "(constant memory on long runs)")
+    parser.add_argument("--grace", type=float, default=CLOSED_GRACE_S,
+                        help="seconds of log time a closed parcel still takes late messages")
+    parser.add_argument("--stale-after", type=float, default=STALE_AFTER_S,
+                        help="seconds of log time after which an open parcel is flushed as stale")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
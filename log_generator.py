@@ -0,0 +1,201 @@
+import argparse
+import heapq
+import random
+import time
+from datetime import datetime, timezone
+
+# --- Synthetic viMessageSocket log generator -----------------------
+# Writes logs shaped like LP/logs.txt: overlapping parcel lifecycles on
+# one PLC connection, the host's REST sort requests/reports in between,
+# and a watchdog exchange every 15 s. Per parcel, as in the recorded log:
+#
+#   1  ItemRegister            PLC  (usually without hostId)
+#   3  ItemInstruction         host reply with the hostId
+#   2  ItemPropertiesUpdate    PLC  barcodes ("@" list) and volume block
+#   3  ItemInstruction         destination reply
+#   5  UnverifiedSortReport    PLC  (most parcels)
+#   6  VerifiedSortReport      PLC  ... or 7 ItemDeRegister instead
+#
+# PICs are reused (they wrap at PIC_RANGE) and hostIds count up. Output
+# is deterministic for a given seed; size is given in lines.
+
+PIC_RANGE = 999
+FIRST_HOST_ID = 2027756
+PLC_CLOCK_SKEW_MS = 41_000  # PLC timestamps run ahead of the host's log clock
+WATCHDOG_EVERY_MS = 15_000
+
+# Ratios per parcel, from LP/logs.txt
+P_REGISTER_WITH_HOST = 0.05
+P_UNVERIFIED_REPORT = 0.94
+P_DEREGISTER = 0.04             # before a properties update
+P_DEREGISTER_AFTER_SORT = 0.045  # ... or after the sort report
+P_BARCODE_ERROR = 0.004
+P_MULTI_BARCODE = 0.02
+P_NO_VOLUME = 0.01
+
+SOCKET = "hlcpFramework.Communications.viMessageSocket DEBUG [{:>4}] | Equipment/{} (10.100.29.161:5031): {} []"
+REST = ("npkhm.Driver.HostCommunication.RestClient DEBUG [{:>4}] | Equipment/{} "
+        "(http://localhost:5000/api/requests/{}): <MSG><HEADER><HDSDID>{}</HDSDID><HDRCID>{}</HDRCID>"
+        "<HDMGTP>{}</HDMGTP><HDMGID>{}</HDMGID></HEADER><BODY><HPIC>{:010d}</HPIC>{}</BODY></MSG> []")
+INFEEDS = [(f"1001.00{n:02d}.0001.B71", f"INF0{n % 8 + 1}") for n in range(1, 24)]
+DEREGISTER_REASONS = ["999", "Before_Scanner", "", "INF03"]
+
+
+class _Clock:
+    """Log and PLC timestamps for epoch milliseconds, formatted once per second."""
+
+    def __init__(self):
+        self._sec = None
+        self._log = self._plc = ""
+
+    def stamps(self, ms):
+        sec = ms // 1000
+        if sec != self._sec:
+            self._sec = sec
+            self._log = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(sec))
+            self._plc = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec + PLC_CLOCK_SKEW_MS // 1000))
+        frac = ms % 1000
+        return f"{self._log},{frac:03d}", f"{self._plc}.{frac:03d}Z"
+
+
+def _barcode_block(rng, barcode_error):
+    count = 2 if rng.random() < P_MULTI_BARCODE else 1
+    barcodes = "@".join(f"0]C{rng.randrange(10**12, 10**13)}" for _ in range(count))
+    if barcode_error:
+        state, barcodes = rng.choice(("4", "5")), ""
+    else:
+        state = "6"
+    return f"{state};0101;{barcodes};1100000000000000;000000;1100;1100;0;2;00000000;________________________________;124"
+
+
+def _volume_block(rng):
+    if rng.random() < P_NO_VOLUME:
+        return ""
+    length, width, height = rng.randrange(100, 600), rng.randrange(100, 400), rng.randrange(20, 300)
+    box = length * width * height // 1000
+    return (f"6;0101;{length:04d};{width:04d};{height:04d};{box:07d};{box * 95 // 100:07d};0000000;"
+            f"{rng.randrange(-900, 900):+04d};+010;mm;0;2;00000000;______________________________00;101")
+
+
+def _parcel_events(rng, start_ms, pic, host_id, seq):
+    """[(ms, kind, fields)] of one parcel's lifecycle."""
+    infeed, infeed_name = rng.choice(INFEEDS)
+    dest = rng.randrange(1, 120)
+    events = []
+    t = start_ms
+    registered_with_host = rng.random() < P_REGISTER_WITH_HOST
+    events.append((t, "in", f"1|{pic}|{host_id if registered_with_host else ''}|{infeed}|{infeed_name}|2"))
+    t += rng.randrange(1, 4)
+    events.append((t, "out", f"3|{pic}|{host_id}||"))
+
+    if rng.random() < P_DEREGISTER:
+        t += rng.randrange(10_000, 60_000)
+        reason = rng.choice(DEREGISTER_REASONS)
+        events.append((t, "in", f"7|{pic}|{host_id}|1001.0035.0001.B71|{reason}|1||{infeed}|2                  "))
+        return events
+
+    t += rng.randrange(30_000, 70_000)
+    barcode_error = rng.random() < P_BARCODE_ERROR
+    alibi = f"00000{seq % 10**6:06d}{time.strftime('%Y%m%d%H%M%S', time.gmtime(t // 1000))}"
+    events.append((t, "in", f"2|{pic}|{host_id}|1001.0041.0091|1001.41.91|{seq:023d}|"
+                            f"{_barcode_block(rng, barcode_error)}|0000|{alibi}|{_volume_block(rng)}||"))
+    events.append((t + 10, "rest", ("sortRequest", "COY013", "NPHOST", "SORTREQ", seq, host_id, "")))
+    events.append((t + 12, "rest", ("sortRequest", "NPHOST", "COY013", "SORTRPL", seq, host_id,
+                                    f"<DID>CHUTE{dest:03d}</DID>")))
+    t += 13
+    events.append((t, "out", f"3|{pic}|{host_id}|1|{dest:03d}"))
+
+    if rng.random() < P_UNVERIFIED_REPORT:
+        t += rng.randrange(20_000, 40_000)
+        events.append((t, "in", f"5|{pic}|{host_id}|1001.0045.{dest % 40 + 1:04d}.SCU|{dest + 50},{dest}|||{dest};01|{infeed}|2"))
+
+    t += rng.randrange(20_000, 60_000)
+    sorted_ok = rng.random() < 0.97
+    actual = str(dest) if sorted_ok else "999"
+    code = "1" if sorted_ok else "2"
+    events.append((t, "in", f"6|{pic}|{host_id}|1001.0045.0040.B71|999||{actual}|{dest};{code}|{infeed}|2"))
+    events.append((t + 2, "rest", ("sortReport", "COY013", "NPHOST", "SORTRPT", seq + 1, host_id,
+                                   f"<DSTAT>V</DSTAT><SRB><DID>CHUTE{dest:03d}</DID></SRB>")))
+    events.append((t + 4, "rest", ("sortReport", "NPHOST", "COY013", "SORTACK", seq + 1, host_id, "")))
+    if rng.random() < P_DEREGISTER_AFTER_SORT:
+        events.append((t + rng.randrange(1_000, 5_000), "in",
+                       f"7|{pic}|{host_id}|1001.0045.0040.B71|999|1||{infeed}|2                  "))
+    return events
+
+
+def generate_lines(n_lines, seed=0, start="2025-05-13 07:46:40", parcels_per_s=1.25):
+    """Yield n_lines log lines (without line terminators)."""
+    rng = random.Random(seed)
+    clock = _Clock()
+    now = int(datetime.fromisoformat(start).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+    pending = []  # heap of (ms, order, kind, fields)
+    order = 0
+    next_parcel = now
+    next_watchdog = now + WATCHDOG_EVERY_MS
+    pic = rng.randrange(PIC_RANGE)
+    host_id = FIRST_HOST_ID
+    seq = 1492
+    emitted = 0
+    mean_gap = 1000 / parcels_per_s
+
+    while emitted < n_lines:
+        # Schedule arrivals and heartbeats until they are later than the next pending event
+        while not pending or min(next_parcel, next_watchdog) <= pending[0][0]:
+            if next_parcel <= next_watchdog:
+                pic = pic % PIC_RANGE + 1
+                for event in _parcel_events(rng, next_parcel, pic, host_id, seq):
+                    heapq.heappush(pending, (event[0], order, event[1], event[2]))
+                    order += 1
+                host_id += 1
+                seq += 2
+                next_parcel += int(rng.expovariate(1 / mean_gap)) + 1
+            else:
+                heapq.heappush(pending, (next_watchdog, order, "in", "99"))
+                heapq.heappush(pending, (next_watchdog + 1, order + 1, "out", "98|1"))
+                order += 2
+                next_watchdog += WATCHDOG_EVERY_MS
+
+        ms, _, kind, fields = heapq.heappop(pending)
+        log_ts, plc_ts = clock.stamps(ms)
+        thread = rng.choice((3, 30, 42, 44, 52, 70, 88))
+        if kind == "in":
+            line = SOCKET.format(thread, "Incoming", f"PLC-1001|HOST-0001|{plc_ts}|{fields}")
+        elif kind == "out":
+            line = SOCKET.format(thread, "Outgoing", f"HOST-0001|PLC-1001|{log_ts.replace(' ', 'T').replace(',', '.')}Z|{fields}")
+        else:
+            api, sender, receiver, msg_type, msg_id, hid, body = fields
+            line = REST.format(thread, "Outgoing" if sender == "COY013" else "Incoming", api,
+                               sender, receiver, msg_type, 287000 + msg_id, hid, body)
+        yield f"{log_ts} {line}"
+        emitted += 1
+
+
+def write_log(path, n_lines, seed=0, newline="\r\n", **kwargs):
+    with open(path, "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+        batch = []
+        for line in generate_lines(n_lines, seed, **kwargs):
+            batch.append(line)
+            if len(batch) == 10_000:
+                f.write(newline.join(batch) + newline)
+                batch.clear()
+        if batch:
+            f.write(newline.join(batch) + newline)
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic viMessageSocket log.")
+    parser.add_argument("output")
+    parser.add_argument("--lines", type=int, default=100_000, help="number of log lines (10k … 100M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", default="2025-05-13 07:46:40", help="log time of the first line")
+    parser.add_argument("--rate", type=float, default=1.25, help="parcels registered per second")
+    parser.add_argument("--lf", action="store_true", help="LF line endings (default CRLF, like the PLC logs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_log(args.output, args.lines, args.seed, "\n" if args.lf else "\r\n",
+              start=args.start, parcels_per_s=args.rate)
+    seconds = time.perf_counter() - start
+    print(f"Wrote {args.lines:,} lines to {args.output} in {seconds:.1f}s ({args.lines / seconds:,.0f} lines/s)")
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "LP"))
+from log_reader import iter_lines
+
+# --- Local PLC emulator --------------------------------------------
+# Replays the viMessageSocket traffic recorded in a log to ingest_server.py
+# over TCP, keeping the recorded gaps between messages divided by a
+# speed-up factor (0 = as fast as the server accepts them).
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LP", "logs.txt")
+DRAIN_EVERY = 256  # messages written between waits for the socket buffer
+
+
+def load_messages(path, log_lines=False):
+    """[(log_time_seconds, line)] of the socket messages in a log, in order."""
+    messages = []
+    with open(path, "rb") as f:
+        for line in iter_lines(f):
+            start = line.find("): ")
+            if start < 0 or not line.endswith(" []"):
+                continue
+            try:
+                t = datetime.fromisoformat(line[:23].replace(",", ".")).timestamp()
+            except ValueError:
+                continue
+            messages.append((t, line if log_lines else line[start + 3:-3].strip()))
+    return messages
+
+
+async def replay(messages, host, port, speedup=1.0, repeat=1):
+    """Send the messages; returns (sent, seconds)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+    duration = messages[-1][0] - messages[0][0] + 1.0 if messages else 0.0
+    first = messages[0][0] if messages else 0.0
+    started = loop.time()
+    sent = 0
+
+    for rep in range(repeat):
+        offset = rep * duration
+        for t, message in messages:
+            if speedup > 0:
+                delay = (t - first + offset) / speedup - (loop.time() - started)
+                if delay > 0.001:
+                    await writer.drain()
+                    await asyncio.sleep(delay)
+            writer.write(message.encode() + b"\n")
+            sent += 1
+            if sent % DRAIN_EVERY == 0:
+                await writer.drain()  # blocks while the server applies backpressure
+
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    return sent, loop.time() - started
+
+
+# --- CLI -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a viMessageSocket log to ingest_server.py.")
+    parser.add_argument("log_file", nargs="?", default=DEFAULT_LOG)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5031)
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay N× faster than recorded; 0 = no pacing")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the log this many times")
+    parser.add_argument("--log-lines", action="store_true",
+                        help="send whole log lines (keeps the recorded timestamps) instead of bare messages")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    messages = load_messages(args.log_file, args.log_lines)
+    print(f"Loaded {len(messages):,} messages in {time.perf_counter() - start:.2f}s")
+    sent, seconds = asyncio.run(replay(messages, args.host, args.port, args.speedup, args.repeat))
+    print(f"Sent {sent:,} messages in {seconds:.2f}s ({sent / seconds:,.0f}/s)")